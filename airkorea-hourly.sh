@@ -7,6 +7,18 @@ if ! python /app/ingest_airkorea.py; then
   status=1
 fi
 
+if ! python /app/rollup_measurements.py; then
+  echo "rollup warning: refresh failed; raw rows stay until the next run" >&2
+fi
+
+if ! python /app/build_selection_raster.py; then
+  echo "raster warning: build failed; /nearest keeps answering from SQL" >&2
+fi
+
+if ! python /app/refresh_region_summaries.py; then
+  echo "summaries warning: refresh failed; regions keep their last values" >&2
+fi
+
 if [[ "${RUN_RETENTION_CLEANUP:-false}" == "true" ]]; then
   if ! python /app/cleanup_measurements.py; then
     echo "retention error: cleanup failed; collected data remains committed" >&2
@@ -6,6 +6,7 @@ from urllib.parse import unquote
 from zoneinfo import ZoneInfo
 
 import psycopg2
+import psycopg2.pool
 import requests
 
 
@@ -79,13 +80,23 @@ def configured_regions():
     return TARGET_REGIONS
 
 
+def db_connection_kwargs():
+    return {
+        "host": os.environ["DBHOST"],
+        "port": int(os.environ.get("DBPORT", "5432")),
+        "dbname": os.environ["DBNAME"],
+        "user": os.environ["DBUSER"],
+        "password": os.environ["DBPASS"],
+    }
+
+
 def get_db_connection():
-    return psycopg2.connect(
-        host=os.environ["DBHOST"],
-        port=int(os.environ.get("DBPORT", "5432")),
-        dbname=os.environ["DBNAME"],
-        user=os.environ["DBUSER"],
-        password=os.environ["DBPASS"],
+    return psycopg2.connect(**db_connection_kwargs())
+
+
+def create_connection_pool(maxconn, minconn=1):
+    return psycopg2.pool.ThreadedConnectionPool(
+        minconn, maxconn, **db_connection_kwargs()
     )
 
 
@@ -0,0 +1,308 @@
+"""Response caches that can be shared across workers and instances.
+
+CACHE_BACKEND=memory (the default) keeps each namespace in a per-process
+LRU. CACHE_BACKEND=redis adds REDIS_URL as a shared second tier: reads
+check the local tier first, then Redis, and copy shared hits into the
+local tier for at most CACHE_LOCAL_TTL_SECONDS; writes go to both. The
+shared tier speaks plain RESP, so Redis, Memorystore or
+loadtest/fake_redis.py all work.
+
+Shared values are compact JSON, zlib-compressed past COMPRESS_MIN_BYTES
+behind a one-byte format tag. Redis errors count as misses, and after
+one the shared tier is skipped for REDIS_RETRY_SECONDS, so an outage
+costs at most one timeout per interval instead of one per request.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+KEY_PREFIX = "hudadak:v1"
+COMPRESS_MIN_BYTES = 512
+_JSON = b"j"
+_JSON_ZLIB = b"z"
+_BYTES = b"b"
+_BYTES_ZLIB = b"c"
+
+
+def encode(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raw, plain, packed = bytes(value), _BYTES, _BYTES_ZLIB
+    else:
+        raw = json.dumps(
+            value, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+        plain, packed = _JSON, _JSON_ZLIB
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(raw, 6)
+        if len(compressed) < len(raw):
+            return packed + compressed
+    return plain + raw
+
+
+def decode(blob):
+    tag, body = blob[:1], blob[1:]
+    if tag in (_JSON_ZLIB, _BYTES_ZLIB):
+        body = zlib.decompress(body)
+    if tag in (_BYTES, _BYTES_ZLIB):
+        return body
+    if tag in (_JSON, _JSON_ZLIB):
+        return json.loads(body)
+    raise ValueError(f"unknown cache format {tag!r}")
+
+
+def cache_key(namespace, key):
+    parts = key if isinstance(key, tuple) else (key,)
+    return ":".join((KEY_PREFIX, namespace, *(str(part) for part in parts)))
+
+
+class MemoryCache:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop entries whose key matches; returns how many."""
+        with self._lock:
+            doomed = [key for key in self._entries if predicate(key)]
+            for key in doomed:
+                del self._entries[key]
+        return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisError(Exception):
+    pass
+
+
+def _command_bytes(args):
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+def _read_reply(stream):
+    line = stream.readline()
+    if not line.endswith(b"\r\n"):
+        raise RedisError("connection closed")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode()
+    if prefix == b"-":
+        raise RedisError(body.decode())
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        if len(data) != length + 2:
+            raise RedisError("connection closed")
+        return data[:-2]
+    if prefix == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [_read_reply(stream) for _ in range(length)]
+    raise RedisError(f"unexpected reply {line!r}")
+
+
+class RedisCache:
+    """Shared tier over a minimal RESP client with pooled sockets."""
+
+    def __init__(self, url, timeout=None, pool_size=8, retry_after=None):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = (
+            timeout
+            if timeout is not None
+            else float(os.getenv("REDIS_TIMEOUT_MS", "50")) / 1000
+        )
+        self.retry_after = (
+            retry_after
+            if retry_after is not None
+            else float(os.getenv("REDIS_RETRY_SECONDS", "5"))
+        )
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._down_until = 0.0
+
+    def _connect(self):
+        sock = socket.create_connection(
+            (self.host, self.port), timeout=self.timeout
+        )
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = (sock, sock.makefile("rb"))
+        if self.password:
+            self._roundtrip(connection, ("AUTH", self.password))
+        if self.database:
+            self._roundtrip(connection, ("SELECT", self.database))
+        return connection
+
+    @staticmethod
+    def _roundtrip(connection, args):
+        sock, stream = connection
+        sock.sendall(_command_bytes(args))
+        return _read_reply(stream)
+
+    def execute(self, *args):
+        """Run one command; returns None while the server is marked down."""
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = None
+        try:
+            if connection is None:
+                connection = self._connect()
+            reply = self._roundtrip(connection, args)
+        except (OSError, RedisError, ValueError) as exc:
+            if connection is not None:
+                connection[0].close()
+            self._down_until = time.monotonic() + self.retry_after
+            print(f"[cache] redis {args[0]} failed: {exc}")
+            return None
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection[0].close()
+        return reply
+
+    def get(self, key):
+        blob = self.execute("GET", key)
+        if blob is None:
+            return None
+        try:
+            return decode(blob)
+        except (ValueError, zlib.error):
+            return None
+
+    def set(self, key, value, ttl):
+        try:
+            blob = encode(value)
+        except (TypeError, ValueError) as exc:
+            # e.g. Decimal from a numeric column: keep it local-only.
+            print(f"[cache] not shared {key}: {exc}")
+            return
+        self.execute("SET", key, blob, "PX", max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self.execute("DEL", key)
+
+
+class TieredCache:
+    """One namespace of cached responses, local first then shared."""
+
+    def __init__(self, namespace, local, shared=None, local_ttl=None):
+        self.namespace = namespace
+        self.local = local
+        self.shared = shared
+        self.local_ttl = (
+            local_ttl
+            if local_ttl is not None
+            else float(os.getenv("CACHE_LOCAL_TTL_SECONDS", "30"))
+        )
+
+    def _local_ttl(self, ttl):
+        if self.shared is None:
+            return ttl
+        return min(ttl, self.local_ttl)
+
+    def get(self, key):
+        full_key = cache_key(self.namespace, key)
+        value = self.local.get(full_key)
+        if value is not None or self.shared is None:
+            return value
+        value = self.shared.get(full_key)
+        if value is not None:
+            self.local.set(full_key, value, self.local_ttl)
+        return value
+
+    def set(self, key, value, ttl):
+        full_key = cache_key(self.namespace, key)
+        self.local.set(full_key, value, self._local_ttl(ttl))
+        if self.shared is not None:
+            self.shared.set(full_key, value, ttl)
+
+    async def aget(self, key):
+        full_key = cache_key(self.namespace, key)
+        value = self.local.get(full_key)
+        if value is not None or self.shared is None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key, value, ttl):
+        if self.shared is None:
+            self.set(key, value, ttl)
+            return
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    def clear(self):
+        """Drop local entries; shared entries expire on their own TTL."""
+        self.local.clear()
+
+    def __len__(self):
+        return len(self.local)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_backend():
+    if os.getenv("CACHE_BACKEND", "memory") != "redis":
+        return None
+    url = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+    with _shared_lock:
+        if url not in _shared:
+            _shared[url] = RedisCache(url)
+        return _shared[url]
+
+
+def make_cache(namespace, max_entries=1024):
+    return TieredCache(namespace, MemoryCache(max_entries), shared_backend())
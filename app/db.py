@@ -0,0 +1,170 @@
+"""Database connection settings shared by the API routers.
+
+Connections come from a process-wide pool once `open_pool()` has run
+(the app does this during startup). Callers keep using
+`get_db_connection()` and `conn.close()`; closing a pooled connection
+rolls back any open transaction and returns it to the pool.
+"""
+
+import os
+from threading import Lock
+from typing import Optional
+
+import psycopg2
+from psycopg2 import pool as psycopg2_pool
+
+from deadline import connect_timeout
+from metrics import DB_CONNECTS, gauge
+
+_pool = None
+_pool_lock = Lock()
+_in_use = {"count": 0}
+_in_use_lock = Lock()
+
+
+def resolve_db_host() -> Optional[str]:
+    host = os.getenv("DBHOST") or os.getenv("INSTANCE_UNIX_SOCKET")
+    if host:
+        return host
+    instance = (
+        os.getenv("CLOUD_SQL_CONNECTION_NAME")
+        or os.getenv("INSTANCE_CONNECTION_NAME")
+        or os.getenv("CLOUDSQL_INSTANCE")
+        or os.getenv("SQL_INSTANCE")
+        or os.getenv("DB_INSTANCE")
+        or os.getenv("GOOGLE_CLOUD_SQL_INSTANCE")
+        or os.getenv("INSTANCE")
+    )
+    return f"/cloudsql/{instance}" if instance else None
+
+
+def connection_kwargs() -> Optional[dict]:
+    """Return psycopg2.connect() arguments, or None when unconfigured."""
+    settings = {
+        "host": resolve_db_host(),
+        "dbname": os.getenv("DBNAME"),
+        "user": os.getenv("DBUSER"),
+        "password": os.getenv("DBPASS"),
+    }
+    if not all(settings.values()):
+        return None
+    return {**settings, "connect_timeout": 5}
+
+
+def pool_bounds():
+    minimum = int(os.getenv("DB_POOL_MIN", "1"))
+    maximum = int(os.getenv("DB_POOL_MAX", "10"))
+    if not 0 <= minimum <= maximum or maximum < 1:
+        raise ValueError("need 0 <= DB_POOL_MIN <= DB_POOL_MAX, max >= 1")
+    return minimum, maximum
+
+
+class PooledConnection:
+    """A pooled psycopg2 connection whose close() hands it back."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        with _in_use_lock:
+            _in_use["count"] -= 1
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        try:
+            self._pool.putconn(conn, close=broken)
+        except psycopg2_pool.PoolError:
+            conn.close()
+
+
+def open_pool():
+    """Create the pool and its DB_POOL_MIN connections; returns the pool."""
+    global _pool
+    kwargs = connection_kwargs()
+    if kwargs is None:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            minimum, maximum = pool_bounds()
+            _pool = psycopg2_pool.ThreadedConnectionPool(
+                minimum, maximum, **kwargs
+            )
+            DB_CONNECTS.inc(minimum, result="ok")
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def _connect(kwargs):
+    timeout = connect_timeout(kwargs["connect_timeout"])
+    try:
+        conn = psycopg2.connect(**{**kwargs, "connect_timeout": timeout})
+    except psycopg2.Error as exc:
+        print("DATABASE CONNECTION FAILED:", exc)
+        DB_CONNECTS.inc(result="failed")
+        return None
+    DB_CONNECTS.inc(result="ok")
+    return conn
+
+
+def dedicated_connection():
+    """A connection outside the pool, for long-lived sessions (LISTEN)."""
+    kwargs = connection_kwargs()
+    if kwargs is None:
+        return None
+    return _connect(kwargs)
+
+
+def get_db_connection():
+    """Open a connection, or return None when the database is unavailable."""
+    kwargs = connection_kwargs()
+    if kwargs is None:
+        DB_CONNECTS.inc(result="unconfigured")
+        return None
+    pool = _pool
+    if pool is None:
+        return _connect(kwargs)
+    try:
+        conn = pool.getconn()
+    except psycopg2_pool.PoolError:
+        # Exhausted: serve this request on a one-off connection.
+        DB_CONNECTS.inc(result="pool_exhausted")
+        return _connect(kwargs)
+    except psycopg2.Error as exc:
+        print("DATABASE CONNECTION FAILED:", exc)
+        DB_CONNECTS.inc(result="failed")
+        return None
+    if conn.closed:
+        pool.putconn(conn, close=True)
+        return _connect(kwargs)
+    with _in_use_lock:
+        _in_use["count"] += 1
+    return PooledConnection(pool, conn)
+
+
+gauge(
+    "hudadak_db_pool_connections",
+    "Pooled database connections checked out, and the pool limits.",
+    lambda: {
+        ("in_use",): _in_use["count"] if _pool is not None else 0,
+        ("max",): _pool.maxconn if _pool is not None else 0,
+        ("min",): _pool.minconn if _pool is not None else 0,
+    },
+    ("state",),
+)
@@ -0,0 +1,100 @@
+"""Per-request time budgets.
+
+DeadlineMiddleware gives every HTTP request a Budget of
+REQUEST_DEADLINE_MS (default 8000), or a per-endpoint value from
+REQUEST_DEADLINES_MS keyed by the first path segment, for example
+"nearest=3000,forecast=6000". Code serving the request uses it to cap
+its own waits: new database connections, SQL statements via a
+transaction-local statement_timeout, and upstream calls via wait().
+Outside a request there is no budget and every helper is a no-op.
+"""
+
+import asyncio
+import math
+import os
+import time
+from contextvars import ContextVar
+
+# libpq rounds connect_timeout values below 2 seconds up to 2.
+MIN_CONNECT_TIMEOUT = 2
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Budget:
+    def __init__(self, seconds, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self.clock())
+
+
+_budget = ContextVar("request_budget", default=None)
+
+
+def budget_seconds(path):
+    """The configured budget for a request path, in seconds."""
+    endpoint = path.strip("/").split("/", 1)[0]
+    for item in os.getenv("REQUEST_DEADLINES_MS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() == endpoint and value.strip():
+            return float(value) / 1000
+    return float(os.getenv("REQUEST_DEADLINE_MS", "8000")) / 1000
+
+
+def remaining():
+    """Seconds left for the current request, or None without a budget."""
+    budget = _budget.get()
+    return None if budget is None else budget.remaining()
+
+
+def connect_timeout(default):
+    left = remaining()
+    if left is None:
+        return default
+    return max(MIN_CONNECT_TIMEOUT, min(default, math.ceil(left)))
+
+
+def apply_statement_timeout(cur):
+    """Bound the statements of cur's transaction by the remaining budget."""
+    left = remaining()
+    if left is None:
+        return
+    if left <= 0:
+        raise DeadlineExceeded("sql")
+    # SET LOCAL lasts until the transaction ends; pooled connections are
+    # rolled back when returned.
+    cur.execute(
+        "SET LOCAL statement_timeout = %s", (max(1, int(left * 1000)),)
+    )
+
+
+async def wait(awaitable, what):
+    """Await within the remaining budget; raises DeadlineExceeded."""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(what) from None
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware that starts each request's budget."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _budget.set(Budget(budget_seconds(scope["path"])))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _budget.reset(token)
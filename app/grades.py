@@ -0,0 +1,13 @@
+"""Korean CAI grades (1 좋음 .. 4 매우나쁨) from PM concentrations."""
+
+from typing import Optional
+
+
+def kr_grade_from_pm(pm10: Optional[float], pm25: Optional[float]) -> Optional[int]:
+    if pm10 is None and pm25 is None:
+        return None
+    g10 = 1 if (pm10 is not None and pm10 <= 30) else 2 if (pm10 is not None and pm10 <= 80) else 3 if (pm10 is not None and pm10 <= 150) else 4
+    g25 = 1 if (pm25 is not None and pm25 <= 15) else 2 if (pm25 is not None and pm25 <= 35) else 3 if (pm25 is not None and pm25 <= 75) else 4
+    if pm10 is None: return g25
+    if pm25 is None: return g10
+    return max(g10, g25)
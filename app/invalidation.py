@@ -0,0 +1,148 @@
+"""Invalidate in-process caches when ingestion commits new data.
+
+Ingestion jobs call ingest_common.notify_change() inside their writing
+transaction, so Postgres delivers a NOTIFY on CHANNEL exactly when the
+data becomes visible. Each worker runs one daemon thread that LISTENs on
+a dedicated connection and passes every event to the handlers modules
+registered with on_change(). An event is a dict:
+
+    kind     "ingest", "raster" or "summaries"; None means anything
+    source   provider or job name
+    version  SUM(air.ingest_commits.version) at the commit
+    stations written station ids, or None when not limited to a set
+    sido, sigungu, bbox
+             regions and [south, west, north, east] of those stations
+
+Notifications sent while the listener is disconnected are lost, so every
+(re)connect dispatches CATCH_ALL. Caches that rely on events to stay
+correct, such as long-lived DB answers, check listening() before use,
+and version rechecks stretch to LISTENING_CHECK_SECONDS meanwhile. Set
+CACHE_INVALIDATION=0 to disable the listener.
+"""
+
+import json
+import os
+import select
+import threading
+
+import db
+from metrics import gauge
+
+# Must match ingest_common.NOTIFY_CHANNEL.
+CHANNEL = "hudadak_ingest"
+CATCH_ALL = {
+    "kind": None,
+    "source": None,
+    "version": None,
+    "stations": None,
+    "sido": None,
+    "sigungu": None,
+    "bbox": None,
+}
+POLL_SECONDS = 5.0
+
+_handlers = []
+_state = {"listening": False, "generation": 0}
+
+gauge(
+    "hudadak_invalidation_listening",
+    "1 while this worker is listening for ingestion commits.",
+    lambda: 1 if _state["listening"] else 0,
+)
+
+
+def on_change(handler):
+    """Register handler(event); usable as a decorator."""
+    _handlers.append(handler)
+    return handler
+
+
+def listening():
+    return _state["listening"]
+
+
+def generation():
+    """Dispatched event count; a reader that saw it change while it was
+    querying must not cache what it read."""
+    return _state["generation"]
+
+
+def parse(payload):
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        return dict(CATCH_ALL)
+    if not isinstance(event, dict):
+        return dict(CATCH_ALL)
+    return {**CATCH_ALL, **event}
+
+
+def check_interval(default):
+    """Seconds between version rechecks; events make most of them moot."""
+    if _state["listening"]:
+        return max(default, float(os.getenv("LISTENING_CHECK_SECONDS", "300")))
+    return default
+
+
+def affects(event, kind):
+    return event["kind"] is None or event["kind"] == kind
+
+
+def dispatch(event):
+    _state["generation"] += 1
+    for handler in list(_handlers):
+        try:
+            handler(event)
+        except Exception as exc:
+            print(f"[listen] handler {handler.__name__} failed: {exc}")
+
+
+class Listener(threading.Thread):
+    def __init__(self, connect=None, retry_seconds=None):
+        super().__init__(name="cache-invalidation", daemon=True)
+        self._connect = connect or db.dedicated_connection
+        self.retry_seconds = retry_seconds or float(
+            os.getenv("INVALIDATION_RETRY_SECONDS", "10")
+        )
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def listen(self, conn):
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        _state["listening"] = True
+        print(f"[listen] channel={CHANNEL}")
+        dispatch(dict(CATCH_ALL))
+        while not self._stopped.is_set():
+            if not select.select([conn], [], [], POLL_SECONDS)[0]:
+                continue
+            conn.poll()
+            while conn.notifies:
+                dispatch(parse(conn.notifies.pop(0).payload))
+
+    def run(self):
+        while not self._stopped.is_set():
+            conn = self._connect()
+            if conn is not None:
+                try:
+                    self.listen(conn)
+                except Exception as exc:
+                    print(f"[listen] connection lost: {exc}")
+                finally:
+                    _state["listening"] = False
+                    conn.close()
+            self._stopped.wait(self.retry_seconds)
+
+
+def start_listener():
+    """Start the worker's listener; None when disabled or unconfigured."""
+    if os.getenv("CACHE_INVALIDATION", "1") != "1":
+        return None
+    if db.connection_kwargs() is None:
+        return None
+    listener = Listener()
+    listener.start()
+    return listener
@@ -1,22 +1,114 @@
 # main.py
+from contextlib import asynccontextmanager
 from typing import List, Optional, Dict, Any
 from fastapi import FastAPI, Query, APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from psycopg2.extras import RealDictCursor
 import psycopg2
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
-import os, asyncio, json, httpx
-from routers import geo_router
+import os, asyncio, json, httpx, math, time
+import db
+import invalidation
+import selection_raster
+from cache import MemoryCache, make_cache
+from deadline import (
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    apply_statement_timeout,
+)
+from grades import kr_grade_from_pm as _kr_grade_from_pm
+from metrics import (
+    MetricsMiddleware,
+    TimedJSONResponse,
+    gauge,
+    record_cache,
+    set_labels,
+    stage,
+)
+from plan_capture import maybe_capture
+from resilience import CircuitOpenError, StaleWhileRevalidate, breaker
+from warmup import (
+    STATUS as WARMUP_STATUS,
+    hot_cells,
+    load_snapshots,
+    run_warmup,
+    warm_connections,
+)
+from routers import (
+    export_router,
+    geo_router,
+    history_router,
+    metrics_router,
+    plans_router,
+    regions_router,
+    tiles_router,
+)
 from selection import (
     build_pm_query,
     no_data_reason,
     query_params,
+    sigungu_code_range,
     validate_search_scope,
 )
 
+# 업스트림 호출이 매번 TLS 연결을 새로 맺지 않도록 공유하는 클라이언트
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+async def _prefetch_hot_cells(cells):
+    """예보와 같은 캐시 키로 인기 좌표의 모델 데이터를 미리 받아 둔다."""
+    results = await asyncio.gather(
+        *(
+            fetch
+            for lat, lon in cells
+            for fetch in (
+                cached_fetch_openmeteo(lat, lon, keys=POLLUTANT_KEYS),
+                cached_fetch_weather(lat, lon, keys=MET_KEYS),
+            )
+        ),
+        return_exceptions=True,
+    )
+    failed = sum(isinstance(item, Exception) for item in results)
+    return f"{len(results) - failed}/{len(results)} upstream responses cached"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _http_client
+    _http_client = httpx.AsyncClient(timeout=httpx.Timeout(15.0))
+    cells = hot_cells()
+    lat, lon = cells[0] if cells else (37.5665, 126.9780)
+    await run_warmup(
+        [
+            (
+                "db_pool",
+                lambda: asyncio.to_thread(warm_connections, lat, lon),
+            ),
+            ("snapshots", lambda: asyncio.to_thread(load_snapshots, cells)),
+            ("model_prefetch", lambda: _prefetch_hot_cells(cells)),
+        ]
+    )
+    # 수집 커밋 알림을 받아 캐시를 무효화한다 (invalidation.py 참고).
+    listener = invalidation.start_listener()
+    try:
+        yield
+    finally:
+        if listener is not None:
+            listener.stop()
+        client, _http_client = _http_client, None
+        await client.aclose()
+        db.close_pool()
+
+
 # --- FastAPI 앱 ---
-app = FastAPI(title="Hudadak Air API", version="1.1")
+app = FastAPI(
+    title="Hudadak Air API",
+    version="1.1",
+    default_response_class=TimedJSONResponse,
+    lifespan=lifespan,
+)
 
 # --- CORS ---
 app.add_middleware(
@@ -31,60 +123,94 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request, exc):
+    # 부분 응답조차 만들 수 없을 때만 여기까지 온다.
+    return JSONResponse(
+        status_code=504,
+        content={"detail": {"code": "DEADLINE_EXCEEDED", "stage": str(exc)}},
+    )
+
 # ==============
-#  메모리 캐시
+#  응답 캐시 (프로세스 L1 + 선택적 공유 L2, cache.py 참고)
 # ==============
-_cache: Dict[Any, Any] = {}
+_cache = make_cache("openmeteo", max_entries=2048)
 
-def _cache_get(key):
-    item = _cache.get(key)
-    if not item:
-        return None
-    val, exp = item
-    if datetime.now(timezone.utc) > exp:
-        _cache.pop(key, None)
-        return None
-    return val
+gauge(
+    "hudadak_upstream_cache_entries",
+    "Open-Meteo responses held in the in-process cache tier.",
+    lambda: len(_cache),
+)
 
-def _cache_set(key, val, ttl_sec=120):
-    _cache[key] = (val, datetime.now(timezone.utc) + timedelta(seconds=ttl_sec))
+# ==============
+#  DB 답변 캐시: 수집 알림을 듣는 동안에만 쓰고, 바뀐 측정소 근처만 지운다.
+# ==============
+_answers = MemoryCache(max_entries=8192)
+# 선택 SQL과 같은 관측 창. 고른 측정소가 창을 벗어나면 답도 바뀐다.
+ANSWER_WINDOW = timedelta(hours=3)
+SEARCH_RADIUS_M = 50000
+
+gauge(
+    "hudadak_db_answer_cache_entries",
+    "/nearest selection rows held while listening for ingestion commits.",
+    lambda: len(_answers),
+)
 
-# =====================================
-#  공통: DB 연결 (Cloud SQL / TCP 모두)
-# =====================================
-def _resolve_db_host() -> Optional[str]:
-    host = os.getenv("DBHOST") or os.getenv("INSTANCE_UNIX_SOCKET")
-    if host:
-        return host
-    inst = (
-        os.getenv("CLOUD_SQL_CONNECTION_NAME")
-        or os.getenv("INSTANCE_CONNECTION_NAME")
-        or os.getenv("CLOUDSQL_INSTANCE")
-        or os.getenv("SQL_INSTANCE")
-        or os.getenv("DB_INSTANCE")
-        or os.getenv("GOOGLE_CLOUD_SQL_INSTANCE")
-        or os.getenv("INSTANCE")
+
+def _answer_ttl(row: dict) -> float:
+    ttl = float(os.getenv("DB_ANSWER_TTL_SECONDS", "900"))
+    now = datetime.now(timezone.utc)
+    for key, value in row.items():
+        if key.endswith("display_ts") and isinstance(value, datetime):
+            ttl = min(ttl, (value + ANSWER_WINDOW - now).total_seconds())
+    return ttl
+
+
+def _store_answer(key: tuple, row: Optional[dict]) -> None:
+    ttl = _answer_ttl(row or {})
+    if ttl > 0:
+        # 행이 없는 답은 {}로 저장해 미스와 구분한다.
+        _answers.set(key, row or {}, ttl)
+
+
+def _answer_affected(key: tuple, event: dict) -> bool:
+    lookup_mode, region_level, region_code, _, lat, lon = key
+    if lookup_mode == "search":
+        if region_level == "sido":
+            return region_code in (event["sido"] or ())
+        low, high = sigungu_code_range(region_code)
+        return any(low <= code <= high for code in event["sigungu"] or ())
+    south, west, north, east = event["bbox"]
+    dlat = SEARCH_RADIUS_M / 111320.0
+    dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+    return (
+        south - dlat <= lat <= north + dlat
+        and west - dlon <= lon <= east + dlon
     )
-    return f"/cloudsql/{inst}" if inst else None
 
-def get_db_connection():
-    host = _resolve_db_host()
-    name = os.getenv("DBNAME")
-    user = os.getenv("DBUSER")
-    pwd  = os.getenv("DBPASS")
 
-    print("[DBCFG]", {"host": host, "dbname": name, "user": user, "pwd": bool(pwd)})
+@invalidation.on_change
+def _drop_answers(event: dict) -> None:
+    if not invalidation.affects(event, "ingest"):
+        return
+    if event["stations"] is None:
+        _answers.clear()
+    elif event["bbox"]:
+        _answers.delete_where(lambda key: _answer_affected(key, event))
 
-    if not all([host, name, user, pwd]):
-        return None
-    try:
-        return psycopg2.connect(
-            host=host, dbname=name, user=user, password=pwd, connect_timeout=5
-        )
-    except Exception as e:
-        print("🔥 DATABASE CONNECTION FAILED:", e)
-        return None
+
+# =====================================
+#  공통: DB 연결 (Cloud SQL / TCP 모두)
+# =====================================
+def get_db_connection():
+    # 시작 시 열어 둔 풀에서 빌려 오며, close()하면 풀로 돌아간다.
+    return db.get_db_connection()
 
 # ================
 #  시간/등급 유틸
@@ -97,15 +223,6 @@ def _now_kst_floor_hour() -> datetime:
         minute=0, second=0, microsecond=0
     )
 
-def _kr_grade_from_pm(pm10: Optional[float], pm25: Optional[float]) -> Optional[int]:
-    if pm10 is None and pm25 is None:
-        return None
-    g10 = 1 if (pm10 is not None and pm10 <= 30) else 2 if (pm10 is not None and pm10 <= 80) else 3 if (pm10 is not None and pm10 <= 150) else 4
-    g25 = 1 if (pm25 is not None and pm25 <= 15) else 2 if (pm25 is not None and pm25 <= 35) else 3 if (pm25 is not None and pm25 <= 75) else 4
-    if pm10 is None: return g25
-    if pm25 is None: return g10
-    return max(g10, g25)
-
 # ======================
 #  Badge (간단 규칙 샘플)
 # ======================
@@ -155,12 +272,24 @@ def _compat_pm_meta(pm10_meta: Optional[dict], pm25_meta: Optional[dict]) -> dic
     return pm10_meta or pm25_meta or {}
 
 app.include_router(geo_router) 
+app.include_router(history_router)
+app.include_router(tiles_router)
+app.include_router(export_router)
+app.include_router(metrics_router)
+app.include_router(plans_router)
+app.include_router(regions_router)
 
 # =======================================
 #  Open-Meteo 호출 유틸
 # =======================================
-OPEN_METEO_AQ = "https://air-quality-api.open-meteo.com/v1/air-quality"
-WEATHER_FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+# 부하 테스트에서는 loadtest/fake_upstream.py로 바꿔 가리킨다.
+OPEN_METEO_AQ = os.getenv(
+    "OPEN_METEO_AQ_URL",
+    "https://air-quality-api.open-meteo.com/v1/air-quality",
+)
+WEATHER_FORECAST_URL = os.getenv(
+    "OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast"
+)
 
 # 오염물질 키
 POLLUTANT_KEYS = [
@@ -192,6 +321,20 @@ MET_KEYS = [
     "precipitation",
 ]
 
+async def _upstream_get(url: str, params: Dict[str, Any]) -> httpx.Response:
+    timeout = httpx.Timeout(15.0)
+    if _http_client is not None:
+        return await _http_client.get(url, params=params, timeout=timeout)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        return await client.get(url, params=params)
+
+class UpstreamHTTPError(HTTPException):
+    """업스트림이 오류 상태로 응답함; 호출자에게는 502로 전달된다."""
+
+    def __init__(self, upstream_status: int, detail: Dict[str, Any]):
+        super().__init__(status_code=502, detail=detail)
+        self.upstream_status = upstream_status
+
 async def fetch_openmeteo(lat: float, lon: float, hourly_keys: List[str]) -> Dict[str, Any]:
     params = {
         "latitude": lat,
@@ -199,16 +342,14 @@ async def fetch_openmeteo(lat: float, lon: float, hourly_keys: List[str]) -> Dic
         "hourly": ",".join(hourly_keys),
         "timezone": "Asia/Seoul",
     }
-    timeout = httpx.Timeout(15.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.get(OPEN_METEO_AQ, params=params)
-        if r.status_code >= 400:
-            try:
-                err = r.json()
-            except Exception:
-                err = {"status_code": r.status_code, "text": r.text[:300]}
-            raise HTTPException(status_code=502, detail={"provider": "open-meteo", "error": err})
-        return r.json()
+    r = await _upstream_get(OPEN_METEO_AQ, params)
+    if r.status_code >= 400:
+        try:
+            err = r.json()
+        except Exception:
+            err = {"status_code": r.status_code, "text": r.text[:300]}
+        raise UpstreamHTTPError(r.status_code, {"provider": "open-meteo", "error": err})
+    return r.json()
 
 async def fetch_weather(lat: float, lon: float, hourly_keys: List[str]) -> Dict[str, Any]:
     params = {
@@ -217,33 +358,55 @@ async def fetch_weather(lat: float, lon: float, hourly_keys: List[str]) -> Dict[
         "hourly": ",".join(hourly_keys),
         "timezone": "Asia/Seoul",
     }
-    timeout = httpx.Timeout(15.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.get(WEATHER_FORECAST_URL, params=params)
-        if r.status_code >= 400:
-            try:
-                err = r.json()
-            except Exception:
-                err = {"status_code": r.status_code, "text": r.text[:300]}
-            raise HTTPException(status_code=502, detail={"provider": "open-meteo-weather", "error": err})
-        return r.json()
-
-# 캐시 래퍼
+    r = await _upstream_get(WEATHER_FORECAST_URL, params)
+    if r.status_code >= 400:
+        try:
+            err = r.json()
+        except Exception:
+            err = {"status_code": r.status_code, "text": r.text[:300]}
+        raise UpstreamHTTPError(r.status_code, {"provider": "open-meteo-weather", "error": err})
+    return r.json()
+
+# 캐시 래퍼: 만료된 항목은 바로 돌려주고 뒤에서 갱신하며,
+# 업스트림이 계속 실패하면 차단기가 열려 타임아웃을 기다리지 않는다.
+_model_data = StaleWhileRevalidate(_cache)
+
+
+def _upstream_failed(exc: Exception) -> bool:
+    # 시간 초과·전송 오류·5xx만 차단기 실패로 센다. 4xx는 요청 탓이라
+    # 잘못된 좌표 몇 번으로 모든 사용자의 차단기가 열리지 않게 한다.
+    if isinstance(exc, UpstreamHTTPError):
+        return exc.upstream_status >= 500
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+async def _guarded(provider: str, fetch):
+    try:
+        return await breaker(provider).call(fetch, _upstream_failed)
+    except CircuitOpenError:
+        raise HTTPException(
+            status_code=503,
+            detail={"provider": provider, "error": "circuit open"},
+        )
+
 async def cached_fetch_openmeteo(lat, lon, keys):
     ck = ("aq", round(lat,3), round(lon,3), ",".join(keys))
-    hit = _cache_get(ck)
-    if hit: return hit
-    data = await fetch_openmeteo(lat, lon, keys)
-    _cache_set(ck, data, 120)
-    return data
+    return await _model_data.get(
+        "openmeteo_aq",
+        ck,
+        lambda: _guarded(
+            "open-meteo", lambda: fetch_openmeteo(lat, lon, keys)
+        ),
+    )
 
 async def cached_fetch_weather(lat, lon, keys):
     ck = ("wx", round(lat,3), round(lon,3), ",".join(keys))
-    hit = _cache_get(ck)
-    if hit: return hit
-    data = await fetch_weather(lat, lon, keys)
-    _cache_set(ck, data, 120)
-    return data
+    return await _model_data.get(
+        "openmeteo_weather",
+        ck,
+        lambda: _guarded(
+            "open-meteo-weather", lambda: fetch_weather(lat, lon, keys)
+        ),
+    )
 
 def _as_seoul_datetime(value: str) -> Optional[datetime]:
     if not value:
@@ -429,12 +592,13 @@ def _fetch_owm_gas_backup(conn, lat: float, lon: float) -> Dict[str, Any]:
       m.raw
     FROM air.stations s
     JOIN LATERAL (
-      SELECT ts, raw
-      FROM air.measurements
-      WHERE station_id = s.id
-        AND ts <= NOW() + INTERVAL '30 minutes'
-        AND ts >= NOW() - INTERVAL '24 hours'
-      ORDER BY ts DESC
+      SELECT am.ts, COALESCE(p.payload, am.raw) AS raw
+      FROM air.measurements am
+      LEFT JOIN air.raw_payloads p ON p.id = am.raw_id
+      WHERE am.station_id = s.id
+        AND am.ts <= NOW() + INTERVAL '30 minutes'
+        AND am.ts >= NOW() - INTERVAL '24 hours'
+      ORDER BY am.ts DESC
       LIMIT 1
     ) m ON TRUE
     WHERE UPPER(s.provider) = 'OWM'
@@ -442,6 +606,7 @@ def _fetch_owm_gas_backup(conn, lat: float, lon: float) -> Dict[str, Any]:
     LIMIT 1;
     """
     with conn.cursor() as cur:
+        apply_statement_timeout(cur)
         cur.execute(q, (lon, lat))
         row = cur.fetchone()
         if row and not isinstance(row, dict):
@@ -467,6 +632,36 @@ def _fetch_owm_gas_backup(conn, lat: float, lon: float) -> Dict[str, Any]:
         "co": components.get("co"),
     }
 
+def _fill_owm_gas_backup(
+    conn,
+    lat: float,
+    lon: float,
+    gas: Dict[str, Any],
+    gas_meta: Dict[str, Optional[dict]],
+) -> None:
+    missing = [key for key in GAS_API_KEYS if gas[key] is None]
+    if not missing:
+        return
+    try:
+        backup = _fetch_owm_gas_backup(conn, lat, lon)
+    except Exception as e:
+        print(f"[nearest] OWM gas backup failed: {e}")
+        return
+    for key in missing:
+        if backup.get(key) is None:
+            continue
+        gas[key] = backup[key]
+        gas_meta[key] = {
+            "provider": "OWM",
+            "source_kind": "model",
+            "display_ts": backup.get("display_ts"),
+            "station": backup.get("name"),
+            "station_id": None,
+            "lat": None,
+            "lon": None,
+            "distance_m": None,
+        }
+
 # =======================================
 #  /nearest : DB 우선 → Open-Meteo 폴백
 # =======================================
@@ -477,8 +672,8 @@ def _fetch_owm_gas_backup(conn, lat: float, lon: float) -> Dict[str, Any]:
 # 교체
 @app.get("/nearest")
 async def nearest(
-    lat: float,
-    lon: float,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
     source: str = Query("db", pattern="^(db|model|auto)$"),
     pm_fallback: bool = False,
     lookup_mode: str = Query("current", pattern="^(current|search)$"),
@@ -503,6 +698,9 @@ async def nearest(
     fallback_reason = None
     if source == "model":
         fallback_reason = "MODEL_REQUESTED"
+    set_labels(source=source, lookup_mode=lookup_mode)
+    # 시간 예산이나 업스트림 장애로 일부를 빼고 답할 때의 사유
+    degraded_reasons: List[str] = []
 
     def pm_only_result(
         pm10_value,
@@ -542,6 +740,8 @@ async def nearest(
             },
             "source": response_source,
             "lookup_mode": lookup_mode,
+            "degraded": bool(degraded_reasons),
+            "degraded_reasons": degraded_reasons,
             "selection_scope": (
                 {
                     "type": "administrative_region",
@@ -562,7 +762,29 @@ async def nearest(
         result["badges"] = generate_badges(result)
         return result
 
-    conn = get_db_connection()
+    if (
+        source == "db"
+        and lookup_mode == "current"
+        and selection_raster.enabled()
+    ):
+        # 미리 계산한 격자에서 측정소를 바로 읽는다. 쓸 수 없으면 SQL 경로.
+        with stage("raster_lookup"):
+            raster = selection_raster.cached_raster(get_db_connection)
+            row = (
+                selection_raster.selection_row(raster, lat, lon)
+                if raster is not None
+                else None
+            )
+        record_cache("selection_raster", row is not None)
+        pm10_meta = _pm_meta(row, "pm10") if row else None
+        pm25_meta = _pm_meta(row, "pm25") if row else None
+        if row and ((pm10_meta and pm25_meta) or not pm_fallback):
+            return pm_only_result(
+                row.get("pm10"), row.get("pm25"), pm10_meta, pm25_meta
+            )
+
+    with stage("db_connect"):
+        conn = get_db_connection()
     if conn and source != "model":
         try:
             include_gases = source == "auto"
@@ -571,21 +793,52 @@ async def nearest(
                 region_level,
                 include_gases=include_gases,
             )
-            with conn.cursor() as cur:
-                cur.execute(
-                    q,
-                    query_params(
-                        lookup_mode,
-                        lon,
-                        lat,
-                        region_code,
-                        include_gases=include_gases,
-                    ),
-                )
-                row = cur.fetchone()
-                if row and not isinstance(row, dict):
-                    cols = [d[0] for d in cur.description]
-                    row = dict(zip(cols, row))
+            params = query_params(
+                lookup_mode,
+                lon,
+                lat,
+                region_code,
+                include_gases=include_gases,
+            )
+            answer_key = (
+                lookup_mode,
+                region_level,
+                region_code,
+                include_gases,
+                round(lat, 5),
+                round(lon, 5),
+            )
+            listening = invalidation.listening()
+            generation = invalidation.generation()
+            row = _answers.get(answer_key) if listening else None
+            if listening:
+                record_cache("db_answers", row is not None)
+            if row is None:
+                query_started = time.perf_counter()
+                try:
+                    with stage("db_query"), conn.cursor() as cur:
+                        apply_statement_timeout(cur)
+                        cur.execute(q, params)
+                        row = cur.fetchone()
+                        if row and not isinstance(row, dict):
+                            cols = [d[0] for d in cur.description]
+                            row = dict(zip(cols, row))
+                finally:
+                    # 문장 타임아웃으로 취소된 조회가 가장 느린 계획이다.
+                    maybe_capture(
+                        (
+                            ("lookup_mode", lookup_mode),
+                            ("region_level", region_level),
+                            ("include_gases", include_gases),
+                        ),
+                        q,
+                        params,
+                        time.perf_counter() - query_started,
+                    )
+                # 조회 중에 알림이 오면 읽은 답이 이미 낡았을 수 있다.
+                if listening and invalidation.generation() == generation:
+                    _store_answer(answer_key, row)
+            row = row or None
             has_pm_observation = bool(
                 row
                 and (
@@ -678,6 +931,14 @@ async def nearest(
                         )
                 except Exception as e:
                     print(f"[nearest] Open-Meteo supplement failed: {e}")
+                    degraded_reasons.append(
+                        "model_supplement_deadline"
+                        if isinstance(e, DeadlineExceeded)
+                        else "model_supplement_failed"
+                    )
+                    if source == "auto":
+                        # 모델 장애 시 저장된 OWM 가스 값으로 빈 항목을 채운다.
+                        _fill_owm_gas_backup(conn, lat, lon, gas, gas_meta)
 
                 if source == "db":
                     return pm_only_result(
@@ -719,6 +980,8 @@ async def nearest(
                     },
                     "source": "db",
                     "lookup_mode": lookup_mode,
+                    "degraded": bool(degraded_reasons),
+                    "degraded_reasons": degraded_reasons,
                     "selection_scope": (
                         {
                             "type": "administrative_region",
@@ -741,11 +1004,18 @@ async def nearest(
         except Exception as e:
             print(f"[nearest] DB query failed → fallback: {e}")
             fallback_reason = "DB_QUERY_FAILED"
+            if isinstance(
+                e, (psycopg2.errors.QueryCanceled, DeadlineExceeded)
+            ):
+                degraded_reasons.append("db_query_deadline")
         finally:
             try: conn.close()
             except: pass
 
     # 여기까지 왔다는 건: DB 연결 실패 또는 결과 없음
+    set_labels(
+        fallback_reason=fallback_reason or no_data_reason(lookup_mode)
+    )
     if source == "db" and not pm_fallback:
         reason = fallback_reason or no_data_reason(lookup_mode)
         raise HTTPException(
@@ -851,6 +1121,8 @@ async def nearest(
         "station": {"name": "Open-Meteo", "provider": "OPENMETEO", "kind": "model"},
         "source": "model",
         "lookup_mode": lookup_mode,
+        "degraded": bool(degraded_reasons),
+        "degraded_reasons": degraded_reasons,
         "fallback_reason": fallback_reason or no_data_reason(lookup_mode),
         "selection_scope": (
             {
@@ -876,8 +1148,8 @@ def root():
 
 @app.get("/forecast")
 async def forecast(
-    lat: float = Query(37.57, description="위도"),
-    lon: float = Query(126.98, description="경도"),
+    lat: float = Query(37.57, ge=-90, le=90, description="위도"),
+    lon: float = Query(126.98, ge=-180, le=180, description="경도"),
     horizon: int = Query(24, ge=6, le=120, description="예보 시간(시간 단위)")
 ):
     """
@@ -887,7 +1159,19 @@ async def forecast(
     # 병렬 호출 (캐시 사용)
     aq_task = cached_fetch_openmeteo(lat, lon, keys=POLLUTANT_KEYS)
     wx_task = cached_fetch_weather(lat, lon, keys=MET_KEYS)
-    aq, wx = await asyncio.gather(aq_task, wx_task)
+    aq, wx = await asyncio.gather(aq_task, wx_task, return_exceptions=True)
+    if isinstance(aq, BaseException):
+        raise aq
+    # 바람/강수가 늦거나 실패하면 공기질 예보만 돌려준다.
+    degraded_reasons: List[str] = []
+    if isinstance(wx, BaseException):
+        print(f"[forecast] weather fetch failed: {wx}")
+        degraded_reasons.append(
+            "weather_deadline"
+            if isinstance(wx, DeadlineExceeded)
+            else "weather_failed"
+        )
+        wx = {}
 
     ah = aq.get("hourly", {}) if aq else {}
     wh = wx.get("hourly", {}) if wx else {}
@@ -934,7 +1218,9 @@ async def forecast(
         "horizon": f"{len(hourly)}h",
         "issued_at": issued_ts,
         "hourly": hourly,
-        "model": {"type": "openmeteo_hourly+weather_merge", "version": "1.0.1", "mape": None}
+        "model": {"type": "openmeteo_hourly+weather_merge", "version": "1.0.1", "mape": None},
+        "degraded": bool(degraded_reasons),
+        "degraded_reasons": degraded_reasons,
     }
 
 # ==============
@@ -1031,6 +1317,13 @@ def get_notices():
 def healthz():
     return {"ok": True}
 
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    # 시작 워밍업이 끝나야 트래픽을 받을 준비가 된 것으로 본다.
+    if not WARMUP_STATUS["ready"]:
+        return JSONResponse(status_code=503, content=WARMUP_STATUS)
+    return WARMUP_STATUS
+
 @app.get("/{splat:path}", include_in_schema=False)
 def catch_all(splat: str):
     return {"status": "ok", "message": "Welcome to Hudadak Air API", "path": f"/{splat}"}
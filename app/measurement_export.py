@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""Bulk export of measurements or rollups as NDJSON or CSV.
+
+Usage: python app/measurement_export.py --start 2026-07-01 --end 2026-07-08
+           [--source raw|hourly|daily] [--format ndjson|csv]
+           [--station-id ID | --region-level sido|sigungu --region-code CODE]
+           [--cursor TOKEN] [--output PATH]
+
+Rows are read through a named (server-side) cursor in fetch_size batches
+and ordered by (time, station_id), so memory stays flat however long the
+window is. A cursor token encodes the key of the last row a consumer
+received; passing it back resumes the export right after that row.
+
+HTTP clients cannot see where a broken download stopped, so the API
+ends every chunk with a checkpoint: an NDJSON line {"next_cursor": ...}
+or a CSV comment line "# next_cursor=...". To resume, drop everything
+after the last complete checkpoint and pass its token back.
+"""
+
+import argparse
+import base64
+import csv
+import io
+import json
+import sys
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import db
+from selection import sigungu_code_range, validate_search_scope
+
+POLLUTANTS = ("pm10", "pm25", "o3", "no2", "so2", "co")
+AGGREGATES = ("min", "sum", "count", "max")
+SOURCES = {
+    "raw": (
+        "air.measurements",
+        "ts",
+        (*POLLUTANTS, "source_quality"),
+    ),
+    "hourly": (
+        "air.measurements_hourly",
+        "bucket",
+        tuple(f"{p}_{a}" for p in POLLUTANTS for a in AGGREGATES),
+    ),
+    "daily": (
+        "air.measurements_daily",
+        "day",
+        tuple(f"{p}_{a}" for p in POLLUTANTS for a in AGGREGATES),
+    ),
+}
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+DEFAULT_FETCH_SIZE = 5000
+# Rows are serialized in groups so each yielded chunk is a few hundred KB
+# rather than one tiny write per row.
+CHUNK_ROWS = 1000
+SEOUL_TZ = ZoneInfo("Asia/Seoul")
+
+
+def export_columns(source):
+    _, time_column, values = SOURCES[source]
+    return (time_column, "station_id", *values)
+
+
+def parse_bound(source, value):
+    """Parse an ISO date/datetime bound; naive datetimes are KST."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError as exc:
+            raise ValueError(f"invalid time bound: {value}") from exc
+    if source == "daily":
+        if isinstance(value, datetime):
+            return value.date()
+        return value
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=SEOUL_TZ)
+    return value
+
+
+def encode_cursor(time_value, station_id):
+    raw = json.dumps([time_value.isoformat(), station_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(source, token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        time_text, station_id = json.loads(base64.urlsafe_b64decode(padded))
+        station_id = int(station_id)
+        if source == "daily":
+            time_value = date.fromisoformat(time_text)
+        else:
+            time_value = datetime.fromisoformat(time_text)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("invalid cursor token") from exc
+    return time_value, station_id
+
+
+def export_query(source, scope, resume=False):
+    table, time_column, values = SOURCES[source]
+    columns = ", ".join(f"r.{c}" for c in export_columns(source))
+    predicates = [f"r.{time_column} >= %s", f"r.{time_column} < %s"]
+    join = ""
+    if scope == "station":
+        predicates.append("r.station_id = %s")
+    elif scope == "sido":
+        join = "JOIN air.stations s ON s.id = r.station_id"
+        predicates.append("s.sido_code = %s")
+    elif scope == "sigungu":
+        join = "JOIN air.stations s ON s.id = r.station_id"
+        predicates.append("s.sigungu_code BETWEEN %s AND %s")
+    if resume:
+        predicates.append(f"(r.{time_column}, r.station_id) > (%s, %s)")
+    where = "\n          AND ".join(predicates)
+    return f"""
+        SELECT {columns}
+        FROM {table} r
+        {join}
+        WHERE {where}
+        ORDER BY r.{time_column}, r.station_id
+    """
+
+
+def resolve_scope(station_id=None, region_level=None, region_code=None):
+    """Return (scope, params) for a station, a region or the whole table."""
+    if station_id is not None and region_level is not None:
+        raise ValueError("pass either station_id or region_level/region_code")
+    if station_id is not None:
+        return "station", (station_id,)
+    if region_level is None:
+        return "all", ()
+    validate_search_scope("search", region_level, region_code)
+    if region_level == "sido":
+        return "sido", (region_code,)
+    return "sigungu", sigungu_code_range(region_code)
+
+
+def export_params(start, end, scope_params, resume=None):
+    return (start, end, *scope_params, *(resume or ()))
+
+
+def stream_rows(conn, query, params, fetch_size=DEFAULT_FETCH_SIZE):
+    """Yield rows from a named cursor, fetching fetch_size per round trip."""
+    with conn.cursor(name="measurement_export") as cur:
+        cur.itersize = fetch_size
+        cur.execute(query, params)
+        for row in cur:
+            yield row
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def format_ndjson(columns, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(
+            json.dumps(
+                dict(zip(columns, map(_json_value, row))),
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        )
+        if len(chunk) >= CHUNK_ROWS:
+            yield ("\n".join(chunk) + "\n").encode()
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode()
+
+
+def format_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    pending = 1
+    for row in rows:
+        writer.writerow([_json_value(value) for value in row])
+        pending += 1
+        if pending >= CHUNK_ROWS:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode()
+
+
+FORMATTERS = {"ndjson": format_ndjson, "csv": format_csv}
+CHECKPOINT_PREFIX = {"ndjson": '{"next_cursor":', "csv": "# next_cursor="}
+
+
+def checkpoint_line(fmt, token):
+    if fmt == "ndjson":
+        return (json.dumps({"next_cursor": token}) + "\n").encode()
+    return f"# next_cursor={token}\n".encode()
+
+
+def parse_checkpoint(fmt, line):
+    """The token of a checkpoint line, or None for a data line."""
+    if not line.startswith(CHECKPOINT_PREFIX[fmt]):
+        return None
+    if fmt == "ndjson":
+        return json.loads(line)["next_cursor"]
+    return line[len(CHECKPOINT_PREFIX[fmt]):].strip()
+
+
+def with_checkpoints(fmt, chunks, tracker):
+    for chunk in chunks:
+        tracker.mark_written()
+        token = tracker.resume_token()
+        yield chunk + checkpoint_line(fmt, token) if token else chunk
+
+
+class KeyTracker:
+    """Pass rows through while remembering the key of the last one.
+
+    Formatters yield a chunk right after buffering its last row, so the
+    key seen when a chunk arrives is that chunk's final row.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = rows
+        self.count = 0
+        self.last_key = None
+        self.written_key = None
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            self.last_key = (row[0], row[1])
+            yield row
+
+    def mark_written(self):
+        self.written_key = self.last_key
+
+    def resume_token(self):
+        if self.written_key is None:
+            return None
+        return encode_cursor(*self.written_key)
+
+
+def export_chunks(
+    conn,
+    source,
+    fmt,
+    start,
+    end,
+    scope,
+    scope_params,
+    cursor=None,
+    fetch_size=DEFAULT_FETCH_SIZE,
+    tracker=None,
+    checkpoints=False,
+):
+    """Return an iterator of encoded export chunks.
+
+    Arguments are validated before any row is read, so a bad cursor
+    raises ValueError here rather than midway through a response. The
+    caller owns the connection. With checkpoints, each chunk ends with
+    a checkpoint line for its last row.
+    """
+    if fmt not in FORMATTERS:
+        raise ValueError("format must be " + " or ".join(FORMATTERS))
+    resume = decode_cursor(source, cursor) if cursor else None
+    query = export_query(source, scope, resume=resume is not None)
+    params = export_params(start, end, scope_params, resume)
+    rows = stream_rows(conn, query, params, fetch_size)
+    if checkpoints and tracker is None:
+        tracker = KeyTracker()
+    if tracker is not None:
+        tracker.rows = rows
+        rows = tracker
+    chunks = FORMATTERS[fmt](export_columns(source), rows)
+    if checkpoints:
+        return with_checkpoints(fmt, chunks, tracker)
+    return chunks
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--source", choices=sorted(SOURCES), default="raw")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--station-id", type=int)
+    parser.add_argument("--region-level", choices=("sido", "sigungu"))
+    parser.add_argument("--region-code")
+    parser.add_argument("--cursor")
+    parser.add_argument("--fetch-size", type=int, default=DEFAULT_FETCH_SIZE)
+    parser.add_argument("--output", help="file path; stdout when omitted")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        scope, scope_params = resolve_scope(
+            args.station_id, args.region_level, args.region_code
+        )
+        start = parse_bound(args.source, args.start)
+        end = parse_bound(args.source, args.end)
+    except ValueError as exc:
+        raise SystemExit(f"EXPORT FAILED: {exc}")
+
+    conn = db.get_db_connection()
+    if conn is None:
+        raise SystemExit("EXPORT FAILED: database unavailable")
+    tracker = KeyTracker()
+    try:
+        chunks = export_chunks(
+            conn,
+            args.source,
+            args.format,
+            start,
+            end,
+            scope,
+            scope_params,
+            cursor=args.cursor,
+            fetch_size=args.fetch_size,
+            tracker=tracker,
+        )
+    except ValueError as exc:
+        conn.close()
+        raise SystemExit(f"EXPORT FAILED: {exc}")
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    started = datetime.now(timezone.utc)
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+            tracker.mark_written()
+    except BaseException:
+        token = tracker.resume_token()
+        if token:
+            print(
+                f"EXPORT INTERRUPTED: resume with --cursor {token}",
+                file=sys.stderr,
+            )
+        raise
+    finally:
+        if args.output:
+            output.close()
+        conn.close()
+    elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+    print(
+        f"EXPORT OK: rows={tracker.count}, seconds={elapsed:.1f}, "
+        f"last_cursor={tracker.resume_token()}",
+        file=sys.stderr,
+    )
+    return tracker.count
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Per-request stage timings, Server-Timing headers and Prometheus metrics.
+
+Handlers wrap their expensive steps in `stage("name")` and annotate the
+request with `set_labels(source=..., lookup_mode=..., ...)`. The ASGI
+middleware collects both, writes a Server-Timing header on the response
+and, once the request finishes, feeds the latency histograms rendered by
+`render_metrics()` in the Prometheus text format.
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+REQUEST_LABELS = ("source", "lookup_mode", "fallback_reason")
+UNSET = "none"
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = (
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"'),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets or LATENCY_BUCKETS)
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, UNSET)) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        names = (*self.labelnames, "le")
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._series.items()
+            )
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, observed in zip((*self.buckets, "+Inf"), counts):
+                cumulative += observed
+                labels = _label_text(names, (*key, bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, UNSET)) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Gauge:
+    """A gauge read from `callback` at scrape time.
+
+    The callback returns a number, or a dict of label tuples to numbers.
+    """
+
+    def __init__(self, name, documentation, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+        ]
+        try:
+            values = self.callback()
+        except Exception as exc:
+            print(f"[metrics] gauge {self.name} failed: {exc}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+_metrics = {}
+
+
+def histogram(name, documentation, labelnames=(), buckets=None):
+    return _metrics.setdefault(
+        name, Histogram(name, documentation, labelnames, buckets)
+    )
+
+
+def counter(name, documentation, labelnames=()):
+    return _metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, callback, labelnames=()):
+    """Register (or replace) a scrape-time gauge."""
+    _metrics[name] = Gauge(name, documentation, labelnames, callback)
+    return _metrics[name]
+
+
+def render_metrics():
+    lines = []
+    for metric in _metrics.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = histogram(
+    "hudadak_request_duration_seconds",
+    "End-to-end request latency.",
+    ("route", "method", "status", *REQUEST_LABELS),
+)
+STAGE_SECONDS = histogram(
+    "hudadak_stage_duration_seconds",
+    "Latency of one stage of a request.",
+    ("route", "stage", *REQUEST_LABELS),
+)
+CACHE_REQUESTS = counter(
+    "hudadak_cache_requests_total",
+    "In-process cache lookups by result.",
+    ("cache", "result"),
+)
+DB_CONNECTS = counter(
+    "hudadak_db_connect_total",
+    "Database connection attempts by result.",
+    ("result",),
+)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.stages = []
+        self.labels = {}
+
+    def server_timing(self, total):
+        entries = [
+            f"{name};dur={seconds * 1000:.1f}"
+            for name, seconds in self.stages
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.stages.append((name, time.perf_counter() - started))
+
+
+def set_labels(**labels):
+    timings = _current.get()
+    if timings is not None:
+        timings.labels.update(
+            {key: UNSET if value is None else value
+             for key, value in labels.items()}
+        )
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse whose rendering is recorded as the serialize stage."""
+
+    def render(self, content):
+        with stage("serialize"):
+            return super().render(content)
+
+
+def _route_label(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through as-is."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    timings.server_timing(time.perf_counter() - started),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            labels = {
+                name: timings.labels.get(name, UNSET)
+                for name in REQUEST_LABELS
+            }
+            route = _route_label(scope)
+            REQUEST_SECONDS.observe(
+                elapsed,
+                route=route,
+                method=scope.get("method"),
+                status=status["code"],
+                **labels,
+            )
+            for name, seconds in timings.stages:
+                STAGE_SECONDS.observe(
+                    seconds, route=route, stage=name, **labels
+                )
@@ -0,0 +1,150 @@
+"""Background EXPLAIN capture for slow selection queries.
+
+When a /nearest query runs longer than SLOW_QUERY_THRESHOLD_MS, its
+variant (lookup mode, region level, gas columns) and parameters are
+queued for a worker thread that re-runs it under
+EXPLAIN (ANALYZE, BUFFERS) on its own connection. Each variant is
+captured at most once per PLAN_CAPTURE_INTERVAL_SECONDS and the queue is
+small, so a burst of slow requests costs at most a few extra queries.
+
+Plans stay in an in-process ring buffer. Coordinates are rounded before
+they are kept, because user locations are not stored on the server.
+Note that the re-run may find pages already cached by the slow request,
+so compare its buffer counts with that in mind.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import db
+
+RING_SIZE = 50
+QUEUE_SIZE = 4
+EXPLAIN_TIMEOUT_MS = 10000
+COORDINATE_DIGITS = 2
+
+_plans = deque(maxlen=RING_SIZE)
+_last_capture = {}
+_lock = threading.Lock()
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_worker = None
+
+
+def threshold_seconds():
+    return float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500")) / 1000
+
+
+def capture_interval_seconds():
+    return float(os.getenv("PLAN_CAPTURE_INTERVAL_SECONDS", "300"))
+
+
+def _redact(params):
+    return [
+        round(value, COORDINATE_DIGITS) if isinstance(value, float) else value
+        for value in params
+    ]
+
+
+def maybe_capture(variant, query, params, elapsed, now=None):
+    """Queue a plan capture for a slow query; returns True when queued."""
+    if elapsed < threshold_seconds():
+        return False
+    now = time.monotonic() if now is None else now
+    with _lock:
+        last = _last_capture.get(variant)
+        if last is not None and now - last < capture_interval_seconds():
+            return False
+        _last_capture[variant] = now
+    job = {
+        "variant": variant,
+        "query": query,
+        "params": tuple(params),
+        "elapsed": elapsed,
+        "captured_at": datetime.now(timezone.utc),
+    }
+    try:
+        _queue.put_nowait(job)
+    except queue.Full:
+        return False
+    _ensure_worker()
+    return True
+
+
+def _plan_summary(plan):
+    root = plan[0] if isinstance(plan, list) and plan else {}
+    node = root.get("Plan") or {}
+    return {
+        "planning_ms": root.get("Planning Time"),
+        "execution_ms": root.get("Execution Time"),
+        "root_node": node.get("Node Type"),
+        "shared_hit_blocks": node.get("Shared Hit Blocks"),
+        "shared_read_blocks": node.get("Shared Read Blocks"),
+    }
+
+
+def capture_plan(conn, job):
+    """Run EXPLAIN (ANALYZE, BUFFERS) for a job and keep the result."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}"
+            )
+            cur.execute(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + job["query"],
+                job["params"],
+            )
+            plan = cur.fetchone()[0]
+    finally:
+        conn.rollback()
+    entry = {
+        "captured_at": job["captured_at"].isoformat(),
+        "variant": dict(job["variant"]),
+        "elapsed_ms": round(job["elapsed"] * 1000, 1),
+        "params": _redact(job["params"]),
+        "summary": _plan_summary(plan),
+        "plan": plan,
+    }
+    _plans.append(entry)
+    print(
+        "[plan-capture]",
+        entry["variant"],
+        f"request_ms={entry['elapsed_ms']}",
+        f"explain_ms={entry['summary']['execution_ms']}",
+    )
+    return entry
+
+
+def _run():
+    while True:
+        job = _queue.get()
+        try:
+            conn = db.get_db_connection()
+            if conn is None:
+                continue
+            try:
+                capture_plan(conn, job)
+            finally:
+                conn.close()
+        except Exception as exc:
+            print(f"[plan-capture] EXPLAIN failed: {exc}")
+        finally:
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run, name="plan-capture", daemon=True
+            )
+            _worker.start()
+
+
+def recent_plans():
+    """Captured plans, newest first."""
+    return list(reversed(_plans))
@@ -0,0 +1,220 @@
+"""Stale-while-revalidate caching and circuit breakers for upstream calls.
+
+Cached model data has two ages. Up to MODEL_FRESH_SECONDS an entry is
+served as is. After that, up to MODEL_MAX_STALE_SECONDS, it is still
+served at once while one background task refetches it, so an expired
+entry no longer makes a request wait on the upstream. Concurrent misses
+for one key share a single fetch.
+
+Each provider has a CircuitBreaker. After BREAKER_FAILURES consecutive
+failures it opens for BREAKER_RESET_SECONDS. While open, calls raise
+CircuitOpenError immediately and callers fall back to stale entries or
+stored data instead of waiting out the upstream timeout. Then a single
+trial call goes through: success closes the breaker, failure reopens it.
+Callers pass is_failure to count only errors that show the upstream is
+unwell; any other error is no verdict either way.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+
+from deadline import wait
+from metrics import CACHE_REQUESTS, gauge, stage
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, provider):
+        super().__init__(f"{provider} circuit open")
+        self.provider = provider
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failures=None, reset_after=None,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = (
+            failures
+            if failures is not None
+            else int(os.getenv("BREAKER_FAILURES", "5"))
+        )
+        self.reset_after = (
+            reset_after
+            if reset_after is not None
+            else float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+        )
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if (
+                self.state == self.OPEN
+                and self.clock() - self._opened_at >= self.reset_after
+            ):
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"[breaker] {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if (
+                self.state == self.HALF_OPEN
+                or self.failures >= self.failure_threshold
+            ):
+                if self.state != self.OPEN:
+                    print(
+                        f"[breaker] {self.name} open after "
+                        f"{self.failures} failures"
+                    )
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+
+    async def call(self, fetch, is_failure=None):
+        """Await fetch() unless the breaker is open.
+
+        An exception counts as a failure when is_failure(exc) is true, or
+        always without is_failure.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            result = await fetch()
+        except Exception as exc:
+            if is_failure is None or is_failure(exc):
+                self.record_failure()
+            else:
+                with self._lock:
+                    self._trial = False
+            raise
+        except BaseException:
+            # Cancelled: no verdict on the upstream, free the trial slot.
+            with self._lock:
+                self._trial = False
+            raise
+        self.record_success()
+        return result
+
+
+_breakers = {}
+_STATE_VALUES = {
+    CircuitBreaker.CLOSED: 0,
+    CircuitBreaker.HALF_OPEN: 1,
+    CircuitBreaker.OPEN: 2,
+}
+
+
+def breaker(provider):
+    """The process-wide breaker for one upstream provider."""
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(provider)
+    return _breakers[provider]
+
+
+class StaleWhileRevalidate:
+    """Serve cache entries past their freshness while refetching them."""
+
+    def __init__(self, cache, fresh_for=None, max_stale=None):
+        self.cache = cache
+        self.fresh_for = (
+            fresh_for
+            if fresh_for is not None
+            else float(os.getenv("MODEL_FRESH_SECONDS", "120"))
+        )
+        self.max_stale = (
+            max_stale
+            if max_stale is not None
+            else float(os.getenv("MODEL_MAX_STALE_SECONDS", "1800"))
+        )
+        self._in_flight = {}
+        self._background = set()
+
+    async def get(self, name, key, fetch):
+        """Return the value for key; a miss is timed as stage `name`."""
+        entry = await self.cache.aget(key)
+        if entry is not None:
+            if time.time() - entry["fetched_at"] < self.fresh_for:
+                CACHE_REQUESTS.inc(cache=name, result="hit")
+            else:
+                CACHE_REQUESTS.inc(cache=name, result="stale")
+                self._refresh(key, fetch)
+            return entry["data"]
+        CACHE_REQUESTS.inc(cache=name, result="miss")
+        with stage(name):
+            # Past the request deadline the fetch keeps running for the
+            # next caller; this one gets DeadlineExceeded.
+            return await wait(asyncio.shield(self._task(key, fetch)), name)
+
+    def _task(self, key, fetch):
+        loop = asyncio.get_running_loop()
+        task = self._in_flight.get(key)
+        if task is not None and task.get_loop() is loop:
+            return task
+        # An empty context keeps a shared fetch out of the timings of
+        # whichever request happened to start it.
+        task = contextvars.Context().run(
+            loop.create_task, self._fetch_and_store(key, fetch)
+        )
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    def _finished(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def _refresh(self, key, fetch):
+        if key in self._in_flight:
+            return
+        task = self._task(key, fetch)
+        self._background.add(task)
+        task.add_done_callback(self._log_refresh)
+
+    def _log_refresh(self, task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[swr] background refresh failed: {task.exception()}")
+
+    async def _fetch_and_store(self, key, fetch):
+        data = await fetch()
+        await self.cache.aset(
+            key,
+            {"fetched_at": time.time(), "data": data},
+            self.max_stale,
+        )
+        return data
+
+
+gauge(
+    "hudadak_circuit_state",
+    "Upstream circuit breakers: 0 closed, 1 half-open, 2 open.",
+    lambda: {
+        (name,): _STATE_VALUES[item.state] for name, item in _breakers.items()
+    },
+    ("provider",),
+)
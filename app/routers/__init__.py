@@ -1,3 +1,17 @@
 # app/routers/__init__.py
+from .export import export_router
 from .geo import geo_router
-__all__ = ["geo_router"]
\ No newline at end of file
+from .history import history_router
+from .metrics import metrics_router
+from .plans import plans_router
+from .regions import regions_router
+from .tiles import tiles_router
+__all__ = [
+    "export_router",
+    "geo_router",
+    "history_router",
+    "metrics_router",
+    "plans_router",
+    "regions_router",
+    "tiles_router",
+]
@@ -0,0 +1,78 @@
+"""Streaming bulk export of measurements and rollups.
+
+Responses carry checkpoint lines with resume cursors; see
+measurement_export.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+import db
+from measurement_export import (
+    DEFAULT_FETCH_SIZE,
+    FORMATS,
+    export_chunks,
+    parse_bound,
+    resolve_scope,
+)
+
+export_router = APIRouter(prefix="/export", tags=["Export"])
+
+
+def _close_after(chunks, conn):
+    try:
+        yield from chunks
+    finally:
+        conn.close()
+
+
+@export_router.get("/measurements")
+def export_measurements(
+    start: str,
+    end: str,
+    source: str = Query("raw", pattern="^(raw|hourly|daily)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    station_id: Optional[int] = None,
+    region_level: Optional[str] = Query(None, pattern="^(sido|sigungu)$"),
+    region_code: Optional[str] = None,
+    cursor: Optional[str] = None,
+):
+    try:
+        scope, scope_params = resolve_scope(
+            station_id, region_level, region_code
+        )
+        lower = parse_bound(source, start)
+        upper = parse_bound(source, end)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    conn = db.get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=503, detail="database unavailable")
+    try:
+        chunks = export_chunks(
+            conn,
+            source,
+            format,
+            lower,
+            upper,
+            scope,
+            scope_params,
+            cursor=cursor,
+            fetch_size=DEFAULT_FETCH_SIZE,
+            checkpoints=True,
+        )
+    except ValueError as exc:
+        conn.close()
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    # A sync iterator is drained in Starlette's threadpool, so psycopg2's
+    # blocking fetches never stall the event loop.
+    filename = f"measurements-{source}.{format}"
+    return StreamingResponse(
+        _close_after(chunks, conn),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,22 +1,12 @@
 from fastapi import APIRouter, HTTPException, Query
-from datetime import datetime, timedelta, timezone
-_cache = {}
 import os, httpx, psycopg2
 
+import db
+from cache import make_cache
+
 geo_router = APIRouter(prefix="/geo", tags=["Geolocation"])
 KAKAO_REST_KEY = os.getenv("KAKAO_REST_KEY")
-KAKAO_BASE = "https://dapi.kakao.com/v2/local"
-
-
-def _resolve_db_host():
-    host = os.getenv("DBHOST") or os.getenv("INSTANCE_UNIX_SOCKET")
-    if host:
-        return host
-    instance = (
-        os.getenv("CLOUD_SQL_CONNECTION_NAME")
-        or os.getenv("INSTANCE_CONNECTION_NAME")
-    )
-    return f"/cloudsql/{instance}" if instance else None
+KAKAO_BASE = os.getenv("KAKAO_BASE_URL", "https://dapi.kakao.com/v2/local")
 
 
 def _choose_sigungu_row(rows, query):
@@ -41,23 +31,10 @@ def _legal_sigungu_code(document):
 
 
 def _administrative_scope(lat, lon, query, fallback_sigungu_code=None):
-    required = (
-        _resolve_db_host(),
-        os.getenv("DBNAME"),
-        os.getenv("DBUSER"),
-        os.getenv("DBPASS"),
-    )
-    if not all(required):
+    conn = db.get_db_connection()
+    if conn is None:
         return {}
-    conn = None
     try:
-        conn = psycopg2.connect(
-            host=required[0],
-            dbname=required[1],
-            user=required[2],
-            password=required[3],
-            connect_timeout=5,
-        )
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -66,21 +43,22 @@ def _administrative_scope(lat, lon, query, fallback_sigungu_code=None):
                         ST_MakePoint(%s, %s), 4326
                     ) AS geom
                 )
-                SELECT
+                SELECT DISTINCT
                     sido.code AS sido_code,
                     sido.full_name AS sido_name,
                     sigungu.code AS sigungu_code,
                     sigungu.full_name AS sigungu_name,
                     sigungu.name AS sigungu_short_name,
-                    ST_Area(sigungu.geom) AS sigungu_area
-                FROM air.admin_regions sigungu
+                    sigungu.area AS sigungu_area
+                FROM air.admin_regions_subdivided piece
+                CROSS JOIN point
+                JOIN air.admin_regions sigungu ON sigungu.code=piece.code
                 JOIN air.admin_regions sido
                   ON sido.level='sido'
                  AND sido.code=sigungu.parent_code
-                CROSS JOIN point
-                WHERE sigungu.level='sigungu'
-                  AND ST_Covers(sigungu.geom, point.geom)
-                ORDER BY ST_Area(sigungu.geom) ASC, sigungu.code ASC
+                WHERE piece.level='sigungu'
+                  AND ST_Covers(piece.geom, point.geom)
+                ORDER BY sigungu.area ASC, sigungu.code ASC
                 """,
                 (lon, lat),
             )
@@ -95,7 +73,7 @@ def _administrative_scope(lat, lon, query, fallback_sigungu_code=None):
                         sigungu.code AS sigungu_code,
                         sigungu.full_name AS sigungu_name,
                         sigungu.name AS sigungu_short_name,
-                        ST_Area(sigungu.geom) AS sigungu_area
+                        sigungu.area AS sigungu_area
                     FROM air.admin_regions sigungu
                     JOIN air.admin_regions sido
                       ON sido.level='sido'
@@ -135,30 +113,21 @@ def _administrative_scope(lat, lon, query, fallback_sigungu_code=None):
     except psycopg2.Error:
         return {}
     finally:
-        if conn is not None:
-            conn.close()
+        conn.close()
 
 def _headers():
     if not KAKAO_REST_KEY:
         raise HTTPException(status_code=500, detail="KAKAO_REST_KEY not configured.")
     return {"Authorization": f"KakaoAK {KAKAO_REST_KEY}"}
 
-def _get_cache(key):
-    v = _cache.get(key)
-    if not v: return None
-    data, exp = v
-    if datetime.now(timezone.utc) > exp:
-        _cache.pop(key, None); return None
-    return data
-
-def _set_cache(key, data, ttl=300):  # 5분 캐시
-    _cache[key] = (data, datetime.now(timezone.utc) + timedelta(seconds=ttl))
+_cache = make_cache("geo", max_entries=4096)
+CACHE_TTL_SECONDS = 300  # 5분 캐시
 
 @geo_router.get("/address")
 async def address(q: str = Query(..., min_length=2)):
     # ✅ 5분 캐시 (키: 검색어)
     ck = ("addr", q.strip())
-    hit = _get_cache(ck)
+    hit = await _cache.aget(ck)
     if hit:
         return hit
 
@@ -201,14 +170,14 @@ async def address(q: str = Query(..., min_length=2)):
         "source": "kakao",
         **scope,
     }
-    _set_cache(ck, resp, ttl=300)  # ✅ 캐시 저장
+    await _cache.aset(ck, resp, CACHE_TTL_SECONDS)  # ✅ 캐시 저장
     return resp
 
 @geo_router.get("/reverse")
 async def reverse(lat: float, lon: float):
     # ✅ 5분 캐시 (키: 좌표를 1e-5으로 라운딩)
     ck = ("rev", round(lat, 5), round(lon, 5))
-    hit = _get_cache(ck)
+    hit = await _cache.aget(ck)
     if hit:
         return hit
 
@@ -247,5 +216,5 @@ async def reverse(lat: float, lon: float):
         "source": "kakao",
         **scope,
     }
-    _set_cache(ck, resp, ttl=300)  # ✅ 캐시 저장
+    await _cache.aset(ck, resp, CACHE_TTL_SECONDS)  # ✅ 캐시 저장
     return resp
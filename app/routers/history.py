@@ -0,0 +1,253 @@
+"""Station and region trends served from the measurement rollups."""
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from fastapi import APIRouter, HTTPException, Query
+
+import db
+from cache import make_cache
+from deadline import apply_statement_timeout
+from metrics import gauge, record_cache, stage
+from selection import sigungu_code_range, validate_search_scope
+
+history_router = APIRouter(tags=["History"])
+
+POLLUTANTS = ("pm10", "pm25", "o3", "no2", "so2", "co")
+AGGREGATES = ("sum", "count", "min", "max")
+RESOLUTIONS = {
+    "hourly": ("air.measurements_hourly", "bucket", 3600),
+    "daily": ("air.measurements_daily", "day", 86400),
+}
+# Windows up to a week default to hourly points, longer ones to daily.
+AUTO_HOURLY_MAX_DAYS = 7
+SEOUL_TZ = ZoneInfo("Asia/Seoul")
+CACHE_TTL_SECONDS = 60
+_cache = make_cache("history", max_entries=1024)
+
+gauge(
+    "hudadak_history_cache_entries",
+    "History responses held in the in-process cache tier.",
+    lambda: len(_cache),
+)
+
+
+def _parse_pollutants(value):
+    requested = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in requested if item not in POLLUTANTS]
+    if not requested or unknown:
+        raise ValueError(
+            "pollutants must be a comma list of " + ",".join(POLLUTANTS)
+        )
+    return tuple(dict.fromkeys(requested))
+
+
+def _window(resolution, days, now=None):
+    """Return (start, end) as datetimes for hourly or dates for daily."""
+    now = now or datetime.now(timezone.utc)
+    if resolution == "hourly":
+        end = now.replace(minute=0, second=0, microsecond=0) + timedelta(
+            hours=1
+        )
+        return end - timedelta(days=days), end
+    end = now.astimezone(SEOUL_TZ).date() + timedelta(days=1)
+    return end - timedelta(days=days), end
+
+
+def _epoch(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(
+        datetime(value.year, value.month, value.day, tzinfo=SEOUL_TZ)
+        .timestamp()
+    )
+
+
+def _history_query(resolution, pollutants, scope):
+    table, time_column, _ = RESOLUTIONS[resolution]
+    if scope == "station":
+        columns = ", ".join(
+            f"r.{pollutant}_{aggregate}"
+            for pollutant in pollutants
+            for aggregate in AGGREGATES
+        )
+        return f"""
+            SELECT r.{time_column}, {columns}
+            FROM {table} r
+            WHERE r.station_id = %s
+              AND r.{time_column} >= %s
+              AND r.{time_column} < %s
+            ORDER BY r.{time_column}
+        """
+    combine = {"sum": "SUM", "count": "SUM", "min": "MIN", "max": "MAX"}
+    columns = ", ".join(
+        f"{combine[aggregate]}(r.{pollutant}_{aggregate})"
+        for pollutant in pollutants
+        for aggregate in AGGREGATES
+    )
+    predicate = (
+        "s.sido_code = %s"
+        if scope == "sido"
+        else "s.sigungu_code BETWEEN %s AND %s"
+    )
+    return f"""
+        SELECT r.{time_column}, {columns}
+        FROM air.stations s
+        JOIN {table} r
+          ON r.station_id = s.id
+         AND r.{time_column} >= %s
+         AND r.{time_column} < %s
+        WHERE {predicate}
+        GROUP BY r.{time_column}
+        ORDER BY r.{time_column}
+    """
+
+
+def _downsample(rows, pollutants, start, step_seconds, factor):
+    """Merge rows into buckets of `factor` resolution steps.
+
+    Rows are (epoch, sum, count, min, max, ...) in AGGREGATES order per
+    pollutant; sums, counts, minima and maxima combine exactly.
+    """
+    width = step_seconds * factor
+    merged = {}
+    for row in rows:
+        key = (row[0] - start) // width
+        bucket = merged.get(key)
+        if bucket is None:
+            merged[key] = list(row[1:])
+            continue
+        for index in range(len(pollutants)):
+            offset = index * len(AGGREGATES)
+            total, count, low, high = row[1 + offset:5 + offset]
+            if count:
+                bucket[offset] = (bucket[offset] or 0) + (total or 0)
+                bucket[offset + 1] = (bucket[offset + 1] or 0) + count
+                bucket[offset + 2] = (
+                    low if bucket[offset + 2] is None
+                    else min(bucket[offset + 2], low)
+                )
+                bucket[offset + 3] = (
+                    high if bucket[offset + 3] is None
+                    else max(bucket[offset + 3], high)
+                )
+    return [
+        (start + key * width, *values)
+        for key, values in sorted(merged.items())
+    ]
+
+
+def _columnar(rows, pollutants):
+    series = {
+        pollutant: {"mean": [], "min": [], "max": [], "count": []}
+        for pollutant in pollutants
+    }
+    for row in rows:
+        for index, pollutant in enumerate(pollutants):
+            offset = 1 + index * len(AGGREGATES)
+            total, count, low, high = row[offset:offset + 4]
+            count = int(count or 0)
+            columns = series[pollutant]
+            columns["mean"].append(
+                round(total / count, 1) if count else None
+            )
+            columns["min"].append(low if count else None)
+            columns["max"].append(high if count else None)
+            columns["count"].append(count)
+    return [row[0] for row in rows], series
+
+
+def load_history(
+    conn,
+    scope,
+    scope_params,
+    resolution,
+    days,
+    pollutants,
+    points=None,
+    now=None,
+):
+    start, end = _window(resolution, days, now=now)
+    with conn.cursor() as cur:
+        query = _history_query(resolution, pollutants, scope)
+        if scope == "station":
+            params = (*scope_params, start, end)
+        else:
+            params = (start, end, *scope_params)
+        apply_statement_timeout(cur)
+        cur.execute(query, params)
+        rows = [(_epoch(row[0]), *row[1:]) for row in cur.fetchall()]
+
+    step_seconds = RESOLUTIONS[resolution][2]
+    start_epoch = _epoch(start)
+    slots = math.ceil((_epoch(end) - start_epoch) / step_seconds)
+    factor = max(1, math.ceil(slots / points)) if points else 1
+    if factor > 1:
+        rows = _downsample(rows, pollutants, start_epoch, step_seconds, factor)
+    timestamps, series = _columnar(rows, pollutants)
+    return {
+        "resolution": resolution,
+        "step_seconds": step_seconds * factor,
+        "from": start_epoch,
+        "to": _epoch(end),
+        "t": timestamps,
+        "series": series,
+    }
+
+
+@history_router.get("/history")
+def history(
+    station_id: Optional[int] = None,
+    region_level: Optional[str] = Query(None, pattern="^(sido|sigungu)$"),
+    region_code: Optional[str] = None,
+    days: int = Query(7, ge=1, le=90),
+    resolution: str = Query("auto", pattern="^(auto|hourly|daily)$"),
+    points: Optional[int] = Query(None, ge=2, le=2000),
+    pollutants: str = "pm10,pm25",
+):
+    if (station_id is None) == (region_level is None):
+        raise HTTPException(
+            status_code=400,
+            detail="pass either station_id or region_level/region_code",
+        )
+    try:
+        selected = _parse_pollutants(pollutants)
+        if station_id is None:
+            validate_search_scope("search", region_level, region_code)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if resolution == "auto":
+        resolution = "hourly" if days <= AUTO_HOURLY_MAX_DAYS else "daily"
+    if station_id is not None:
+        scope, scope_params = "station", (station_id,)
+        subject = {"station_id": station_id}
+    elif region_level == "sido":
+        scope, scope_params = "sido", (region_code,)
+        subject = {"region_level": region_level, "region_code": region_code}
+    else:
+        scope, scope_params = "sigungu", sigungu_code_range(region_code)
+        subject = {"region_level": region_level, "region_code": region_code}
+
+    cache_key = (scope, scope_params, resolution, days, points, selected)
+    cached = _cache.get(cache_key)
+    record_cache("history", cached is not None)
+    if cached is not None:
+        return cached
+
+    with stage("db_connect"):
+        conn = db.get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=503, detail="database unavailable")
+    try:
+        with stage("db_query"):
+            result = load_history(
+                conn, scope, scope_params, resolution, days, selected, points
+            )
+    finally:
+        conn.close()
+    body = {**subject, **result}
+    _cache.set(cache_key, body, CACHE_TTL_SECONDS)
+    return body
@@ -0,0 +1,22 @@
+"""Inspection endpoint for captured slow-query plans."""
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+
+from plan_capture import recent_plans
+
+plans_router = APIRouter(prefix="/debug", tags=["Debug"])
+
+
+@plans_router.get("/query-plans", include_in_schema=False)
+def query_plans(x_debug_token: Optional[str] = Header(None)):
+    # Without a configured token the endpoint does not exist.
+    expected = os.getenv("DEBUG_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404)
+    if not x_debug_token or not hmac.compare_digest(x_debug_token, expected):
+        raise HTTPException(status_code=403, detail="invalid debug token")
+    return {"plans": recent_plans()}
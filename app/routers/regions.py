@@ -0,0 +1,187 @@
+"""Current PM of every sido or sigungu in one payload, for region lists
+and choropleth maps.
+
+refresh_region_summaries.py writes air.region_summaries after each
+ingestion run; a payload is cached per level and summary version, which
+is rechecked every VERSION_TTL_SECONDS, so within that interval a
+whole-country view is served without touching the database. A refresh
+notification (see invalidation.py) reloads both levels right away.
+"""
+
+import time
+from zoneinfo import ZoneInfo
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+
+import db
+from cache import make_cache
+from deadline import apply_statement_timeout
+from grades import kr_grade_from_pm
+from invalidation import affects, check_interval, on_change
+from metrics import record_cache, stage
+
+regions_router = APIRouter(prefix="/regions", tags=["Regions"])
+
+LEVELS = ("sido", "sigungu")
+VERSION_TTL_SECONDS = 10
+CACHE_TTL_SECONDS = 3600
+BROWSER_MAX_AGE_SECONDS = 60
+SEOUL_TZ = ZoneInfo("Asia/Seoul")
+
+_cache = make_cache("regions", max_entries=16)
+_versions = {}
+
+SUMMARY_SQL = """
+    SELECT
+        region_code,
+        region_name,
+        parent_code,
+        pm10_avg,
+        pm10_max,
+        pm10_stations,
+        pm25_avg,
+        pm25_max,
+        pm25_stations,
+        newest_ts,
+        oldest_ts
+    FROM air.region_summaries
+    WHERE level = %s
+    ORDER BY region_code
+"""
+
+
+def _known_version(level, now):
+    known = _versions.get(level)
+    if known is not None and now < known["expires"]:
+        return known["value"]
+    return None
+
+
+def _load_version(conn, level, now):
+    """(data version, refresh epoch) of the level's newest summary row."""
+    with conn.cursor() as cur:
+        apply_statement_timeout(cur)
+        cur.execute(
+            """
+            SELECT
+                COALESCE(MAX(data_version), 0),
+                COALESCE(FLOOR(EXTRACT(EPOCH FROM MAX(refreshed_at))), 0)
+            FROM air.region_summaries
+            WHERE level = %s
+            """,
+            (level,),
+        )
+        row = cur.fetchone()
+    version = (int(row[0]), int(row[1]))
+    _versions[level] = {
+        "value": version,
+        "expires": now + check_interval(VERSION_TTL_SECONDS),
+    }
+    return version
+
+
+def _iso(value):
+    return value.astimezone(SEOUL_TZ).isoformat() if value else None
+
+
+def _region(row):
+    (code, name, parent_code, pm10, pm10_max, pm10_stations, pm25,
+     pm25_max, pm25_stations, newest_ts, oldest_ts) = row
+    return {
+        "code": code,
+        "name": name,
+        "parent_code": parent_code,
+        "pm10": pm10,
+        "pm25": pm25,
+        "pm10_max": pm10_max,
+        "pm25_max": pm25_max,
+        "pm10_stations": pm10_stations,
+        "pm25_stations": pm25_stations,
+        "cai_grade": kr_grade_from_pm(pm10, pm25),
+        "display_ts": _iso(newest_ts),
+        "oldest_ts": _iso(oldest_ts),
+    }
+
+
+def load_summary(conn, level, version):
+    with conn.cursor() as cur:
+        apply_statement_timeout(cur)
+        cur.execute(SUMMARY_SQL, (level,))
+        regions = [_region(row) for row in cur.fetchall()]
+    data_version, refreshed_at = version
+    return {
+        "level": level,
+        "data_version": data_version,
+        "refreshed_at": refreshed_at or None,
+        "regions": regions,
+    }
+
+
+def warm_summaries():
+    """Load the current payload of every level into the cache."""
+    conn = db.get_db_connection()
+    if conn is None:
+        return
+    try:
+        for level in LEVELS:
+            version = _load_version(conn, level, time.monotonic())
+            key = (level, *version)
+            if _cache.get(key) is None:
+                _cache.set(
+                    key, load_summary(conn, level, version), CACHE_TTL_SECONDS
+                )
+    finally:
+        conn.close()
+
+
+@on_change
+def _reload_summaries(event):
+    if affects(event, "summaries"):
+        _versions.clear()
+        warm_summaries()
+
+
+@regions_router.get("/summary")
+def region_summary(
+    request: Request,
+    response: Response,
+    level: str = Query("sido", pattern="^(sido|sigungu)$"),
+):
+    now = time.monotonic()
+    version = _known_version(level, now)
+    conn = None
+    try:
+        if version is None:
+            with stage("db_connect"):
+                conn = db.get_db_connection()
+            if conn is None:
+                raise HTTPException(
+                    status_code=503, detail="database unavailable"
+                )
+            version = _load_version(conn, level, now)
+        etag = f'"regions-{level}-{version[0]}-{version[1]}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={BROWSER_MAX_AGE_SECONDS}",
+        }
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        key = (level, *version)
+        body = _cache.get(key)
+        record_cache("regions", body is not None)
+        if body is None:
+            if conn is None:
+                with stage("db_connect"):
+                    conn = db.get_db_connection()
+                if conn is None:
+                    raise HTTPException(
+                        status_code=503, detail="database unavailable"
+                    )
+            with stage("db_query"):
+                body = load_summary(conn, level, version)
+            _cache.set(key, body, CACHE_TTL_SECONDS)
+    finally:
+        if conn is not None:
+            conn.close()
+    response.headers.update(headers)
+    return body
@@ -0,0 +1,228 @@
+"""Mapbox vector tiles of stations with their current PM values.
+
+A tile shows each station's latest reading from the last 3 hours. It is
+cached and tagged by ingest data version and by a window step of
+WINDOW_STEP_SECONDS, so a reading that leaves the window drops off the
+map within one step even when nothing new is ingested.
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+import db
+from deadline import apply_statement_timeout
+from invalidation import affects, check_interval, on_change
+from metrics import gauge, record_cache, stage
+
+tiles_router = APIRouter(prefix="/tiles", tags=["Tiles"])
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+MAX_ZOOM = 20
+# Below this zoom stations are merged per grid cell of each tile.
+CLUSTER_MAX_ZOOM = 9
+CLUSTER_GRID = 64
+TILE_EXTENT = 4096
+TILE_CACHE_SIZE = 4096
+DATA_VERSION_TTL_SECONDS = 10
+BROWSER_MAX_AGE_SECONDS = 60
+WINDOW_STEP_SECONDS = 600
+
+_tiles: "OrderedDict[tuple, bytes]" = OrderedDict()
+_tiles_lock = Lock()
+_data_version = {"value": None, "expires": 0.0}
+
+gauge(
+    "hudadak_tile_cache_entries",
+    "Rendered vector tiles held in the in-process cache.",
+    lambda: len(_tiles),
+)
+
+LATEST_OBSERVATIONS = """
+    SELECT
+        s.id,
+        s.name,
+        s.provider,
+        ST_Transform(s.geom::geometry, 3857) AS geom,
+        latest.pm10,
+        latest.pm25,
+        latest.ts
+    FROM air.stations s
+    CROSS JOIN bounds
+    JOIN LATERAL (
+        SELECT m.pm10, m.pm25, m.ts
+        FROM air.measurements m
+        WHERE m.station_id = s.id
+          AND m.ts <= CURRENT_TIMESTAMP
+          AND m.ts >= to_timestamp(%(window_end)s) - INTERVAL '3 hours'
+          AND m.source_quality = 'observed'
+          AND (m.pm10 IS NOT NULL OR m.pm25 IS NOT NULL)
+        ORDER BY m.ts DESC
+        LIMIT 1
+    ) latest ON TRUE
+    WHERE s.geom IS NOT NULL
+      AND s.geom::geometry && bounds.geom_4326
+"""
+
+STATION_TILE_SQL = f"""
+    WITH bounds AS (
+        SELECT
+            ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom,
+            ST_Transform(ST_TileEnvelope(%(z)s, %(x)s, %(y)s), 4326)
+                AS geom_4326
+    ),
+    latest AS ({LATEST_OBSERVATIONS}),
+    features AS (
+        SELECT
+            ST_AsMVTGeom(latest.geom, bounds.geom, {TILE_EXTENT}) AS geom,
+            latest.id AS station_id,
+            latest.name,
+            latest.provider,
+            latest.pm10,
+            latest.pm25,
+            EXTRACT(EPOCH FROM latest.ts)::bigint AS ts
+        FROM latest
+        CROSS JOIN bounds
+    )
+    SELECT ST_AsMVT(features, 'stations', {TILE_EXTENT}, 'geom')
+    FROM features
+"""
+
+CLUSTER_TILE_SQL = f"""
+    WITH bounds AS (
+        SELECT
+            ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom,
+            ST_Transform(ST_TileEnvelope(%(z)s, %(x)s, %(y)s), 4326)
+                AS geom_4326
+    ),
+    latest AS ({LATEST_OBSERVATIONS}),
+    cells AS (
+        SELECT
+            ST_Centroid(ST_Collect(latest.geom)) AS geom,
+            COUNT(*) AS station_count,
+            ROUND(AVG(latest.pm10)::numeric, 1) AS pm10,
+            ROUND(AVG(latest.pm25)::numeric, 1) AS pm25,
+            MAX(latest.pm10) AS pm10_max,
+            MAX(latest.pm25) AS pm25_max,
+            EXTRACT(EPOCH FROM MAX(latest.ts))::bigint AS ts
+        FROM latest
+        CROSS JOIN bounds
+        GROUP BY ST_SnapToGrid(
+            latest.geom,
+            (ST_XMax(bounds.geom) - ST_XMin(bounds.geom)) / {CLUSTER_GRID}
+        )
+    ),
+    features AS (
+        SELECT
+            ST_AsMVTGeom(cells.geom, bounds.geom, {TILE_EXTENT}) AS geom,
+            cells.station_count,
+            cells.pm10,
+            cells.pm25,
+            cells.pm10_max,
+            cells.pm25_max,
+            cells.ts
+        FROM cells
+        CROSS JOIN bounds
+    )
+    SELECT ST_AsMVT(features, 'stations', {TILE_EXTENT}, 'geom')
+    FROM features
+"""
+
+
+def _validate_tile(z, x, y):
+    if not 0 <= z <= MAX_ZOOM:
+        raise HTTPException(status_code=404, detail="zoom out of range")
+    limit = 1 << z
+    if not (0 <= x < limit and 0 <= y < limit):
+        raise HTTPException(status_code=404, detail="tile out of range")
+
+
+def _current_data_version(conn):
+    """Sum of provider ingest versions; it grows on every data commit."""
+    now = time.monotonic()
+    if _data_version["value"] is not None and now < _data_version["expires"]:
+        return _data_version["value"]
+    with conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(SUM(version), 0) FROM air.ingest_commits")
+        version = int(cur.fetchone()[0])
+    _data_version.update(
+        value=version, expires=now + check_interval(DATA_VERSION_TTL_SECONDS)
+    )
+    return version
+
+
+@on_change
+def _forget_data_version(event):
+    # Tiles are keyed by version, so rereading it is the whole invalidation.
+    if affects(event, "ingest"):
+        _data_version.update(value=None, expires=0.0)
+
+
+def _window_step(now=None):
+    """Index of the window step containing now."""
+    now = time.time() if now is None else now
+    return int(now // WINDOW_STEP_SECONDS)
+
+
+def _cached_tile(key):
+    with _tiles_lock:
+        tile = _tiles.get(key)
+        if tile is not None:
+            _tiles.move_to_end(key)
+        return tile
+
+
+def _store_tile(key, tile):
+    with _tiles_lock:
+        _tiles[key] = tile
+        _tiles.move_to_end(key)
+        while len(_tiles) > TILE_CACHE_SIZE:
+            _tiles.popitem(last=False)
+
+
+def render_tile(conn, z, x, y, step):
+    query = CLUSTER_TILE_SQL if z < CLUSTER_MAX_ZOOM else STATION_TILE_SQL
+    with conn.cursor() as cur:
+        apply_statement_timeout(cur)
+        cur.execute(
+            query,
+            {
+                "z": z,
+                "x": x,
+                "y": y,
+                "window_end": step * WINDOW_STEP_SECONDS,
+            },
+        )
+        row = cur.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b""
+
+
+@tiles_router.get("/stations/{z}/{x}/{y}.mvt")
+def station_tile(z: int, x: int, y: int, request: Request):
+    _validate_tile(z, x, y)
+    with stage("db_connect"):
+        conn = db.get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=503, detail="database unavailable")
+    try:
+        version = _current_data_version(conn)
+        step = _window_step()
+        etag = f'"stations-{version}-{step}-{z}-{x}-{y}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={BROWSER_MAX_AGE_SECONDS}",
+        }
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        key = (version, step, z, x, y)
+        tile = _cached_tile(key)
+        record_cache("tiles", tile is not None)
+        if tile is None:
+            with stage("db_query"):
+                tile = render_tile(conn, z, x, y, step)
+            _store_tile(key, tile)
+    finally:
+        conn.close()
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE, headers=headers)
@@ -1,6 +1,7 @@
 """Provider-neutral air observation selection queries."""
 
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 
 
 VALID_LOOKUP_MODES = {"current", "search"}
@@ -27,6 +28,18 @@ def validate_search_scope(
         )
 
 
+def sigungu_code_range(region_code: str) -> Tuple[str, str]:
+    """Inclusive sigungu_code range for a requested sigungu.
+
+    Stations take the smallest covering polygon, so inside composite
+    cities such as 41110 (수원시) they carry a child gu code (41111-41117).
+    City codes end in 0 and their gu share the first four digits.
+    """
+    if region_code.endswith("0"):
+        return region_code, region_code[:4] + "9"
+    return region_code, region_code
+
+
 def no_data_reason(lookup_mode: str) -> str:
     return (
         "NO_DATA_IN_REGION"
@@ -35,24 +48,22 @@ def no_data_reason(lookup_mode: str) -> str:
     )
 
 
+# Every variant is a pure function of its arguments, so the SQL text is
+# built once per process (and ahead of traffic by the startup warm-up).
+@lru_cache(maxsize=None)
 def build_pm_query(
     lookup_mode: str,
     region_level: Optional[str],
     include_gases: bool = False,
 ) -> str:
     if lookup_mode == "search":
-        scope_predicate = """
-        EXISTS (
-          SELECT 1
-          FROM air.admin_regions requested_region
-          WHERE requested_region.code = %s
-            AND requested_region.level = 'REGION_LEVEL'
-            AND ST_Covers(
-              requested_region.geom,
-              s.geom::geometry
-            )
+        # Region codes are precomputed on stations, so search scope is an
+        # indexed equality/range filter rather than a spatial join.
+        scope_predicate = (
+            "s.sido_code = %s"
+            if region_level == "sido"
+            else "s.sigungu_code BETWEEN %s AND %s"
         )
-        """.replace("REGION_LEVEL", region_level)
         scope_order = "display_ts DESC, distance_m ASC"
     else:
         scope_predicate = "ST_DWithin(s.geom, target.g, 50000)"
@@ -187,5 +198,10 @@ def query_params(
     params = [lon, lat]
     if lookup_mode == "search":
         pollutant_count = 6 if include_gases else 2
-        params.extend([region_code] * pollutant_count)
+        scope = (
+            [region_code]
+            if len(region_code) == 2
+            else list(sigungu_code_range(region_code))
+        )
+        params.extend(scope * pollutant_count)
     return tuple(params)
@@ -0,0 +1,345 @@
+"""Answer current-mode /nearest lookups from the precomputed raster.
+
+build_selection_raster.py stores, for every cell of a grid over Korea,
+the pm10 and pm25 station the selection SQL picks at the cell centre.
+With SELECTION_RASTER=1, /nearest?source=db&lookup_mode=current reads
+the answer for a point from that grid: one array index instead of a
+spatial query. Each worker unpacks the payload once per data version
+into SELECTION_RASTER_DIR and maps the file read-only, so workers on
+one host share the pages.
+
+The raster is used only while its data version equals the current
+ingest version, rechecked every RASTER_CHECK_SECONDS (and on ingestion
+notifications, see invalidation.py), and before its valid_until.
+Otherwise the caller falls back to the SQL path. Requests never wait
+on a recheck: it runs in a worker thread while they use what is
+loaded.
+
+Usage: python selection_raster.py verify [--samples 500]
+compares raster answers with the SQL path at random points.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from pathlib import Path
+from threading import Lock
+
+import db
+from invalidation import affects, check_interval, on_change
+from selection import build_pm_query, query_params
+
+MAGIC = b"HDSR"
+FORMAT_VERSION = 1
+# Must match build_selection_raster.HEADER.
+HEADER = struct.Struct("<4sHHddddIIqdd")
+POLLUTANTS = ("pm10", "pm25")
+EARTH_RADIUS_M = 6371008.8
+
+_state = {"raster": None, "checked_at": 0.0}
+_lock = Lock()
+_background = set()
+
+
+def enabled():
+    return os.getenv("SELECTION_RASTER", "0") == "1"
+
+
+class SelectionRaster:
+    def __init__(self, path):
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, layer_count, self.lat0, self.lon0, self.dlat,
+         self.dlon, self.rows, self.cols, self.data_version, self.built_at,
+         self.valid_until) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a selection raster")
+        cells = self.rows * self.cols
+        view = memoryview(self._map)
+        self._layers = {}
+        offset = HEADER.size
+        for pollutant in POLLUTANTS[:layer_count]:
+            layer = view[offset:offset + 2 * cells].cast("H")
+            if sys.byteorder == "big":
+                layer = array("H", layer.tobytes())
+                layer.byteswap()
+            self._layers[pollutant] = layer
+            offset += 2 * cells
+        self.entries = json.loads(bytes(view[offset:]))
+
+    def fresh(self, now=None):
+        return (now or time.time()) < self.valid_until
+
+    def cell(self, lat, lon):
+        r = math.floor((lat - self.lat0) / self.dlat)
+        c = math.floor((lon - self.lon0) / self.dlon)
+        if 0 <= r < self.rows and 0 <= c < self.cols:
+            return r, c
+        return None
+
+    def lookup(self, lat, lon):
+        """{pollutant: entry or None} for a point, or None off the grid."""
+        cell = self.cell(lat, lon)
+        if cell is None:
+            return None
+        index = cell[0] * self.cols + cell[1]
+        picks = {}
+        for pollutant, layer in self._layers.items():
+            idx = layer[index]
+            picks[pollutant] = (
+                self.entries[pollutant][idx - 1] if idx else None
+            )
+        return picks
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _distance_band(distance_m):
+    if distance_m <= 10000:
+        return 1
+    if distance_m <= 25000:
+        return 2
+    if distance_m <= 50000:
+        return 3
+    return None
+
+
+def selection_row(raster, lat, lon):
+    """The raster answer shaped like a row of the selection SQL."""
+    picks = raster.lookup(lat, lon)
+    if not picks:
+        return None
+    row = {}
+    for pollutant, entry in picks.items():
+        if entry is None:
+            continue
+        distance = haversine_m(lat, lon, entry["lat"], entry["lon"])
+        row.update(
+            {
+                pollutant: entry["value"],
+                f"{pollutant}_unit": entry["unit"],
+                f"{pollutant}_display_ts": entry["display_ts"],
+                f"{pollutant}_station_id": entry["station_id"],
+                f"{pollutant}_station": entry["name"],
+                f"{pollutant}_provider": entry["provider"],
+                f"{pollutant}_source_kind": entry["kind"],
+                f"{pollutant}_lat": entry["lat"],
+                f"{pollutant}_lon": entry["lon"],
+                f"{pollutant}_sido_code": entry["sido_code"],
+                f"{pollutant}_sigungu_code": entry["sigungu_code"],
+                f"{pollutant}_distance_m": round(distance, 1),
+                f"{pollutant}_distance_band": _distance_band(distance),
+            }
+        )
+    return row or None
+
+
+def raster_dir():
+    return Path(os.getenv("SELECTION_RASTER_DIR") or tempfile.gettempdir())
+
+
+def unpack(payload, build_id, directory=None):
+    """Write the payload of one build once; returns its path."""
+    directory = Path(directory or raster_dir())
+    path = directory / f"selection-raster-{build_id}.bin"
+    if not path.exists():
+        partial = path.with_suffix(f".{os.getpid()}.tmp")
+        partial.write_bytes(zlib.decompress(bytes(payload)))
+        os.replace(partial, path)
+        for old in directory.glob("selection-raster-*.bin"):
+            if old != path:
+                # Workers still mapping an old file keep their pages.
+                old.unlink(missing_ok=True)
+    return path
+
+
+def _refresh(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT
+                r.data_version,
+                (SELECT COALESCE(SUM(version), 0) FROM air.ingest_commits),
+                FLOOR(EXTRACT(EPOCH FROM r.built_at))
+            FROM air.selection_rasters r
+            WHERE r.name = 'current'
+            """
+        )
+        row = cur.fetchone()
+        if row is None or int(row[0]) != int(row[1]):
+            return None
+        data_version, built_at = int(row[0]), int(row[2])
+        loaded = _state["raster"]
+        if (
+            loaded is not None
+            and loaded.data_version == data_version
+            and int(loaded.built_at) == built_at
+        ):
+            return loaded
+        cur.execute(
+            """
+            SELECT payload FROM air.selection_rasters
+            WHERE name = 'current' AND data_version = %s
+            """,
+            (data_version,),
+        )
+        payload = cur.fetchone()
+    if payload is None:
+        return None
+    return SelectionRaster(
+        unpack(payload[0], f"{data_version}-{built_at}")
+    )
+
+
+def _check_due(now):
+    interval = check_interval(float(os.getenv("RASTER_CHECK_SECONDS", "10")))
+    return now - _state["checked_at"] >= interval
+
+
+def _usable(raster, now):
+    if raster is None or not raster.fresh(now):
+        return None
+    return raster
+
+
+def current_raster(connect, now=None):
+    """The usable raster, or None; connect() is called only to recheck."""
+    now = now or time.time()
+    with _lock:
+        if _check_due(now):
+            _state["checked_at"] = now
+            conn = connect()
+            if conn is not None:
+                try:
+                    _state["raster"] = _refresh(conn)
+                except Exception as exc:
+                    print(f"[raster] refresh failed: {exc}")
+                    _state["raster"] = None
+                finally:
+                    conn.close()
+        raster = _state["raster"]
+    return _usable(raster, now)
+
+
+def cached_raster(connect, now=None):
+    """The loaded raster, or None, without waiting on the database.
+
+    For request handlers on the event loop: a due recheck runs
+    current_raster in a worker thread and this call answers from the
+    raster already loaded.
+    """
+    now = now or time.time()
+    if _check_due(now) and not _background:
+        task = asyncio.get_running_loop().create_task(
+            asyncio.to_thread(current_raster, connect)
+        )
+        _background.add(task)
+        task.add_done_callback(_log_recheck)
+    return _usable(_state["raster"], now)
+
+
+def _log_recheck(task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[raster] recheck failed: {task.exception()}")
+
+
+@on_change
+def _follow_builds(event):
+    if event["kind"] == "ingest":
+        # A new ingest version retires the raster until the next build.
+        with _lock:
+            _state.update(raster=None, checked_at=time.time())
+    elif affects(event, "raster"):
+        with _lock:
+            _state["checked_at"] = 0.0
+        if enabled():
+            # Unpack and map the new build before a request needs it.
+            current_raster(db.get_db_connection)
+
+
+def _station_ids(row):
+    return tuple(
+        (row or {}).get(f"{pollutant}_station_id") for pollutant in POLLUTANTS
+    )
+
+
+def verify(conn, raster, samples, rng=None):
+    """Compare raster and SQL station picks; returns match counts."""
+    rng = rng or random.Random()
+    covered = [
+        index
+        for index in range(raster.rows * raster.cols)
+        if raster._layers["pm10"][index] or raster._layers["pm25"][index]
+    ]
+    query = build_pm_query("current", None)
+    results = {"samples": 0, "centre_matches": 0, "point_matches": 0}
+    for index in rng.sample(covered, min(samples, len(covered))):
+        r, c = divmod(index, raster.cols)
+        centre = (
+            raster.lat0 + (r + 0.5) * raster.dlat,
+            raster.lon0 + (c + 0.5) * raster.dlon,
+        )
+        point = (
+            raster.lat0 + (r + rng.random()) * raster.dlat,
+            raster.lon0 + (c + rng.random()) * raster.dlon,
+        )
+        expected = _station_ids(selection_row(raster, *centre))
+        results["samples"] += 1
+        for key, (lat, lon) in (("centre_matches", centre),
+                                ("point_matches", point)):
+            with conn.cursor() as cur:
+                cur.execute(query, query_params("current", lon, lat, None))
+                row = cur.fetchone()
+                if row and not isinstance(row, dict):
+                    row = dict(zip([d[0] for d in cur.description], row))
+            results[key] += _station_ids(row) == expected
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("verify",))
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    conn = db.get_db_connection()
+    if conn is None:
+        print("database not configured", file=sys.stderr)
+        return 1
+    try:
+        raster = _refresh(conn)
+        if raster is None:
+            print("no raster for the current data version", file=sys.stderr)
+            return 1
+        results = verify(conn, raster, args.samples, random.Random(args.seed))
+    finally:
+        conn.close()
+    print(
+        "RASTER VERIFY OK: "
+        + ", ".join(f"{key}={value}" for key, value in results.items())
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Startup warm-up run by the app lifespan before it takes traffic.
+
+A new instance otherwise pays for its first requests with cold work:
+opening database connections, building and planning the selection SQL,
+reading station and region pages, and fetching model data. The lifespan
+runs these steps first, within WARMUP_TIMEOUT_SECONDS. A failed or
+timed-out step is logged and skipped, so a slow dependency delays the
+instance only up to the budget. /readyz reports 503 until the run ends.
+"""
+
+import asyncio
+import os
+import time
+
+import db
+from metrics import gauge
+from selection import build_pm_query, query_params
+
+# (lookup_mode, region_level, include_gases) for every /nearest variant.
+SELECTION_VARIANTS = (
+    ("current", None, False),
+    ("current", None, True),
+    ("search", "sido", False),
+    ("search", "sido", True),
+    ("search", "sigungu", False),
+    ("search", "sigungu", True),
+)
+SAMPLE_REGION_CODES = {"sido": "11", "sigungu": "11110"}
+DEFAULT_HOT_CELLS = (
+    "37.5665,126.9780;37.4979,127.0276;37.2636,127.0286;"
+    "37.4563,126.7052;35.1796,129.0756;35.8714,128.6014"
+)
+
+STATUS = {"ready": False, "seconds": None, "steps": {}}
+
+
+def hot_cells():
+    """WARMUP_HOT_CELLS as [(lat, lon)], e.g. "37.56,126.97;35.17,129.07"."""
+    cells = []
+    for item in os.getenv("WARMUP_HOT_CELLS", DEFAULT_HOT_CELLS).split(";"):
+        if not item.strip():
+            continue
+        lat, lon = (float(part) for part in item.split(","))
+        cells.append((lat, lon))
+    return cells
+
+
+def plan_selection_statements(conn, lat, lon):
+    """Build every selection variant and have Postgres plan it on conn.
+
+    psycopg2 has no client-side prepared statements; planning each
+    variant once loads the catalog and statistics caches of that backend.
+    """
+    with conn.cursor() as cur:
+        for lookup_mode, region_level, include_gases in SELECTION_VARIANTS:
+            query = build_pm_query(
+                lookup_mode, region_level, include_gases=include_gases
+            )
+            params = query_params(
+                lookup_mode,
+                lon,
+                lat,
+                SAMPLE_REGION_CODES.get(region_level),
+                include_gases=include_gases,
+            )
+            cur.execute("EXPLAIN " + query, params)
+            cur.fetchall()
+    return len(SELECTION_VARIANTS)
+
+
+def warm_connections(lat, lon):
+    """Open the pool and plan the selection SQL on its minimum connections."""
+    if db.open_pool() is None:
+        return "database not configured"
+    minimum, _ = db.pool_bounds()
+    conns = []
+    try:
+        # Hold them together so each checkout is a distinct connection.
+        for _ in range(max(minimum, 1)):
+            conn = db.get_db_connection()
+            if conn is None:
+                break
+            conns.append(conn)
+        for conn in conns:
+            plan_selection_statements(conn, lat, lon)
+    finally:
+        for conn in conns:
+            conn.close()
+    return f"{len(conns)} connections, {len(SELECTION_VARIANTS)} variants"
+
+
+def load_snapshots(cells):
+    """Read the station and admin-region data the first requests touch."""
+    conn = db.get_db_connection()
+    if conn is None:
+        return "database not configured"
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, sido_code, sigungu_code
+                FROM air.stations
+                WHERE geom IS NOT NULL
+                """
+            )
+            stations = len(cur.fetchall())
+            covered = 0
+            for lat, lon in cells:
+                cur.execute(
+                    """
+                    SELECT COUNT(*)
+                    FROM air.admin_regions_subdivided piece
+                    WHERE ST_Covers(
+                        piece.geom,
+                        ST_SetSRID(ST_MakePoint(%s, %s), 4326)
+                    )
+                    """,
+                    (lon, lat),
+                )
+                covered += cur.fetchone()[0]
+    finally:
+        conn.close()
+    return f"{stations} stations, {covered} region pieces"
+
+
+async def run_warmup(steps, timeout=None):
+    """Run (name, coroutine factory) steps in order within one budget."""
+    if timeout is None:
+        timeout = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "20"))
+    started = time.perf_counter()
+    STATUS.update(ready=False, seconds=None, steps={})
+    for name, step in steps:
+        remaining = timeout - (time.perf_counter() - started)
+        step_started = time.perf_counter()
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            detail = await asyncio.wait_for(step(), remaining)
+            result = {"ok": True, "detail": detail}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "detail": "warm-up budget exhausted"}
+        except Exception as exc:
+            result = {"ok": False, "detail": str(exc)}
+        result["seconds"] = round(time.perf_counter() - step_started, 3)
+        STATUS["steps"][name] = result
+        print("[warmup]", name, result)
+    STATUS.update(
+        ready=True, seconds=round(time.perf_counter() - started, 3)
+    )
+    print(f"[warmup] ready in {STATUS['seconds']}s")
+    return STATUS
+
+
+gauge(
+    "hudadak_warmup_duration_seconds",
+    "Duration of the startup warm-up, per step and in total.",
+    lambda: {
+        ("total",): STATUS["seconds"] or 0,
+        **{
+            (name,): step["seconds"]
+            for name, step in STATUS["steps"].items()
+        },
+    },
+    ("step",),
+)
+gauge(
+    "hudadak_ready",
+    "1 once the startup warm-up has finished.",
+    lambda: int(STATUS["ready"]),
+)
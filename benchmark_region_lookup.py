@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Compare point-in-polygon lookups on full and subdivided admin regions.
+
+Usage: python benchmark_region_lookup.py [--points N] [--repeat N]
+
+Runs against the configured database after sync_admin_boundaries.py has
+loaded the NGII boundaries. Station points are used as the probe set.
+No timings have been recorded yet: run this against production-sized
+boundaries before relying on the subdivided form being the faster one.
+"""
+
+import argparse
+import statistics
+import time
+
+from airkorea_common import get_db_connection
+
+
+QUERIES = {
+    "full": """
+        SELECT COUNT(*)
+        FROM probe p
+        JOIN air.admin_regions r
+          ON r.level=%s
+         AND ST_Covers(r.geom, p.geom)
+    """,
+    "subdivided": """
+        SELECT COUNT(DISTINCT (p.id, piece.code))
+        FROM probe p
+        JOIN air.admin_regions_subdivided piece
+          ON piece.level=%s
+         AND ST_Covers(piece.geom, p.geom)
+    """,
+}
+
+
+def time_query(cur, query, level, repeat):
+    timings = []
+    matches = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cur.execute(query, (level,))
+        matches = cur.fetchone()[0]
+        timings.append(time.perf_counter() - started)
+    return matches, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TEMP TABLE probe AS
+                SELECT id, geom::geometry AS geom
+                FROM air.stations
+                WHERE geom IS NOT NULL
+                ORDER BY id
+                LIMIT %s
+                """,
+                (args.points,),
+            )
+            cur.execute("ANALYZE probe")
+            cur.execute("SELECT COUNT(*) FROM probe")
+            points = cur.fetchone()[0]
+            print(f"probe points={points}, repeat={args.repeat}")
+            for level in ("sigungu", "sido"):
+                results = {
+                    name: time_query(cur, query, level, args.repeat)
+                    for name, query in QUERIES.items()
+                }
+                full_matches, full_times = results["full"]
+                sub_matches, sub_times = results["subdivided"]
+                full_median = statistics.median(full_times)
+                sub_median = statistics.median(sub_times)
+                print(
+                    f"level={level} "
+                    f"full_ms={full_median * 1000:.1f} "
+                    f"subdivided_ms={sub_median * 1000:.1f} "
+                    f"speedup={full_median / max(sub_median, 1e-9):.1f}x "
+                    f"matches={full_matches}/{sub_matches}"
+                )
+                if full_matches != sub_matches:
+                    print(
+                        f"warning: level={level} match counts differ; "
+                        "rebuild the subdivided table"
+                    )
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Precompute current-mode /nearest selections on a grid over Korea.
+
+Usage: python build_selection_raster.py [--cell-meters 1000]
+
+For the centre of every grid cell, PostGIS picks the pm10 and pm25
+station exactly as build_pm_query("current", None) would: observed
+values from the last 3 hours within 50 km, ordered by distance band,
+newest observation, then distance. The result is stored in
+air.selection_rasters as one zlib-compressed payload:
+
+    header   HEADER (little-endian)
+    layers   one uint16 per cell and pollutant, row-major from the
+             south-west corner; 0 means no station, n the nth entry
+    entries  UTF-8 JSON {"pm10": [...], "pm25": [...]} of the stations
+
+The payload records the ingest data version read before the candidates,
+and valid_until, when the oldest station some cell picked leaves the
+3-hour window.
+The API only uses the raster while both still hold.
+"""
+
+import argparse
+import json
+import math
+import struct
+import sys
+import time
+import zlib
+from array import array
+from datetime import timedelta
+
+from airkorea_common import get_db_connection
+from ingest_common import notify_change
+
+
+NAME = "current"
+MAGIC = b"HDSR"
+FORMAT_VERSION = 1
+# magic, version, layer count, lat0, lon0, dlat, dlon, rows, cols,
+# data version, built_at and valid_until as epoch seconds.
+HEADER = struct.Struct("<4sHHddddIIqdd")
+POLLUTANTS = ("pm10", "pm25")
+# South, west, north and east edges, covering Jeju, Ulleungdo and Dokdo.
+BOUNDS = (33.0, 124.5, 38.7, 132.0)
+OBSERVATION_WINDOW = timedelta(hours=3)
+METERS_PER_DEGREE = 111320.0
+
+
+def grid(cell_meters):
+    south, west, north, east = BOUNDS
+    dlat = cell_meters / METERS_PER_DEGREE
+    # Cells are square at the middle latitude and narrower to the north.
+    dlon = cell_meters / (
+        METERS_PER_DEGREE * math.cos(math.radians((south + north) / 2))
+    )
+    return {
+        "lat0": south,
+        "lon0": west,
+        "dlat": dlat,
+        "dlon": dlon,
+        "rows": math.ceil((north - south) / dlat),
+        "cols": math.ceil((east - west) / dlon),
+    }
+
+
+def candidates_sql(pollutant):
+    value_column = "pm10" if pollutant == "pm10" else "pm25"
+    unit_column = "unit_pm10" if pollutant == "pm10" else "unit_pm25"
+    return f"""
+        CREATE TEMP TABLE raster_{pollutant} ON COMMIT DROP AS
+        SELECT
+            row_number() OVER (ORDER BY s.id)::int AS idx,
+            s.id AS station_id,
+            s.name,
+            s.provider,
+            s.kind,
+            s.lat,
+            s.lon,
+            s.sido_code,
+            s.sigungu_code,
+            s.geom,
+            latest.value,
+            latest.unit,
+            latest.ts
+        FROM air.stations s
+        JOIN LATERAL (
+            SELECT m.{value_column} AS value, m.{unit_column} AS unit, m.ts
+            FROM air.measurements m
+            WHERE m.station_id = s.id
+              AND m.ts <= CURRENT_TIMESTAMP
+              AND m.ts >= CURRENT_TIMESTAMP - INTERVAL '3 hours'
+              AND m.source_quality = 'observed'
+              AND m.{value_column} IS NOT NULL
+            ORDER BY m.ts DESC
+            LIMIT 1
+        ) latest ON TRUE
+        WHERE s.geom IS NOT NULL
+        """
+
+
+def cell_pick_sql(pollutant):
+    return f"""
+        WITH cells AS (
+            SELECT
+                r,
+                c,
+                ST_SetSRID(
+                    ST_MakePoint(
+                        %(lon0)s + (c + 0.5) * %(dlon)s,
+                        %(lat0)s + (r + 0.5) * %(dlat)s
+                    ),
+                    4326
+                )::geography AS g
+            FROM generate_series(0, %(rows)s - 1) r
+            CROSS JOIN generate_series(0, %(cols)s - 1) c
+        )
+        SELECT cells.r, cells.c, pick.idx
+        FROM cells
+        JOIN LATERAL (
+            SELECT cand.idx
+            FROM raster_{pollutant} cand
+            WHERE ST_DWithin(cand.geom, cells.g, 50000)
+            ORDER BY
+                CASE
+                    WHEN ST_Distance(cand.geom, cells.g) <= 10000 THEN 1
+                    WHEN ST_Distance(cand.geom, cells.g) <= 25000 THEN 2
+                    ELSE 3
+                END ASC,
+                cand.ts DESC,
+                ST_Distance(cand.geom, cells.g) ASC
+            LIMIT 1
+        ) pick ON TRUE
+        """
+
+
+def _entry(row):
+    (station_id, name, provider, kind, lat, lon, sido_code, sigungu_code,
+     value, unit, ts) = row
+    return {
+        "station_id": station_id,
+        "name": name,
+        "provider": provider,
+        "kind": kind,
+        "lat": float(lat) if lat is not None else None,
+        "lon": float(lon) if lon is not None else None,
+        "sido_code": sido_code,
+        "sigungu_code": sigungu_code,
+        "value": float(value),
+        "unit": unit,
+        "display_ts": ts.isoformat(),
+    }
+
+
+def load_candidates(cur, pollutant):
+    """Materialize one pollutant's candidates; returns (entries, ts)."""
+    cur.execute(candidates_sql(pollutant))
+    cur.execute(f"CREATE INDEX ON raster_{pollutant} USING gist (geom)")
+    cur.execute(f"ANALYZE raster_{pollutant}")
+    cur.execute(
+        f"""
+        SELECT station_id, name, provider, kind, lat, lon, sido_code,
+               sigungu_code, value, unit, ts
+        FROM raster_{pollutant}
+        ORDER BY idx
+        """
+    )
+    rows = cur.fetchall()
+    if len(rows) >= 1 << 16:
+        raise ValueError(f"too many {pollutant} stations for uint16 cells")
+    return [_entry(row) for row in rows], [row[-1] for row in rows]
+
+
+def pick_cells(conn, pollutant, cells):
+    layer = array("H", bytes(2 * cells["rows"] * cells["cols"]))
+    with conn.cursor(name=f"raster_{pollutant}_cells") as cur:
+        cur.itersize = 10000
+        cur.execute(cell_pick_sql(pollutant), cells)
+        for r, c, idx in cur:
+            layer[r * cells["cols"] + c] = idx
+    return layer
+
+
+def encode_raster(cells, layers, entries, data_version, built_at,
+                  valid_until):
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        len(layers),
+        cells["lat0"],
+        cells["lon0"],
+        cells["dlat"],
+        cells["dlon"],
+        cells["rows"],
+        cells["cols"],
+        data_version,
+        built_at,
+        valid_until,
+    )
+    body = [header]
+    for layer in layers:
+        if sys.byteorder == "big":
+            layer = array("H", layer)
+            layer.byteswap()
+        body.append(layer.tobytes())
+    body.append(json.dumps(entries, separators=(",", ":")).encode())
+    return zlib.compress(b"".join(body), 6)
+
+
+def build(conn, cell_meters=1000):
+    """Compute and store the raster; returns the number of covered cells."""
+    cells = grid(cell_meters)
+    with conn.cursor() as cur:
+        # Read before the candidates: a commit racing the build then makes
+        # the raster look older than its data, never newer.
+        cur.execute("SELECT COALESCE(SUM(version), 0) FROM air.ingest_commits")
+        data_version = int(cur.fetchone()[0])
+        cur.execute("SELECT EXTRACT(EPOCH FROM CURRENT_TIMESTAMP)")
+        built_at = float(cur.fetchone()[0])
+        entries, observed = {}, {}
+        for pollutant in POLLUTANTS:
+            entries[pollutant], observed[pollutant] = load_candidates(
+                cur, pollutant
+            )
+    layers = [pick_cells(conn, pollutant, cells) for pollutant in POLLUTANTS]
+    # A stale station no cell picked never changes an answer.
+    picked = [
+        observed[pollutant][idx - 1]
+        for pollutant, layer in zip(POLLUTANTS, layers)
+        for idx in set(layer) - {0}
+    ]
+    valid_until = (
+        (min(picked) + OBSERVATION_WINDOW).timestamp() if picked else built_at
+    )
+    payload = encode_raster(
+        cells, layers, entries, data_version, built_at, valid_until
+    )
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO air.selection_rasters(
+                name, data_version, built_at, valid_until, payload
+            )
+            VALUES (%s, %s, to_timestamp(%s), to_timestamp(%s), %s)
+            ON CONFLICT (name) DO UPDATE SET
+                data_version=EXCLUDED.data_version,
+                built_at=EXCLUDED.built_at,
+                valid_until=EXCLUDED.valid_until,
+                payload=EXCLUDED.payload
+            """,
+            (NAME, data_version, built_at, valid_until, payload),
+        )
+        notify_change(cur, "raster", NAME)
+    conn.commit()
+    covered = sum(1 for value in layers[0] if value) if layers else 0
+    print(
+        f"[raster] cells={cells['rows']}x{cells['cols']} "
+        f"covered_pm10={covered} bytes={len(payload)}"
+    )
+    return covered
+
+
+def main(conn=None, cell_meters=None):
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    started = time.monotonic()
+    try:
+        covered = build(conn, cell_meters or 1000)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+    print(
+        f"RASTER OK: covered_cells={covered}, "
+        f"seconds={time.monotonic() - started:.1f}"
+    )
+    return covered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cell-meters", type=float, default=1000)
+    main(cell_meters=parser.parse_args().cell_meters)
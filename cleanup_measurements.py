@@ -3,6 +3,8 @@ import os
 
 import psycopg2
 
+from ingest_common import ensure_watermark_table
+
 
 def delete_expired_measurements(conn, retention_hours=None):
     hours = retention_hours or int(
@@ -13,8 +15,21 @@ def delete_expired_measurements(conn, retention_hours=None):
     with conn.cursor() as cur:
         cur.execute(
             """
-            DELETE FROM air.measurements
-            WHERE ts < CURRENT_TIMESTAMP - (%s * INTERVAL '1 hour')
+            DELETE FROM air.measurements m
+            WHERE m.ts < CURRENT_TIMESTAMP - (%s * INTERVAL '1 hour')
+              -- Only hours the rollup has aggregated: none before its
+              -- first run, and none marked since.
+              AND EXISTS (
+                  SELECT 1
+                  FROM air.ingest_watermarks
+                  WHERE provider='ROLLUP' AND scope='backfill'
+              )
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM air.rollup_dirty_buckets d
+                  WHERE d.station_id = m.station_id
+                    AND d.bucket = date_trunc('hour', m.ts)
+              )
             """,
             (hours,),
         )
@@ -26,20 +41,53 @@ def delete_expired_measurements(conn, retention_hours=None):
     return deleted
 
 
-def main():
-    conn = psycopg2.connect(
-        host=os.environ["DBHOST"],
-        dbname=os.environ["DBNAME"],
-        user=os.environ["DBUSER"],
-        password=os.environ["DBPASS"],
+def delete_expired_raw_payloads(conn, retention_hours=None):
+    """Drop archived payloads no ingest has referenced within the window.
+
+    Measurements still pointing at a dropped payload keep their typed
+    values; readers LEFT JOIN the archive.
+    """
+    hours = retention_hours or int(
+        os.getenv("RAW_PAYLOAD_RETENTION_HOURS", "72")
+    )
+    if hours <= 0:
+        raise ValueError("RAW_PAYLOAD_RETENTION_HOURS must be positive")
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM air.raw_payloads
+            WHERE last_seen_at < CURRENT_TIMESTAMP - (%s * INTERVAL '1 hour')
+            """,
+            (hours,),
+        )
+        deleted = cur.rowcount
+    conn.commit()
+    print(
+        f"[retention] deleted {deleted} raw payloads unseen for {hours} hours"
     )
+    return deleted
+
+
+def main(conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = psycopg2.connect(
+            host=os.environ["DBHOST"],
+            dbname=os.environ["DBNAME"],
+            user=os.environ["DBUSER"],
+            password=os.environ["DBPASS"],
+        )
     try:
-        return delete_expired_measurements(conn)
+        ensure_watermark_table(conn)
+        deleted = delete_expired_measurements(conn)
+        delete_expired_raw_payloads(conn)
+        return deleted
     except Exception:
         conn.rollback()
         raise
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import json
+from psycopg2.extras import execute_values
 
 from airkorea_common import (
     AIRKOREA_BASE_URL,
@@ -11,6 +11,7 @@ from airkorea_common import (
     station_external_code,
     to_int,
 )
+from ingest_common import archive_raw_payloads, record_ingest_commit
 
 
 REALTIME_ENDPOINT = f"{AIRKOREA_BASE_URL}/getCtprvnRltmMesureDnsty"
@@ -32,7 +33,7 @@ def fetch_region(conn, region, decode_key=False):
 
 
 def upsert_region_measurements(conn, region, items):
-    upserted = 0
+    pending = []
     skipped_without_coordinates = 0
     with conn.cursor() as cur:
         for item in items:
@@ -62,30 +63,7 @@ def upsert_region_measurements(conn, region, items):
             if not station:
                 skipped_without_coordinates += 1
                 continue
-
-            cur.execute(
-                """
-                INSERT INTO air.measurements(
-                    station_id, ts, pm10, pm25, pm10_grade, pm25_grade,
-                    raw, source_id, source_quality, unit_pm10, unit_pm25,
-                    aqi_provider
-                )
-                VALUES (
-                    %s,%s,%s,%s,%s,%s,%s::jsonb,
-                    (SELECT id FROM air.sources WHERE code='airkorea'),
-                    'observed','ug/m3','ug/m3','AIRKOREA'
-                )
-                ON CONFLICT (station_id, ts) DO UPDATE SET
-                    pm10=EXCLUDED.pm10,
-                    pm25=EXCLUDED.pm25,
-                    pm10_grade=EXCLUDED.pm10_grade,
-                    pm25_grade=EXCLUDED.pm25_grade,
-                    raw=EXCLUDED.raw,
-                    source_quality=EXCLUDED.source_quality,
-                    unit_pm10=EXCLUDED.unit_pm10,
-                    unit_pm25=EXCLUDED.unit_pm25,
-                    aqi_provider=EXCLUDED.aqi_provider
-                """,
+            pending.append(
                 (
                     station[0],
                     parse_observed_at(observed_at_text),
@@ -93,12 +71,90 @@ def upsert_region_measurements(conn, region, items):
                     pm25,
                     to_int(item.get("pm10Grade")),
                     to_int(item.get("pm25Grade")),
-                    json.dumps(item, ensure_ascii=False),
-                ),
+                    item,
+                )
+            )
+
+        raw_ids = archive_raw_payloads(
+            cur, "AIRKOREA", [row[-1] for row in pending]
+        )
+        # A region lists each station once, but a repeated hour must not
+        # reach the single upsert twice.
+        rows = {
+            row[:2]: row[:-1] + (raw_id,)
+            for row, raw_id in zip(pending, raw_ids)
+        }
+        counts = upsert_measurements(cur, list(rows.values()))
+        if counts[0] or counts[1]:
+            record_ingest_commit(
+                cur, "AIRKOREA", [station_id for station_id, _ in rows]
             )
-            upserted += 1
     conn.commit()
-    return upserted, skipped_without_coordinates
+    return counts, skipped_without_coordinates
+
+
+def upsert_measurements(cur, rows):
+    """Upsert one region in a single statement, leaving hours whose values
+    did not change untouched.
+
+    Returns (inserted, updated, unchanged).
+    """
+    if not rows:
+        return 0, 0, 0
+    returned = execute_values(
+        cur,
+        """
+        INSERT INTO air.measurements(
+            station_id, ts, pm10, pm25, pm10_grade, pm25_grade,
+            raw_id, source_id, source_quality, unit_pm10, unit_pm25,
+            aqi_provider
+        )
+        VALUES %s
+        ON CONFLICT (station_id, ts) DO UPDATE SET
+            pm10=EXCLUDED.pm10,
+            pm25=EXCLUDED.pm25,
+            pm10_grade=EXCLUDED.pm10_grade,
+            pm25_grade=EXCLUDED.pm25_grade,
+            raw_id=EXCLUDED.raw_id,
+            source_quality=EXCLUDED.source_quality,
+            unit_pm10=EXCLUDED.unit_pm10,
+            unit_pm25=EXCLUDED.unit_pm25,
+            aqi_provider=EXCLUDED.aqi_provider
+        WHERE (
+            air.measurements.pm10,
+            air.measurements.pm25,
+            air.measurements.pm10_grade,
+            air.measurements.pm25_grade,
+            air.measurements.raw_id,
+            air.measurements.source_quality,
+            air.measurements.unit_pm10,
+            air.measurements.unit_pm25,
+            air.measurements.aqi_provider
+        ) IS DISTINCT FROM (
+            EXCLUDED.pm10,
+            EXCLUDED.pm25,
+            EXCLUDED.pm10_grade,
+            EXCLUDED.pm25_grade,
+            EXCLUDED.raw_id,
+            EXCLUDED.source_quality,
+            EXCLUDED.unit_pm10,
+            EXCLUDED.unit_pm25,
+            EXCLUDED.aqi_provider
+        )
+        RETURNING (xmax = 0) AS inserted
+        """,
+        rows,
+        template=(
+            "(%s,%s,%s,%s,%s,%s,%s,"
+            "(SELECT id FROM air.sources WHERE code='airkorea'),"
+            "'observed','ug/m3','ug/m3','AIRKOREA')"
+        ),
+        page_size=len(rows),
+        fetch=True,
+    )
+    inserted = sum(1 for (was_inserted,) in returned if was_inserted)
+    updated = len(returned) - inserted
+    return inserted, updated, len(rows) - len(returned)
 
 
 def main():
@@ -135,14 +191,16 @@ def main():
                         .get("items")
                         or []
                     )
-                    upserted, missing_coordinates = (
+                    counts, missing_coordinates = (
                         upsert_region_measurements(conn, region, items)
                     )
-                    total_measurements += upserted
+                    inserted, updated, unchanged = counts
+                    total_measurements += sum(counts)
                     succeeded_regions += 1
                     print(
                         f"AIRKOREA region OK: region={region}, "
-                        f"measurements={upserted}, "
+                        f"inserted={inserted}, updated={updated}, "
+                        f"unchanged={unchanged}, "
                         f"missing_coordinates={missing_coordinates}"
                     )
                     last_error = None
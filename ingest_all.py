@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Run the combined provider ingestion in one process.
+
+Providers run concurrently, each on a connection borrowed from one shared
+pool and all through one HTTP session. WAQI is the only core provider:
+the job fails when it does not complete, while the others only warn.
+Once every provider has finished, stations still missing region codes
+are mapped, rollups are refreshed, the /nearest selection raster is
+rebuilt, region summaries are refreshed, and retention cleanup runs last.
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import requests
+from requests.adapters import HTTPAdapter
+
+import build_selection_raster
+import cleanup_measurements
+import ingest_firms
+import ingest_openaq
+import ingest_owm
+import ingest_waqi
+import refresh_region_summaries
+import rollup_measurements
+from airkorea_common import create_connection_pool
+from ingest_common import map_station_regions, region_code_drift
+
+
+# (provider, entry point, core)
+PROVIDERS = (
+    ("OWM", ingest_owm.main, False),
+    ("WAQI", ingest_waqi.main, True),
+    ("OPENAQ", ingest_openaq.main, False),
+    ("FIRMS", ingest_firms.main, False),
+)
+HTTP_POOL_SIZE = 16
+
+
+def create_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def run_step(pool, name, func, **kwargs):
+    """Run one callable on a pooled connection and time it."""
+    started = time.monotonic()
+    result = {"provider": name, "ok": False, "rows": 0, "error": None}
+    conn = None
+    try:
+        # A failed checkout is this step's failure, not the whole run's.
+        conn = pool.getconn()
+        result["rows"] = func(conn=conn, **kwargs) or 0
+        result["ok"] = True
+    # A provider exiting through SystemExit failed like any other error.
+    except (Exception, SystemExit) as exc:
+        result["error"] = exc
+    finally:
+        if conn is not None:
+            discard = not result["ok"]
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+            pool.putconn(conn, close=discard)
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+def map_regions(conn):
+    """Place stations the providers left unmapped and check for drift."""
+    with conn.cursor() as cur:
+        mapped = map_station_regions(cur)
+        unmapped, mismatched = region_code_drift(cur)
+    conn.commit()
+    print(
+        f"[regions] mapped={mapped} unmapped={unmapped} "
+        f"mismatched={mismatched}"
+    )
+    if unmapped or mismatched:
+        print(
+            "regions warning: station region codes are out of sync with "
+            "the boundaries; run sync_admin_boundaries.py",
+            file=sys.stderr,
+        )
+    return mapped
+
+
+def run_all(
+    pool,
+    session,
+    providers=PROVIDERS,
+    cleanup=None,
+    regions=None,
+    rollup=None,
+    raster=None,
+    summaries=None,
+):
+    cleanup = cleanup or cleanup_measurements.main
+    regions = regions or map_regions
+    rollup = rollup or rollup_measurements.main
+    raster = raster or build_selection_raster.main
+    summaries = summaries or refresh_region_summaries.main
+    with ThreadPoolExecutor(max_workers=len(providers)) as executor:
+        futures = [
+            executor.submit(run_step, pool, name, func, session=session)
+            for name, func, _ in providers
+        ]
+        results = [future.result() for future in futures]
+
+    core = {name for name, _, is_core in providers if is_core}
+    for result in results:
+        name = result["provider"]
+        status = "ok" if result["ok"] else "failed"
+        print(
+            f"[ingest] provider={name} status={status} "
+            f"rows={result['rows']} seconds={result['seconds']:.2f}"
+        )
+        if result["ok"]:
+            continue
+        if name in core:
+            print(
+                f"{name} error: ingestion failed: {result['error']}",
+                file=sys.stderr,
+            )
+        else:
+            print(
+                f"{name} warning: optional ingestion failed; continuing: "
+                f"{result['error']}",
+                file=sys.stderr,
+            )
+
+    mapping = run_step(pool, "REGIONS", regions)
+    if not mapping["ok"]:
+        print(
+            f"regions warning: station mapping failed: {mapping['error']}",
+            file=sys.stderr,
+        )
+
+    # Retention only removes raw rows the rollup has covered, so a failed
+    # rollup simply holds raw rows back until the next run.
+    rollups = run_step(pool, "ROLLUP", rollup)
+    print(
+        f"[ingest] step=rollup status="
+        f"{'ok' if rollups['ok'] else 'failed'} "
+        f"rows={rollups['rows']} seconds={rollups['seconds']:.2f}"
+    )
+    if not rollups["ok"]:
+        print(
+            f"rollup warning: refresh failed: {rollups['error']}",
+            file=sys.stderr,
+        )
+
+    # Without a fresh raster the API keeps answering from SQL.
+    rasters = run_step(pool, "RASTER", raster)
+    print(
+        f"[ingest] step=raster status="
+        f"{'ok' if rasters['ok'] else 'failed'} "
+        f"rows={rasters['rows']} seconds={rasters['seconds']:.2f}"
+    )
+    if not rasters["ok"]:
+        print(
+            f"raster warning: selection raster build failed: "
+            f"{rasters['error']}",
+            file=sys.stderr,
+        )
+
+    # Summaries follow the rollup, whose refresh times mark what changed.
+    refreshed = run_step(pool, "SUMMARIES", summaries)
+    print(
+        f"[ingest] step=summaries status="
+        f"{'ok' if refreshed['ok'] else 'failed'} "
+        f"rows={refreshed['rows']} seconds={refreshed['seconds']:.2f}"
+    )
+    if not refreshed["ok"]:
+        print(
+            f"summaries warning: region summary refresh failed: "
+            f"{refreshed['error']}",
+            file=sys.stderr,
+        )
+
+    retention = run_step(pool, "RETENTION", cleanup)
+    print(
+        f"[ingest] step=retention status="
+        f"{'ok' if retention['ok'] else 'failed'} "
+        f"rows={retention['rows']} seconds={retention['seconds']:.2f}"
+    )
+    if not retention["ok"]:
+        print(
+            "retention error: cleanup failed; collected provider data "
+            f"remains committed: {retention['error']}",
+            file=sys.stderr,
+        )
+
+    core_success = sum(
+        1 for result in results
+        if result["ok"] and result["provider"] in core
+    )
+    core_failure = len(core) - core_success
+    return core_success, core_failure
+
+
+def main():
+    print("== air data ingestion started ==")
+    pool = create_connection_pool(maxconn=len(PROVIDERS) + 1)
+    session = create_session()
+    try:
+        core_success, core_failure = run_all(pool, session)
+    finally:
+        session.close()
+        pool.closeall()
+    if core_success == 0:
+        print(
+            "ingestion failed: WAQI did not complete successfully",
+            file=sys.stderr,
+        )
+        return 1
+    print(
+        "== air data ingestion completed: "
+        f"core_success={core_success}, core_failure={core_failure} =="
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""Provider-neutral helpers shared by the ingestion jobs."""
+
+import hashlib
+import json
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+
+# Must match app/invalidation.py CHANNEL.
+NOTIFY_CHANNEL = "hudadak_ingest"
+# Notification payloads are limited to 8000 bytes; larger station sets
+# are announced as a change to everything.
+NOTIFY_MAX_STATIONS = 500
+
+
+def ensure_watermark_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS air.ingest_watermarks (
+                provider text NOT NULL,
+                scope text NOT NULL,
+                watermark timestamptz NOT NULL,
+                updated_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (provider, scope)
+            )
+            """
+        )
+    conn.commit()
+
+
+def load_watermarks(cur, provider):
+    """Return {scope: watermark} for one provider."""
+    cur.execute(
+        """
+        SELECT scope, watermark
+        FROM air.ingest_watermarks
+        WHERE provider=%s
+        """,
+        (provider,),
+    )
+    return dict(cur.fetchall())
+
+
+def save_watermarks(cur, provider, watermarks):
+    """Advance watermarks; an older value never moves one backwards."""
+    if not watermarks:
+        return
+    execute_values(
+        cur,
+        """
+        INSERT INTO air.ingest_watermarks(
+            provider, scope, watermark, updated_at
+        )
+        VALUES %s
+        ON CONFLICT (provider, scope) DO UPDATE SET
+            watermark=GREATEST(
+                air.ingest_watermarks.watermark, EXCLUDED.watermark
+            ),
+            updated_at=CURRENT_TIMESTAMP
+        """,
+        [(provider, scope, value) for scope, value in watermarks.items()],
+        template="(%s,%s,%s,CURRENT_TIMESTAMP)",
+    )
+
+
+def canonical_payload(payload):
+    return json.dumps(
+        payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    )
+
+
+def payload_digest(provider, payload):
+    """Content hash that identifies one provider payload in the archive."""
+    text = f"{provider}\n{canonical_payload(payload)}"
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def archive_raw_payloads(cur, provider, payloads):
+    """Store payloads in air.raw_payloads once per distinct content.
+
+    Returns the archive ids in the order of ``payloads``; a None payload
+    maps to None.
+    """
+    digests = [
+        None if payload is None else payload_digest(provider, payload)
+        for payload in payloads
+    ]
+    distinct = {}
+    for digest, payload in zip(digests, payloads):
+        if digest is not None:
+            distinct.setdefault(digest, payload)
+    if not distinct:
+        return [None] * len(payloads)
+
+    # A payload seen again within the hour keeps its last_seen_at, so
+    # re-fetching unchanged content every run does not rewrite the row.
+    returned = execute_values(
+        cur,
+        """
+        INSERT INTO air.raw_payloads(content_hash, provider, payload)
+        VALUES %s
+        ON CONFLICT (content_hash) DO UPDATE SET
+            last_seen_at=CURRENT_TIMESTAMP
+        WHERE air.raw_payloads.last_seen_at
+            < CURRENT_TIMESTAMP - INTERVAL '1 hour'
+        RETURNING content_hash, id
+        """,
+        [
+            (psycopg2.Binary(digest), provider, canonical_payload(payload))
+            for digest, payload in distinct.items()
+        ],
+        template="(%s,%s,%s::jsonb)",
+        page_size=len(distinct),
+        fetch=True,
+    )
+    ids = {bytes(digest): raw_id for digest, raw_id in returned}
+    missing = [digest for digest in distinct if digest not in ids]
+    if missing:
+        cur.execute(
+            """
+            SELECT content_hash, id
+            FROM air.raw_payloads
+            WHERE content_hash = ANY(%s)
+            """,
+            ([psycopg2.Binary(digest) for digest in missing],),
+        )
+        ids.update(
+            (bytes(digest), raw_id) for digest, raw_id in cur.fetchall()
+        )
+    return [None if digest is None else ids[digest] for digest in digests]
+
+
+def map_station_regions(cur, station_ids=None):
+    """Assign sido/sigungu codes from the smallest covering sigungu.
+
+    Maps the given stations, or every station still missing a code when
+    station_ids is None. The regions a station leaves and joins are
+    marked for refresh_region_summaries.py. Returns the number of rows
+    whose codes changed.
+    """
+    if station_ids is None:
+        scope = "(s.sido_code IS NULL OR s.sigungu_code IS NULL)"
+        params = ()
+    else:
+        if not station_ids:
+            return 0
+        scope = "s.id = ANY(%s)"
+        params = (list(station_ids),)
+    mapped = f"""
+        WITH mapped AS (
+            SELECT DISTINCT ON (s.id)
+                s.id,
+                s.sido_code AS old_sido_code,
+                s.sigungu_code AS old_sigungu_code,
+                r.code AS sigungu_code,
+                r.parent_code AS sido_code
+            FROM air.stations s
+            JOIN air.admin_regions_subdivided piece
+              ON piece.level='sigungu'
+             AND ST_Covers(piece.geom, s.geom::geometry)
+            JOIN air.admin_regions r ON r.code=piece.code
+            WHERE s.geom IS NOT NULL
+              AND {scope}
+            ORDER BY s.id, r.area ASC, r.code ASC
+        )
+    """
+    cur.execute(
+        f"""
+        {mapped}
+        INSERT INTO air.region_summary_dirty(sido_code, sigungu_code)
+        SELECT DISTINCT codes.sido_code, codes.sigungu_code
+        FROM mapped m
+        CROSS JOIN LATERAL (
+            VALUES
+                (m.old_sido_code, m.old_sigungu_code),
+                (m.sido_code, m.sigungu_code)
+        ) codes(sido_code, sigungu_code)
+        WHERE (m.old_sido_code, m.old_sigungu_code)
+              IS DISTINCT FROM (m.sido_code, m.sigungu_code)
+          AND codes.sido_code IS NOT NULL
+          AND codes.sigungu_code IS NOT NULL
+        ON CONFLICT (sido_code, sigungu_code) DO UPDATE SET
+            marked_at=CURRENT_TIMESTAMP
+        """,
+        params,
+    )
+    cur.execute(
+        f"""
+        {mapped}
+        UPDATE air.stations s
+        SET sido_code=m.sido_code,
+            sigungu_code=m.sigungu_code
+        FROM mapped m
+        WHERE s.id=m.id
+          AND (s.sido_code, s.sigungu_code)
+              IS DISTINCT FROM (m.sido_code, m.sigungu_code)
+        """,
+        params,
+    )
+    return cur.rowcount
+
+
+def region_code_drift(cur):
+    """Compare stored station region codes with the current boundaries.
+
+    Returns (unmapped, mismatched): stations inside a sigungu that have no
+    codes, and stations whose codes name a different region.
+    """
+    cur.execute(
+        """
+        WITH expected AS (
+            SELECT DISTINCT ON (s.id)
+                s.id,
+                s.sido_code,
+                s.sigungu_code,
+                r.code AS expected_sigungu_code,
+                r.parent_code AS expected_sido_code
+            FROM air.stations s
+            JOIN air.admin_regions_subdivided piece
+              ON piece.level='sigungu'
+             AND ST_Covers(piece.geom, s.geom::geometry)
+            JOIN air.admin_regions r ON r.code=piece.code
+            WHERE s.geom IS NOT NULL
+            ORDER BY s.id, r.area ASC, r.code ASC
+        )
+        SELECT
+            COUNT(*) FILTER (WHERE sigungu_code IS NULL),
+            COUNT(*) FILTER (
+                WHERE sigungu_code IS NOT NULL
+                  AND (sido_code, sigungu_code) IS DISTINCT FROM
+                      (expected_sido_code, expected_sigungu_code)
+            )
+        FROM expected
+        """
+    )
+    unmapped, mismatched = cur.fetchone()
+    return unmapped, mismatched
+
+
+def record_ingest_commit(cur, provider, station_ids=None):
+    """Bump the provider's data version inside the writing transaction.
+
+    Also announces the change to API listeners; pass the stations the
+    transaction wrote so they only drop answers near them.
+    """
+    cur.execute(
+        """
+        INSERT INTO air.ingest_commits(provider, version, committed_at)
+        VALUES (%s, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (provider) DO UPDATE SET
+            version=air.ingest_commits.version + 1,
+            committed_at=CURRENT_TIMESTAMP
+        """,
+        (provider,),
+    )
+    notify_change(cur, "ingest", provider, station_ids)
+
+
+def notify_change(cur, kind, source, station_ids=None):
+    """Queue a NOTIFY on NOTIFY_CHANNEL describing what a job wrote.
+
+    Postgres delivers it only when the transaction commits, and drops it
+    on rollback. The JSON payload carries the kind of change, its source,
+    the data version, and the stations with their regions and bounding
+    box; stations is null when the change is not limited to a known set,
+    including sets too large for a notification payload.
+    """
+    if station_ids is not None:
+        station_ids = sorted(set(station_ids))
+        if len(station_ids) > NOTIFY_MAX_STATIONS:
+            station_ids = None
+    cur.execute(
+        """
+        WITH changed AS (
+            SELECT id, sido_code, sigungu_code, lat, lon
+            FROM air.stations
+            WHERE id = ANY(%(stations)s::bigint[])
+        )
+        SELECT pg_notify(%(channel)s, json_build_object(
+            'kind', %(kind)s::text,
+            'source', %(source)s::text,
+            'version', (
+                SELECT COALESCE(SUM(version), 0) FROM air.ingest_commits
+            ),
+            'stations', %(stations)s::bigint[],
+            'sido', (
+                SELECT array_agg(DISTINCT sido_code) FROM changed
+                WHERE sido_code IS NOT NULL
+            ),
+            'sigungu', (
+                SELECT array_agg(DISTINCT sigungu_code) FROM changed
+                WHERE sigungu_code IS NOT NULL
+            ),
+            'bbox', (
+                SELECT json_build_array(
+                    MIN(lat), MIN(lon), MAX(lat), MAX(lon)
+                )
+                FROM changed
+                WHERE lat IS NOT NULL AND lon IS NOT NULL
+            )
+        )::text)
+        """,
+        {
+            "channel": NOTIFY_CHANNEL,
+            "kind": kind,
+            "source": source,
+            "stations": station_ids,
+        },
+    )
@@ -1,105 +1,250 @@
-# --- DB 연결 설정 (Cloud SQL 소켓 방식) ---
-import os, psycopg2
-DBNAME = os.getenv("DBNAME", "hudadak_air")
-DBUSER = os.getenv("DBUSER", "hudadak_admin")
-DBHOST = os.getenv("DBHOST", "/cloudsql/hudadak-air:asia-northeast3:hudadak-2025")
-DBPASS = os.getenv("DBPASS")
-# --- 여기까지 ---
-
-import os, csv, io, requests, psycopg2, json
-from psycopg2.extras import execute_values
+#!/usr/bin/env python3
+import csv
+import io
+import json
+import os
+from contextlib import contextmanager
 from datetime import datetime
 
-# --- 여기부터 복사 ---
+import requests
+
+from airkorea_common import get_db_connection
+
 
-DBHOST = os.getenv("DBHOST")
-DBNAME = os.getenv("DBNAME")
-DBUSER = os.getenv("DBUSER")
-DBPASS = os.getenv("DBPASS")
 KEY = os.getenv("FIRMS_MAP_KEY") or os.getenv("NASA_KEY")
-assert DBHOST and DBNAME and DBUSER and DBPASS, "DB* env not set"
-if not KEY:
-    print("FIRMS warning: FIRMS_MAP_KEY or NASA_KEY is not configured; skipped")
-    raise SystemExit(0)
 
 # 영역(bbox) API (키 필요) + 공개 24h CSV(폴백)
-BBOX     = (126.3, 36.9, 127.8, 38.2)
-SENSOR   = "VIIRS_SNPP"
-DAYS     = "1"
-AREA_URL   = f"https://firms.modaps.eosdis.nasa.gov/api/area/csv/{KEY}/{SENSOR}/{DAYS}/{BBOX[0]},{BBOX[1]},{BBOX[2]},{BBOX[3]}"
-PUBLIC_URL = "https://firms.modaps.eosdis.nasa.gov/data/active_fire/suomi-npp-viirs-c2/csv/SUOMI_VIIRS_C2_Global_24h.csv"
-
-def fetch_csv(url: str) -> csv.DictReader:
-    t = requests.get(url, timeout=60)
-    t.raise_for_status()
-    return csv.DictReader(io.StringIO(t.text))
-
-# DB 연결 및 source upsert
-conn = psycopg2.connect(host=DBHOST, dbname=DBNAME, user=DBUSER, password=DBPASS, connect_timeout=10)
-conn.autocommit = True
-c = conn.cursor()
-c.execute("""
-INSERT INTO air.sources(code,name,base_url,kind)
-VALUES ('nasa_firms','NASA FIRMS','https://firms.modaps.eosdis.nasa.gov','satellite')
-ON CONFLICT (code) DO UPDATE
-SET name=EXCLUDED.name, base_url=EXCLUDED.base_url, kind=EXCLUDED.kind
-""")
-
-# 피드 가져오기: bbox 우선, 실패/스키마 불일치 시 공개 CSV로 폴백
-try:
-    r = fetch_csv(AREA_URL)
-    f = r.fieldnames or []
-    if ("acq_date" not in f) or ("acq_time" not in f):
-        raise KeyError("acq_date/acq_time not in AREA feed; fallback")
-except Exception:
-    r = fetch_csv(PUBLIC_URL)
-
-# 행 파싱 및 INSERT (Batch 방식)
-rows = []
-for row in r:
+BBOX = (126.3, 36.9, 127.8, 38.2)
+SENSOR = "VIIRS_SNPP"
+DAYS = "1"
+PUBLIC_URL = (
+    "https://firms.modaps.eosdis.nasa.gov/data/active_fire/"
+    "suomi-npp-viirs-c2/csv/SUOMI_VIIRS_C2_Global_24h.csv"
+)
+COPY_BATCH_ROWS = int(os.getenv("FIRMS_COPY_BATCH_ROWS", "5000"))
+STAGE_COLUMNS = (
+    "detected_at", "lat", "lon", "satellite", "confidence", "frp", "raw"
+)
+TIME_FORMATS = ("%Y-%m-%d %H%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
+
+def area_url(key):
+    bbox = ",".join(str(value) for value in BBOX)
+    return (
+        "https://firms.modaps.eosdis.nasa.gov/api/area/csv/"
+        f"{key}/{SENSOR}/{DAYS}/{bbox}"
+    )
+
+
+@contextmanager
+def open_feed(session, url):
+    """Yield a DictReader over the response body without buffering it."""
+    with session.get(url, timeout=60, stream=True) as response:
+        response.raise_for_status()
+        if response.encoding is None:
+            response.encoding = "utf-8"
+        yield csv.DictReader(response.iter_lines(decode_unicode=True))
+
+
+def in_bbox(lat, lon):
+    return BBOX[0] <= lon <= BBOX[2] and BBOX[1] <= lat <= BBOX[3]
+
+
+def parse_row(row):
+    """Return a staging tuple, or None for rows outside BBOX or unusable."""
+    try:
+        lat = float(row["latitude"])
+        lon = float(row["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not in_bbox(lat, lon):
+        return None
+
     # 날짜/시간 키 유연 매핑
-    date = row.get("acq_date") or row.get("acquisition_date") or row.get("date")
-    time = row.get("acq_time") or row.get("acquisition_time") or row.get("acq_time_utc") or row.get("time")
+    date = (
+        row.get("acq_date")
+        or row.get("acquisition_date")
+        or row.get("date")
+    )
+    time = (
+        row.get("acq_time")
+        or row.get("acquisition_time")
+        or row.get("acq_time_utc")
+        or row.get("time")
+    )
     if not (date and time):
-        continue
-
-    when = f"{date} {time}"
-    ts = None
-    for fmt in ("%Y-%m-%d %H%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        return None
+    detected_at = None
+    for fmt in TIME_FORMATS:
         try:
-            ts = datetime.strptime(when, fmt)
+            detected_at = datetime.strptime(f"{date} {time}", fmt)
             break
         except ValueError:
             pass
-    if ts is None:
-        continue
+    if detected_at is None:
+        return None
 
-    # 좌표
+    frp = row.get("frp")
     try:
-        lat = float(row["latitude"])
-        lon = float(row["longitude"])
+        frp = None if frp in (None, "", "NA") else float(frp)
+    except ValueError:
+        frp = None
+    return (
+        detected_at.isoformat(sep=" "),
+        lat,
+        lon,
+        row.get("satellite") or "VIIRS",
+        row.get("confidence") or row.get("confidence_text") or None,
+        frp,
+        json.dumps(row),
+    )
+
+
+def iter_feed_rows(reader):
+    for row in reader:
+        parsed = parse_row(row)
+        if parsed is not None:
+            yield parsed
+
+
+def copy_rows(cur, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY fire_stage({','.join(STAGE_COLUMNS)}) "
+        "FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def stage_rows(cur, rows):
+    """COPY rows into the staging table in bounded batches."""
+    staged = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= COPY_BATCH_ROWS:
+            copy_rows(cur, batch)
+            staged += len(batch)
+            batch = []
+    if batch:
+        copy_rows(cur, batch)
+        staged += len(batch)
+    return staged
+
+
+def load_feed(cur, session, key):
+    """Stage the bbox feed, falling back to the global 24h CSV when the
+    area API fails or answers with an unexpected schema."""
+    try:
+        with open_feed(session, area_url(key)) as reader:
+            fields = reader.fieldnames or []
+            if "acq_date" not in fields or "acq_time" not in fields:
+                raise KeyError("acq_date/acq_time not in AREA feed; fallback")
+            return stage_rows(cur, iter_feed_rows(reader))
+    except (requests.RequestException, KeyError, ValueError) as exc:
+        print(f"FIRMS warning: area feed unavailable ({exc}); using global")
+    cur.execute("TRUNCATE fire_stage")
+    with open_feed(session, PUBLIC_URL) as reader:
+        return stage_rows(cur, iter_feed_rows(reader))
+
+
+def merge_staged_fires(cur):
+    """Insert new detections and refresh changed ones by natural key.
+
+    Returns (inserted, updated).
+    """
+    cur.execute(
+        """
+        INSERT INTO air.fires(
+            detected_at, lat, lon, satellite, confidence, frp, raw,
+            source_code
+        )
+        SELECT DISTINCT ON (satellite, detected_at, lat, lon)
+            detected_at, lat, lon, satellite, confidence, frp, raw,
+            'nasa_firms'
+        FROM fire_stage
+        ORDER BY satellite, detected_at, lat, lon
+        ON CONFLICT (satellite, detected_at, lat, lon) DO UPDATE SET
+            confidence=EXCLUDED.confidence,
+            frp=EXCLUDED.frp,
+            raw=EXCLUDED.raw
+        WHERE (air.fires.confidence, air.fires.frp)
+            IS DISTINCT FROM (EXCLUDED.confidence, EXCLUDED.frp)
+        RETURNING (xmax = 0) AS inserted
+        """
+    )
+    returned = cur.fetchall()
+    inserted = sum(1 for (was_inserted,) in returned if was_inserted)
+    return inserted, len(returned) - inserted
+
+
+def main(conn=None, session=None):
+    if not KEY:
+        print(
+            "FIRMS warning: FIRMS_MAP_KEY or NASA_KEY is not configured; "
+            "skipped"
+        )
+        return 0
+    own_conn = conn is None
+    own_session = session is None
+    conn = conn or get_db_connection()
+    session = session or requests.Session()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO air.sources(code,name,base_url,kind)
+                VALUES (
+                    'nasa_firms','NASA FIRMS',
+                    'https://firms.modaps.eosdis.nasa.gov','satellite'
+                )
+                ON CONFLICT (code) DO UPDATE SET
+                    name=EXCLUDED.name,
+                    base_url=EXCLUDED.base_url,
+                    kind=EXCLUDED.kind
+                """
+            )
+            cur.execute(
+                """
+                CREATE TEMP TABLE fire_stage (
+                    detected_at timestamp NOT NULL,
+                    lat double precision NOT NULL,
+                    lon double precision NOT NULL,
+                    satellite text NOT NULL,
+                    confidence text,
+                    frp double precision,
+                    raw jsonb
+                ) ON COMMIT DROP
+                """
+            )
+            staged = load_feed(cur, session, KEY)
+            inserted, updated = merge_staged_fires(cur)
+            cur.execute(
+                """
+                DELETE FROM air.fires
+                WHERE source_code='nasa_firms'
+                  AND detected_at < now() - interval '15 days'
+                """
+            )
+            deleted = cur.rowcount
+        conn.commit()
     except Exception:
-        continue
-
-    sat  = row.get("satellite") or "VIIRS"
-    conf = row.get("confidence") or row.get("confidence_text")
-    frp  = row.get("frp")
-    frp  = None if frp in (None, "", "NA") else float(frp)
-
-    # 데이터를 리스트에 추가 (DB에 바로 INSERT 하지 않음)
-    rows.append((ts, lat, lon, sat, conf, frp, json.dumps(row)))
-
-# 반복문이 끝난 후, 모아둔 데이터를 DB에 한 번에 INSERT
-if rows:
-    execute_values(c, """
-        INSERT INTO air.fires(detected_at, lat, lon, satellite, confidence, frp, raw, source_code)
-        VALUES %s
-    """, rows, template="(%s,%s,%s,%s,%s,%s,%s,'nasa_firms')")
-    print(f"FIRMS OK: {len(rows)} rows inserted.")
-
-c.execute("DELETE FROM air.fires WHERE source_code='nasa_firms' AND detected_at < now() - interval '15 days'")
-print("FIRMS retention: deleted", c.rowcount, "old rows")
-
-conn.close()
-
-# --- 여기까지 복사 ---
+        conn.rollback()
+        raise
+    finally:
+        if own_session:
+            session.close()
+        if own_conn:
+            conn.close()
+    print(
+        f"FIRMS OK: staged={staged}, inserted={inserted}, "
+        f"updated={updated}, unchanged={staged - inserted - updated}"
+    )
+    print("FIRMS retention: deleted", deleted, "old rows")
+    return inserted + updated
+
+
+if __name__ == "__main__":
+    main()
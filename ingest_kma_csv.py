@@ -1,123 +1,404 @@
-# --- DB 연결 설정 (Cloud SQL 소켓 방식) ---
-import os, psycopg2
-DBNAME = os.getenv("DBNAME", "hudadak_air")
-DBUSER = os.getenv("DBUSER", "hudadak_admin")
-DBHOST = os.getenv("DBHOST", "/cloudsql/hudadak-air:asia-northeast3:hudadak-2025")
-DBPASS = os.getenv("DBPASS")
-# --- 여기까지 ---
-
-import os, sys, csv, json
+#!/usr/bin/env python3
+"""Bulk-load KMA PM CSV exports through a COPY staging table.
+
+Usage: python ingest_kma_csv.py <CSV_PATH> [--workers N] [--restart]
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import psycopg2
+from itertools import islice
+
+from airkorea_common import get_db_connection
+from ingest_common import (
+    canonical_payload,
+    payload_digest,
+    record_ingest_commit,
+)
+
+
+PROVIDER = "KMA"
+CHUNK_ROWS = int(os.getenv("KMA_CHUNK_ROWS", "20000"))
+STAGE_COLUMNS = (
+    "line_no", "station_name", "ts", "pm10", "pm25",
+    "pm10_grade", "pm25_grade", "raw_hash", "raw",
+)
 
-DBHOST=os.environ['DBHOST']; DBNAME=os.environ['DBNAME']
-DBUSER=os.environ['DBUSER']; DBPASS=os.environ['DBPASS']
+TIME_FORMATS = (
+    "%Y-%m-%d %H:%M", "%Y/%m/%d %H:%M", "%Y-%m-%d %H", "%Y/%m/%d %H"
+)
 
 # 컬럼명 후보(대/소문자, 한글/영문 섞여도 대응)
 CAND = {
-    "station": {"측정소명","지점명","station","station_name","측정소"},
-    "datetime": {"측정일시","일시","date","datetime","dataTime"},
-    "pm10": {"pm10","PM10","미세먼지","미세먼지(pm10)"},
-    "pm25": {"pm25","PM2.5","초미세먼지","초미세먼지(pm2.5)"},
-    "g10": {"pm10grade","PM10_GRADE","pm10_grade","등급","pm10등급"},
-    "g25": {"pm25grade","PM25_GRADE","pm25_grade","pm25등급"}
+    "station": {"측정소명", "지점명", "station", "station_name", "측정소"},
+    "datetime": {"측정일시", "일시", "date", "datetime", "dataTime"},
+    "pm10": {"pm10", "PM10", "미세먼지", "미세먼지(pm10)"},
+    "pm25": {"pm25", "PM2.5", "초미세먼지", "초미세먼지(pm2.5)"},
+    "g10": {"pm10grade", "PM10_GRADE", "pm10_grade", "등급", "pm10등급"},
+    "g25": {"pm25grade", "PM25_GRADE", "pm25_grade", "pm25등급"},
 }
 
-def pick(row, keys):
-    for k in row.keys():
-        kl = k.strip().lower()
-        if kl in keys or k in keys:
-            return row[k].strip()
-    return ""
+
+def resolve_columns(header):
+    """Map each logical field to its column index once per file."""
+    normalized = [name.strip().lower() for name in header]
+    mapping = {}
+    for field, candidates in CAND.items():
+        keys = {candidate.lower() for candidate in candidates}
+        mapping[field] = next(
+            (
+                index
+                for index, name in enumerate(normalized)
+                if name in keys
+            ),
+            None,
+        )
+    return mapping
+
 
 def to_int(s):
     s = (s or "").strip()
-    if s in {"", "-", "NA", "null"}: return None
+    if s in {"", "-", "NA", "null"}:
+        return None
     # KMA가 "20㎍/m3"처럼 줄 때도 있음
-    for ch in ["㎍/m3","㎍/㎥","ug/m3","μg/m³"]:
-        s = s.replace(ch,"")
-    s = s.replace(",","")
-    try: return int(float(s))
-    except: return None
+    for ch in ["㎍/m3", "㎍/㎥", "ug/m3", "μg/m³"]:
+        s = s.replace(ch, "")
+    s = s.replace(",", "")
+    try:
+        return int(float(s))
+    except ValueError:
+        return None
+
 
 def parse_ts(s):
-    s=(s or "").strip()
+    s = (s or "").strip()
     # 흔한 포맷들 대응
-    for fmt in ("%Y-%m-%d %H:%M", "%Y/%m/%d %H:%M", "%Y-%m-%d %H", "%Y/%m/%d %H"):
+    for fmt in TIME_FORMATS:
         try:
             return datetime.strptime(s, fmt)
-        except:
+        except ValueError:
             pass
     # 못 맞추면 None
     return None
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python ingest_kma_csv.py <CSV_PATH>", file=sys.stderr)
-        sys.exit(2)
-    path = sys.argv[1]
-
-    
-    conn.autocommit=False
-    cur = conn.cursor()
-
-    # KMA 소스 id
-    cur.execute("SELECT id FROM air.sources WHERE code='kma_temp'")
-    src = cur.fetchone()
-    if not src:
-        print("kma_temp source not found; insert it first.", file=sys.stderr)
-        conn.rollback(); sys.exit(3)
-    source_id = src[0]
-
-    # CSV 읽기
-    with open(path, newline='', encoding='utf-8-sig') as f:
-        rdr = csv.DictReader(f)
-        inserted = updated = skipped = 0
-        for row in rdr:
-            st_name = pick(row, {x.lower() for x in CAND["station"]})
-            dtime   = pick(row, {x.lower() for x in CAND["datetime"]})
-            pm10    = to_int(pick(row, {x.lower() for x in CAND["pm10"]}))
-            pm25    = to_int(pick(row, {x.lower() for x in CAND["pm25"]}))
-            g10     = to_int(pick(row, {x.lower() for x in CAND["g10"]}))
-            g25     = to_int(pick(row, {x.lower() for x in CAND["g25"]}))
-            ts      = parse_ts(dtime)
-            if not st_name or not ts:
-                skipped += 1
-                continue
-
-            # 스테이션 upsert (KMA 제공명이 곧 name)
-            cur.execute("""
-                INSERT INTO air.stations(external_code, name, provider, source_id)
-                VALUES (%s, %s, 'KMA', %s)
-                ON CONFLICT (provider, external_code) DO NOTHING;
-            """, (f'KMA_{st_name}', st_name, source_id))
-
-            cur.execute("SELECT id FROM air.stations WHERE provider='KMA' AND name=%s LIMIT 1;", (st_name,))
-            r = cur.fetchone()
-            if not r:
-                skipped += 1
-                continue
-            station_id = r[0]
-
-            # measurements upsert
-            cur.execute("""
-                INSERT INTO air.measurements(station_id, ts, pm10, pm25, pm10_grade, pm25_grade, raw, source_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb, %s)
-                ON CONFLICT (station_id, ts) DO UPDATE
-                SET pm10=EXCLUDED.pm10, pm25=EXCLUDED.pm25,
-                    pm10_grade=EXCLUDED.pm10_grade, pm25_grade=EXCLUDED.pm25_grade,
-                    raw=EXCLUDED.raw, source_id=EXCLUDED.source_id;
-            """, (station_id, ts, pm10, pm25, g10, g25, json.dumps(row, ensure_ascii=False), source_id))
-            if cur.rowcount == 1:
-                inserted += 1
-            else:
-                updated += 1
 
+def parse_chunk(header, mapping, first_line, rows):
+    """Turn raw CSV rows into staging tuples.
+
+    Runs in worker processes, so it only takes and returns picklable
+    values. Returns (stage_rows, skipped).
+    """
+
+    def pick(row, field):
+        index = mapping[field]
+        if index is None or index >= len(row):
+            return ""
+        return row[index].strip()
+
+    staged = []
+    skipped = 0
+    for offset, row in enumerate(rows):
+        station_name = pick(row, "station")
+        ts = parse_ts(pick(row, "datetime"))
+        if not station_name or not ts:
+            skipped += 1
+            continue
+        raw = dict(zip(header, row))
+        staged.append(
+            (
+                first_line + offset,
+                station_name,
+                ts.isoformat(sep=" "),
+                to_int(pick(row, "pm10")),
+                to_int(pick(row, "pm25")),
+                to_int(pick(row, "g10")),
+                to_int(pick(row, "g25")),
+                payload_digest(PROVIDER, raw).hex(),
+                canonical_payload(raw),
+            )
+        )
+    return staged, skipped
+
+
+def iter_chunks(reader, size):
+    line = 0
+    while True:
+        rows = list(islice(reader, size))
+        if not rows:
+            return
+        yield line, rows
+        line += len(rows)
+
+
+def iter_parsed_chunks(reader, header, mapping, workers):
+    """Yield (row_count, stage_rows, skipped) in file order.
+
+    With workers > 1 parsing fans out to a process pool while at most
+    2 * workers chunks are in flight, which keeps memory bounded.
+    """
+    chunks = iter_chunks(reader, CHUNK_ROWS)
+    if workers <= 1:
+        for first_line, rows in chunks:
+            staged, skipped = parse_chunk(header, mapping, first_line, rows)
+            yield len(rows), staged, skipped
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for first_line, rows in chunks:
+            pending.append(
+                (
+                    len(rows),
+                    executor.submit(
+                        parse_chunk, header, mapping, first_line, rows
+                    ),
+                )
+            )
+            if len(pending) >= workers * 2:
+                count, future = pending.popleft()
+                yield (count, *future.result())
+        while pending:
+            count, future = pending.popleft()
+            yield (count, *future.result())
+
+
+def ensure_progress_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS air.ingest_file_progress (
+                file_key text PRIMARY KEY,
+                rows_committed bigint NOT NULL DEFAULT 0,
+                completed boolean NOT NULL DEFAULT false,
+                updated_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+    conn.commit()
+
+
+def file_key(path):
+    return f"KMA:{os.path.basename(path)}:{os.path.getsize(path)}"
+
+
+def load_progress(cur, key):
+    cur.execute(
+        """
+        SELECT rows_committed, completed
+        FROM air.ingest_file_progress
+        WHERE file_key=%s
+        """,
+        (key,),
+    )
+    return cur.fetchone() or (0, False)
+
+
+def save_progress(cur, key, rows_committed, completed=False):
+    cur.execute(
+        """
+        INSERT INTO air.ingest_file_progress(
+            file_key, rows_committed, completed, updated_at
+        )
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (file_key) DO UPDATE SET
+            rows_committed=EXCLUDED.rows_committed,
+            completed=EXCLUDED.completed,
+            updated_at=CURRENT_TIMESTAMP
+        """,
+        (key, rows_committed, completed),
+    )
+
+
+def copy_stage_rows(cur, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY kma_stage({','.join(STAGE_COLUMNS)}) "
+        "FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def merge_stage(cur, source_id):
+    """Merge the staged chunk with set-based SQL.
+
+    Returns (inserted, updated).
+    """
+    cur.execute(
+        """
+        INSERT INTO air.stations(external_code, name, provider, source_id)
+        SELECT DISTINCT 'KMA_' || station_name, station_name, 'KMA', %s
+        FROM kma_stage
+        ON CONFLICT (provider, external_code) DO NOTHING
+        """,
+        (source_id,),
+    )
+    cur.execute(
+        """
+        INSERT INTO air.raw_payloads(content_hash, provider, payload)
+        SELECT DISTINCT ON (raw_hash) decode(raw_hash, 'hex'), %s, raw
+        FROM kma_stage
+        ORDER BY raw_hash
+        ON CONFLICT (content_hash) DO UPDATE SET
+            last_seen_at=CURRENT_TIMESTAMP
+        WHERE air.raw_payloads.last_seen_at
+            < CURRENT_TIMESTAMP - INTERVAL '1 hour'
+        """,
+        (PROVIDER,),
+    )
+    # The last row of the file wins for a repeated station/hour, as it
+    # did when rows were upserted one by one.
+    cur.execute(
+        """
+        INSERT INTO air.measurements(
+            station_id, ts, pm10, pm25, pm10_grade, pm25_grade, raw_id,
+            source_id
+        )
+        SELECT DISTINCT ON (s.id, k.ts)
+            s.id, k.ts, k.pm10, k.pm25, k.pm10_grade, k.pm25_grade, p.id,
+            %s
+        FROM kma_stage k
+        JOIN air.stations s
+          ON s.provider='KMA'
+         AND s.external_code='KMA_' || k.station_name
+        JOIN air.raw_payloads p ON p.content_hash=decode(k.raw_hash, 'hex')
+        ORDER BY s.id, k.ts, k.line_no DESC
+        ON CONFLICT (station_id, ts) DO UPDATE SET
+            pm10=EXCLUDED.pm10,
+            pm25=EXCLUDED.pm25,
+            pm10_grade=EXCLUDED.pm10_grade,
+            pm25_grade=EXCLUDED.pm25_grade,
+            raw_id=EXCLUDED.raw_id,
+            source_id=EXCLUDED.source_id
+        RETURNING (xmax = 0) AS inserted
+        """,
+        (source_id,),
+    )
+    returned = cur.fetchall()
+    inserted = sum(1 for (was_inserted,) in returned if was_inserted)
+    return inserted, len(returned) - inserted
+
+
+def load_file(conn, path, workers=1, restart=False):
+    key = file_key(path)
+    with conn.cursor() as cur:
+        # KMA 소스 id
+        cur.execute("SELECT id FROM air.sources WHERE code='kma_temp'")
+        src = cur.fetchone()
+        if not src:
+            raise LookupError("kma_temp source not found; insert it first.")
+        source_id = src[0]
+        resume_from, completed = load_progress(cur, key)
+        if restart:
+            resume_from, completed = 0, False
+        cur.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS kma_stage (
+                line_no bigint NOT NULL,
+                station_name text NOT NULL,
+                ts timestamp NOT NULL,
+                pm10 integer,
+                pm25 integer,
+                pm10_grade integer,
+                pm25_grade integer,
+                raw_hash text NOT NULL,
+                raw jsonb NOT NULL
+            ) ON COMMIT DELETE ROWS
+            """
+        )
+    conn.commit()
+    if completed:
+        print(f"KMA skipped: {path} was already loaded (use --restart)")
+        return 0, 0, 0
+
+    totals = {"rows": resume_from, "inserted": 0, "updated": 0, "skipped": 0}
+    started = time.monotonic()
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.reader(handle)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError(f"{path} is empty")
+        mapping = resolve_columns(header)
+        if mapping["station"] is None or mapping["datetime"] is None:
+            raise ValueError("station/datetime columns not found in header")
+        if resume_from:
+            print(f"KMA resume: skipping {resume_from} committed rows")
+            for _ in islice(reader, resume_from):
+                pass
+
+        for count, stage_rows, skipped in iter_parsed_chunks(
+            reader, header, mapping, workers
+        ):
+            with conn.cursor() as cur:
+                if stage_rows:
+                    copy_stage_rows(cur, stage_rows)
+                    inserted, updated = merge_stage(cur, source_id)
+                else:
+                    inserted = updated = 0
+                if inserted or updated:
+                    record_ingest_commit(cur, PROVIDER)
+                save_progress(cur, key, totals["rows"] + count)
+            # Chunk data and its progress row commit together, so a
+            # failed load resumes right after the last committed chunk.
+            conn.commit()
+            totals["rows"] += count
+            totals["inserted"] += inserted
+            totals["updated"] += updated
+            totals["skipped"] += skipped
+            elapsed = max(time.monotonic() - started, 1e-9)
+            print(
+                f"KMA progress: rows={totals['rows']}, "
+                f"rows_per_sec={(totals['rows'] - resume_from) / elapsed:.0f}"
+            )
+
+    with conn.cursor() as cur:
+        save_progress(cur, key, totals["rows"], completed=True)
     conn.commit()
-    cur.close(); conn.close()
-    print(f"Ingest OK. inserted={inserted}, updated={updated}, skipped={skipped}")
+    return totals["inserted"], totals["updated"], totals["skipped"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a KMA PM CSV export")
+    parser.add_argument("csv_path")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("KMA_WORKERS", "1")),
+        help="parser processes (default: KMA_WORKERS or 1)",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="ignore saved progress and load the file from the start",
+    )
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    try:
+        ensure_progress_table(conn)
+        inserted, updated, skipped = load_file(
+            conn, args.csv_path, workers=args.workers, restart=args.restart
+        )
+    except LookupError as exc:
+        conn.rollback()
+        print(exc, file=sys.stderr)
+        sys.exit(3)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(
+        f"Ingest OK. inserted={inserted}, updated={updated}, "
+        f"skipped={skipped}"
+    )
 
-conn = psycopg2.connect(host=DBHOST, dbname=DBNAME, user=DBUSER, password=DBPASS)
 
 if __name__ == "__main__":
     main()
@@ -1,37 +1,325 @@
-# --- DB 연결 설정 (Cloud SQL 소켓 방식) ---
-import os, psycopg2
-DBNAME = os.getenv("DBNAME", "hudadak_air")
-DBUSER = os.getenv("DBUSER", "hudadak_admin")
-DBHOST = os.getenv("DBHOST", "/cloudsql/hudadak-air:asia-northeast3:hudadak-2025")
-DBPASS = os.getenv("DBPASS")
-# --- 여기까지 ---
-
-import os, requests, psycopg2, json, datetime as dt
-DBHOST,DBNAME,DBUSER,DBPASS=[os.getenv(k) for k in("DBHOST","DBNAME","DBUSER","DBPASS")]
-TOK=os.getenv("OPENAQ_TOKEN"); hdr={"X-API-Key":TOK} if TOK else {}
-def main():
-    u="https://api.openaq.org/v3/measurements"
-    params={"country":"KR","parameter":["pm25","pm10"],"limit":100,"order_by":"datetime"}
-    j=requests.get(u, params=params, headers=hdr, timeout=25).json()
-    conn=psycopg2.connect(host=DBHOST,dbname=DBNAME,user=DBUSER,password=DBPASS); c=conn.cursor()
-    c.execute("""INSERT INTO air.sources(code,name,base_url,kind) VALUES ('openaq','OpenAQ','https://openaq.org','aggregate')
-                 ON CONFLICT (code) DO UPDATE SET name=EXCLUDED.name, base_url=EXCLUDED.base_url, kind=EXCLUDED.kind""")
-    for r in j.get("results",[]):
-        st=(r.get("location") or "unknown"); city=(r.get("city") or "KR")
-        lat=r.get("coordinates",{}).get("latitude"); lon=r.get("coordinates",{}).get("longitude")
-        ts=dt.datetime.fromisoformat(r["date"]["utc"].replace("Z","+00:00"))
-        val=r["value"]; param=r["parameter"]
-        c.execute("""INSERT INTO air.stations(external_code,name,provider,kind,city,country,lat,lon,source_id)
-                     VALUES (%s,%s,'OPENAQ','station',%s,'KR',%s,%s,(SELECT id FROM air.sources WHERE code='openaq'))
-                     ON CONFLICT (provider, external_code) DO NOTHING""",(f"OPENAQ_{st}",st,city,lat,lon))
-        c.execute("SELECT id FROM air.stations WHERE provider='OPENAQ' AND name=%s",(st,)); got=c.fetchone()
-        if not got: continue
-        sid=got[0]; pm10=val if param=="pm10" else None; pm25=val if param in ("pm25","pm2.5") else None
-        c.execute("""INSERT INTO air.measurements(station_id,ts,pm10,pm25,raw,source_id,source_quality,unit_pm10,unit_pm25,aqi_provider)
-                     VALUES (%s,%s,%s,%s,%s::jsonb,(SELECT id FROM air.sources WHERE code='openaq'),'aggregate','µg/m³','µg/m³','OpenAQ')
-                     ON CONFLICT (station_id,ts) DO UPDATE SET
-                       pm10=COALESCE(EXCLUDED.pm10, air.measurements.pm10),
-                       pm25=COALESCE(EXCLUDED.pm25, air.measurements.pm25),
-                       raw =COALESCE(EXCLUDED.raw,  air.measurements.raw)""",(sid,ts,pm10,pm25,json.dumps(r)))
-    conn.commit(); c.close(); conn.close(); print("OpenAQ OK")
-if __name__=="__main__": main()
+#!/usr/bin/env python3
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import requests
+from psycopg2.extras import execute_values
+
+from airkorea_common import get_db_connection
+from ingest_common import (
+    archive_raw_payloads,
+    ensure_watermark_table,
+    load_watermarks,
+    record_ingest_commit,
+    save_watermarks,
+)
+
+
+PROVIDER = "OPENAQ"
+API_URL = "https://api.openaq.org/v3/measurements"
+TOKEN = os.getenv("OPENAQ_TOKEN")
+PAGE_SIZE = int(os.getenv("OPENAQ_PAGE_SIZE", "1000"))
+MAX_PAGES = int(os.getenv("OPENAQ_MAX_PAGES", "50"))
+BACKFILL_HOURS = int(os.getenv("OPENAQ_BACKFILL_HOURS", "72"))
+LATE_HOURS = int(os.getenv("OPENAQ_LATE_HOURS", "3"))
+# Watermark scope of the walk itself; every other scope is a location.
+RESUME_SCOPE = "*resume"
+POLLUTANTS = {"pm10": "pm10", "pm25": "pm25", "pm2.5": "pm25"}
+
+
+def parse_result(result):
+    pollutant = POLLUTANTS.get(result.get("parameter"))
+    value = result.get("value")
+    observed_at = ((result.get("date") or {}).get("utc") or "").strip()
+    if pollutant is None or value is None or not observed_at:
+        return None
+    try:
+        ts = datetime.fromisoformat(observed_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    coordinates = result.get("coordinates") or {}
+    return {
+        "location": result.get("location") or "unknown",
+        "city": result.get("city") or "KR",
+        "lat": coordinates.get("latitude"),
+        "lon": coordinates.get("longitude"),
+        "ts": ts,
+        "pollutant": pollutant,
+        "value": value,
+        "raw": result,
+    }
+
+
+def fetch_page(session, page, date_from):
+    response = session.get(
+        API_URL,
+        params={
+            "country": "KR",
+            "parameter": ["pm25", "pm10"],
+            "limit": PAGE_SIZE,
+            "page": page,
+            "order_by": "datetime",
+            "sort": "asc",
+            "date_from": date_from.isoformat(),
+        },
+        headers={"X-API-Key": TOKEN} if TOKEN else {},
+        timeout=25,
+    )
+    response.raise_for_status()
+    return response.json().get("results") or []
+
+
+def iter_fresh_pages(session, watermarks, date_from, walk=None):
+    """Yield the not-yet-ingested results of each page, oldest first.
+
+    Results are sorted by time ascending from date_from, and the walk
+    reads every page, since a location that lags behind the others can
+    have fresh results on any of them. When MAX_PAGES ends the walk
+    first, walk["truncated"] is set and walk["newest"] holds the newest
+    timestamp fetched, where the next run resumes.
+    """
+    walk = {} if walk is None else walk
+    walk.update(truncated=False, newest=None)
+    for page in range(1, MAX_PAGES + 1):
+        results = fetch_page(session, page, date_from)
+        parsed_results = [
+            parsed for parsed in map(parse_result, results)
+            if parsed is not None
+        ]
+        if parsed_results:
+            newest = max(parsed["ts"] for parsed in parsed_results)
+            if walk["newest"] is None or newest > walk["newest"]:
+                walk["newest"] = newest
+        fresh = [
+            parsed
+            for parsed in parsed_results
+            if parsed["location"] not in watermarks
+            or parsed["ts"] > watermarks[parsed["location"]]
+        ]
+        if fresh:
+            yield fresh
+        if len(results) < PAGE_SIZE:
+            return
+    walk["truncated"] = True
+
+
+def cap_watermarks(advanced, newest):
+    """Keep watermarks below the newest fetched timestamp.
+
+    Results sharing that timestamp may continue on the first page the
+    walk did not fetch, so the cap stays just below it.
+    """
+    if newest is None:
+        return {}
+    cap = newest - timedelta(seconds=1)
+    return {location: min(ts, cap) for location, ts in advanced.items()}
+
+
+def merge_measurements(results):
+    """Fold the per-parameter results into one row per location and hour."""
+    merged = {}
+    for result in results:
+        row = merged.setdefault(
+            (result["location"], result["ts"]),
+            {"pm10": None, "pm25": None, "raw": []},
+        )
+        row[result["pollutant"]] = result["value"]
+        row["raw"].append(result["raw"])
+    return merged
+
+
+def write_page(cur, source_id, results):
+    """Upsert one page; returns (inserted, updated, unchanged)."""
+    stations = {}
+    for result in results:
+        stations.setdefault(result["location"], result)
+    external_codes = [f"OPENAQ_{location}" for location in stations]
+    execute_values(
+        cur,
+        """
+        INSERT INTO air.stations(
+            external_code, name, provider, kind, city, country,
+            lat, lon, geom, source_id
+        )
+        VALUES %s
+        ON CONFLICT (provider, external_code) DO NOTHING
+        """,
+        [
+            (
+                f"OPENAQ_{location}",
+                location,
+                item["city"],
+                item["lat"],
+                item["lon"],
+                item["lon"],
+                item["lat"],
+                source_id,
+            )
+            for location, item in stations.items()
+        ],
+        template=(
+            "(%s,%s,'OPENAQ','station',%s,'KR',%s,%s,"
+            "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,%s)"
+        ),
+    )
+    cur.execute(
+        """
+        SELECT external_code, id
+        FROM air.stations
+        WHERE provider='OPENAQ' AND external_code = ANY(%s)
+        """,
+        (external_codes,),
+    )
+    station_ids = dict(cur.fetchall())
+
+    merged = [
+        (station_ids[f"OPENAQ_{location}"], ts, values)
+        for (location, ts), values in merge_measurements(results).items()
+        if f"OPENAQ_{location}" in station_ids
+    ]
+    raw_ids = archive_raw_payloads(
+        cur, PROVIDER, [values["raw"] for _, _, values in merged]
+    )
+    rows = [
+        (
+            station_id,
+            ts,
+            values["pm10"],
+            values["pm25"],
+            raw_id,
+            source_id,
+        )
+        for (station_id, ts, values), raw_id in zip(merged, raw_ids)
+    ]
+    if not rows:
+        return 0, 0, 0
+    returned = execute_values(
+        cur,
+        """
+        INSERT INTO air.measurements(
+            station_id, ts, pm10, pm25, raw_id, source_id, source_quality,
+            unit_pm10, unit_pm25, aqi_provider
+        )
+        VALUES %s
+        ON CONFLICT (station_id, ts) DO UPDATE SET
+            pm10=COALESCE(EXCLUDED.pm10, air.measurements.pm10),
+            pm25=COALESCE(EXCLUDED.pm25, air.measurements.pm25),
+            raw_id=COALESCE(EXCLUDED.raw_id, air.measurements.raw_id)
+        WHERE (
+            air.measurements.pm10,
+            air.measurements.pm25,
+            air.measurements.raw_id
+        ) IS DISTINCT FROM (
+            COALESCE(EXCLUDED.pm10, air.measurements.pm10),
+            COALESCE(EXCLUDED.pm25, air.measurements.pm25),
+            COALESCE(EXCLUDED.raw_id, air.measurements.raw_id)
+        )
+        RETURNING (xmax = 0) AS inserted
+        """,
+        rows,
+        template=(
+            "(%s,%s,%s,%s,%s,%s,"
+            "'aggregate','µg/m³','µg/m³','OpenAQ')"
+        ),
+        page_size=max(len(rows), 1),
+        fetch=True,
+    )
+    inserted = sum(1 for (was_inserted,) in returned if was_inserted)
+    updated = len(returned) - inserted
+    return inserted, updated, len(rows) - len(returned)
+
+
+def newest_by_location(results, watermarks=None):
+    newest = dict(watermarks or {})
+    for result in results:
+        location = result["location"]
+        if location not in newest or result["ts"] > newest[location]:
+            newest[location] = result["ts"]
+    return newest
+
+
+def main(conn=None, session=None):
+    own_conn = conn is None
+    own_session = session is None
+    conn = conn or get_db_connection()
+    session = session or requests.Session()
+    pages = 0
+    counts = [0, 0, 0]
+    try:
+        ensure_watermark_table(conn)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO air.sources(code,name,base_url,kind)
+                VALUES ('openaq','OpenAQ','https://openaq.org','aggregate')
+                ON CONFLICT (code) DO UPDATE SET
+                    name=EXCLUDED.name,
+                    base_url=EXCLUDED.base_url,
+                    kind=EXCLUDED.kind
+                RETURNING id
+                """
+            )
+            source_id = cur.fetchone()[0]
+            watermarks = load_watermarks(cur, PROVIDER)
+        conn.commit()
+
+        started = datetime.now(timezone.utc)
+        date_from = started - timedelta(hours=BACKFILL_HOURS)
+        resume = watermarks.pop(RESUME_SCOPE, None)
+        if resume is not None:
+            date_from = max(date_from, resume)
+        advanced = {}
+        walk = {}
+        for results in iter_fresh_pages(
+            session, watermarks, date_from, walk
+        ):
+            with conn.cursor() as cur:
+                page_counts = write_page(cur, source_id, results)
+                if page_counts[0] or page_counts[1]:
+                    record_ingest_commit(cur, PROVIDER)
+            conn.commit()
+            counts = [
+                total + count for total, count in zip(counts, page_counts)
+            ]
+            pages += 1
+            advanced = newest_by_location(results, advanced)
+        # The watermarks only move once the walk ends; a failed run
+        # re-reads the same window next time and the upsert absorbs the
+        # pages it already committed.
+        if walk["truncated"]:
+            print(
+                f"OpenAQ warning: stopped after {MAX_PAGES} pages at "
+                f"{walk['newest']}; the next run resumes there, raise "
+                "OPENAQ_MAX_PAGES to catch up sooner",
+                file=sys.stderr,
+            )
+            advanced = cap_watermarks(advanced, walk["newest"])
+            if walk["newest"] is not None:
+                advanced[RESUME_SCOPE] = walk["newest"] - timedelta(
+                    seconds=1
+                )
+        else:
+            # Re-read the last hours for results published late.
+            advanced[RESUME_SCOPE] = started - timedelta(hours=LATE_HOURS)
+        with conn.cursor() as cur:
+            save_watermarks(cur, PROVIDER, advanced)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_session:
+            session.close()
+        if own_conn:
+            conn.close()
+    inserted, updated, unchanged = counts
+    print(
+        f"OpenAQ OK: pages={pages}, inserted={inserted}, "
+        f"updated={updated}, unchanged={unchanged}"
+    )
+    return sum(counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,292 @@
-# --- DB 연결 설정 (Cloud SQL 소켓 방식) ---
-import os, psycopg2
-DBNAME = os.getenv("DBNAME", "hudadak_air")
-DBUSER = os.getenv("DBUSER", "hudadak_admin")
-DBHOST = os.getenv("DBHOST", "/cloudsql/hudadak-air:asia-northeast3:hudadak-2025")
-DBPASS = os.getenv("DBPASS")
-# --- 여기까지 ---
-
-import os, json, requests, psycopg2
+#!/usr/bin/env python3
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-DBHOST,DBNAME,DBUSER,DBPASS=[os.getenv(k) for k in("DBHOST","DBNAME","DBUSER","DBPASS")]
-OWM=os.getenv("OWM_API_KEY"); assert OWM, "Set OWM_API_KEY"
+
+import requests
+from requests.adapters import HTTPAdapter
+from psycopg2.extras import execute_values
+
+from airkorea_common import get_db_connection
+from ingest_common import archive_raw_payloads, record_ingest_commit
+
+
+API_KEY = os.getenv("OWM_API_KEY")
+BASE_URL = "https://api.openweathermap.org/data/2.5/air_pollution"
+MAX_WORKERS = int(os.getenv("OWM_MAX_WORKERS", "8"))
+
+
+def _target(city, lat, lon):
+    return {
+        "name": f"OWM {city}({lat:.4f},{lon:.4f})",
+        "lat": lat,
+        "lon": lon,
+        "city": city,
+        "country": "KR",
+    }
+
+
 TARGETS = [
-    {"name":"OWM Seoul(37.5665,126.9780)","lat":37.5665,"lon":126.9780,"city":"Seoul","country":"KR"},
-    {"name":"OWM Incheon(37.4563,126.7052)","lat":37.4563,"lon":126.7052,"city":"Incheon","country":"KR"},
-    {"name":"OWM Suwon(37.2636,127.0286)","lat":37.2636,"lon":127.0286,"city":"Suwon","country":"KR"},
-    {"name":"OWM Uijeongbu(37.7381,127.0337)","lat":37.7381,"lon":127.0337,"city":"Uijeongbu","country":"KR"},
-    {"name":"OWM Chuncheon(37.8813,127.7298)","lat":37.8813,"lon":127.7298,"city":"Chuncheon","country":"KR"},
-    {"name":"OWM Gangneung(37.7519,128.8761)","lat":37.7519,"lon":128.8761,"city":"Gangneung","country":"KR"},
-    {"name":"OWM Daejeon(36.3504,127.3845)","lat":36.3504,"lon":127.3845,"city":"Daejeon","country":"KR"},
-    {"name":"OWM Cheongju(36.6424,127.4890)","lat":36.6424,"lon":127.4890,"city":"Cheongju","country":"KR"},
-    {"name":"OWM Jeonju(35.8242,127.1479)","lat":35.8242,"lon":127.1479,"city":"Jeonju","country":"KR"},
-    {"name":"OWM Gwangju(35.1595,126.8526)","lat":35.1595,"lon":126.8526,"city":"Gwangju","country":"KR"},
-    {"name":"OWM Daegu(35.8714,128.6014)","lat":35.8714,"lon":128.6014,"city":"Daegu","country":"KR"},
-    {"name":"OWM Ulsan(35.5384,129.3114)","lat":35.5384,"lon":129.3114,"city":"Ulsan","country":"KR"},
-    {"name":"OWM Busan(35.1796,129.0756)","lat":35.1796,"lon":129.0756,"city":"Busan","country":"KR"},
-    {"name":"OWM Pohang(36.0190,129.3435)","lat":36.0190,"lon":129.3435,"city":"Pohang","country":"KR"},
-    {"name":"OWM Gyeongju(35.8562,129.2247)","lat":35.8562,"lon":129.2247,"city":"Gyeongju","country":"KR"},
-    {"name":"OWM Jeju(33.4996,126.5312)","lat":33.4996,"lon":126.5312,"city":"Jeju","country":"KR"}
+    _target("Seoul", 37.5665, 126.9780),
+    _target("Incheon", 37.4563, 126.7052),
+    _target("Suwon", 37.2636, 127.0286),
+    _target("Uijeongbu", 37.7381, 127.0337),
+    _target("Chuncheon", 37.8813, 127.7298),
+    _target("Gangneung", 37.7519, 128.8761),
+    _target("Daejeon", 36.3504, 127.3845),
+    _target("Cheongju", 36.6424, 127.4890),
+    _target("Jeonju", 35.8242, 127.1479),
+    _target("Gwangju", 35.1595, 126.8526),
+    _target("Daegu", 35.8714, 128.6014),
+    _target("Ulsan", 35.5384, 129.3114),
+    _target("Busan", 35.1796, 129.0756),
+    _target("Pohang", 36.0190, 129.3435),
+    _target("Gyeongju", 35.8562, 129.2247),
+    _target("Jeju", 33.4996, 126.5312),
 ]
-BASE="https://api.openweathermap.org/data/2.5/air_pollution"
-def upsert_source_and_station(c,t):
-    c.execute("""INSERT INTO air.sources(code,name,base_url,kind)
-                 VALUES ('owm','OpenWeatherMap Air Pollution','https://openweathermap.org/api/air-pollution','model')
-                 ON CONFLICT (code) DO UPDATE SET name=EXCLUDED.name, base_url=EXCLUDED.base_url, kind=EXCLUDED.kind""")
-    c.execute("""INSERT INTO air.stations(external_code,name,provider,kind,city,country,lat,lon,source_id,grid_res_km)
-                 VALUES (%s,%s,'OWM','grid_point',%s,%s,%s,%s,(SELECT id FROM air.sources WHERE code='owm'),5)
-                 ON CONFLICT (provider, external_code) DO NOTHING""",
-              (f"OWM_{t['lat']}_{t['lon']}", t["name"], t.get("city"), t.get("country"), t["lat"], t["lon"]))
-    c.execute("SELECT id FROM air.stations WHERE provider='OWM' AND name=%s",(t["name"],)); return c.fetchone()[0]
-def upsert_measure(c,sid,ts,pm10,pm25,raw):
-    c.execute("""INSERT INTO air.measurements(station_id,ts,pm10,pm25,raw,source_id,source_quality,unit_pm10,unit_pm25,aqi_provider)
-                 VALUES (%s,%s,%s,%s,%s::jsonb,(SELECT id FROM air.sources WHERE code='owm'),'model','µg/m³','µg/m³','OWM')
-                 ON CONFLICT (station_id,ts) DO UPDATE SET pm10=EXCLUDED.pm10, pm25=EXCLUDED.pm25, raw=EXCLUDED.raw, source_id=EXCLUDED.source_id""",
-              (sid, ts, pm10, pm25, json.dumps(raw, ensure_ascii=False)))
-def entries(j):
-    for it in j.get("list", []):
-        dt=datetime.fromtimestamp(it["dt"], tz=timezone.utc).replace(tzinfo=None)
-        comp=it.get("components",{}); yield dt, comp.get("pm10"), comp.get("pm2_5"), it
-def fetch_and_ingest(t):
-    cur=requests.get(BASE, params={"lat":t["lat"],"lon":t["lon"],"appid":OWM}, timeout=20).json()
-    try: fc=requests.get(BASE+"/forecast", params={"lat":t["lat"],"lon":t["lon"],"appid":OWM}, timeout=20).json()
-    except Exception: fc={"list":[]}
-    conn=psycopg2.connect(host=DBHOST,dbname=DBNAME,user=DBUSER,password=DBPASS); c=conn.cursor()
-    sid=upsert_source_and_station(c,t)
-    for ts,pm10,pm25,raw in entries(cur): upsert_measure(c,sid,ts,pm10,pm25,raw)
-    for ts,pm10,pm25,raw in entries(fc):  upsert_measure(c,sid,ts,pm10,pm25,raw)
-    conn.commit(); c.close(); conn.close()
-def main():
-    for t in TARGETS: fetch_and_ingest(t)
-    print("OWM OK")
-if __name__=="__main__": main()
+
+
+def station_external_code(target):
+    return f"OWM_{target['lat']}_{target['lon']}"
+
+
+def create_session(pool_size=MAX_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_target(session, target):
+    """Fetch the current and forecast payloads for one grid point."""
+    params = {"lat": target["lat"], "lon": target["lon"], "appid": API_KEY}
+    response = session.get(BASE_URL, params=params, timeout=20)
+    response.raise_for_status()
+    current = response.json()
+    try:
+        response = session.get(
+            f"{BASE_URL}/forecast", params=params, timeout=20
+        )
+        response.raise_for_status()
+        forecast = response.json()
+    except (requests.RequestException, ValueError):
+        forecast = {"list": []}
+    return current, forecast
+
+
+def fetch_all(session, targets):
+    """Fetch every target concurrently; failed targets are reported and
+    dropped so one slow or broken grid point cannot fail the run."""
+
+    def fetch(target):
+        try:
+            return target, fetch_target(session, target)
+        except (requests.RequestException, ValueError) as exc:
+            print(f"OWM warning: {target['name']} failed: {exc}")
+            return target, None
+
+    workers = max(1, min(MAX_WORKERS, len(targets)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [
+            (target, payloads)
+            for target, payloads in executor.map(fetch, targets)
+            if payloads is not None
+        ]
+
+
+def entries(payload):
+    for item in (payload or {}).get("list", []):
+        observed_at = datetime.fromtimestamp(item["dt"], tz=timezone.utc)
+        components = item.get("components") or {}
+        yield (
+            observed_at,
+            components.get("pm10"),
+            components.get("pm2_5"),
+            item,
+        )
+
+
+def measurement_rows(station_id, current, forecast):
+    """Merge current and forecast entries into one row per hour.
+
+    The forecast list usually repeats the current hour; the forecast entry
+    wins, as it did when both were upserted one after the other, and a
+    single statement may not touch the same (station_id, ts) twice.
+    """
+    rows = {}
+    for payload in (current, forecast):
+        for observed_at, pm10, pm25, raw in entries(payload):
+            rows[(station_id, observed_at)] = (
+                station_id,
+                observed_at,
+                pm10,
+                pm25,
+                raw,
+            )
+    return list(rows.values())
+
+
+def upsert_source(cur):
+    cur.execute(
+        """
+        INSERT INTO air.sources(code,name,base_url,kind)
+        VALUES (
+            'owm','OpenWeatherMap Air Pollution',
+            'https://openweathermap.org/api/air-pollution','model'
+        )
+        ON CONFLICT (code) DO UPDATE SET
+            name=EXCLUDED.name,
+            base_url=EXCLUDED.base_url,
+            kind=EXCLUDED.kind
+        RETURNING id
+        """
+    )
+    return cur.fetchone()[0]
+
+
+def upsert_stations(cur, source_id, targets):
+    rows = [
+        (
+            station_external_code(target),
+            target["name"],
+            target.get("city"),
+            target.get("country"),
+            target["lat"],
+            target["lon"],
+            target["lon"],
+            target["lat"],
+            source_id,
+        )
+        for target in targets
+    ]
+    returned = execute_values(
+        cur,
+        """
+        INSERT INTO air.stations(
+            external_code, name, provider, kind, city, country,
+            lat, lon, geom, source_id, grid_res_km
+        )
+        VALUES %s
+        ON CONFLICT (provider, external_code) DO UPDATE SET
+            name=EXCLUDED.name,
+            city=EXCLUDED.city,
+            country=EXCLUDED.country,
+            lat=EXCLUDED.lat,
+            lon=EXCLUDED.lon,
+            geom=EXCLUDED.geom
+        RETURNING external_code, id
+        """,
+        rows,
+        template=(
+            "(%s,%s,'OWM','grid_point',%s,%s,%s,%s,"
+            "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,%s,5)"
+        ),
+        page_size=max(len(rows), 1),
+        fetch=True,
+    )
+    return dict(returned)
+
+
+def upsert_measurements(cur, source_id, rows):
+    """Upsert all rows in one statement and skip hours whose values did
+    not change since the previous run.
+
+    Returns (inserted, updated, unchanged).
+    """
+    if not rows:
+        return 0, 0, 0
+    returned = execute_values(
+        cur,
+        """
+        INSERT INTO air.measurements(
+            station_id, ts, pm10, pm25, raw_id, source_id, source_quality,
+            unit_pm10, unit_pm25, aqi_provider
+        )
+        VALUES %s
+        ON CONFLICT (station_id, ts) DO UPDATE SET
+            pm10=EXCLUDED.pm10,
+            pm25=EXCLUDED.pm25,
+            raw_id=EXCLUDED.raw_id,
+            source_id=EXCLUDED.source_id
+        WHERE (
+            air.measurements.pm10,
+            air.measurements.pm25,
+            air.measurements.raw_id,
+            air.measurements.source_id
+        ) IS DISTINCT FROM (
+            EXCLUDED.pm10,
+            EXCLUDED.pm25,
+            EXCLUDED.raw_id,
+            EXCLUDED.source_id
+        )
+        RETURNING (xmax = 0) AS inserted
+        """,
+        [row + (source_id,) for row in rows],
+        template=(
+            "(%s,%s,%s,%s,%s,%s,'model','µg/m³','µg/m³','OWM')"
+        ),
+        page_size=len(rows),
+        fetch=True,
+    )
+    inserted = sum(1 for (was_inserted,) in returned if was_inserted)
+    updated = len(returned) - inserted
+    return inserted, updated, len(rows) - len(returned)
+
+
+def main(conn=None, session=None):
+    if not API_KEY:
+        raise RuntimeError("OWM_API_KEY is not configured")
+    own_session = session is None
+    session = session or create_session()
+    try:
+        fetched = fetch_all(session, TARGETS)
+    finally:
+        if own_session:
+            session.close()
+    if not fetched:
+        raise RuntimeError("OWM collection failed for all targets")
+
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            source_id = upsert_source(cur)
+            station_ids = upsert_stations(
+                cur, source_id, [target for target, _ in fetched]
+            )
+            rows = []
+            for target, (current, forecast) in fetched:
+                rows.extend(
+                    measurement_rows(
+                        station_ids[station_external_code(target)],
+                        current,
+                        forecast,
+                    )
+                )
+            raw_ids = archive_raw_payloads(
+                cur, "OWM", [row[4] for row in rows]
+            )
+            rows = [
+                row[:4] + (raw_id,) for row, raw_id in zip(rows, raw_ids)
+            ]
+            inserted, updated, unchanged = upsert_measurements(
+                cur, source_id, rows
+            )
+            if inserted or updated:
+                record_ingest_commit(cur, "OWM", station_ids.values())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+    print(
+        f"OWM OK: targets={len(fetched)}, inserted={inserted}, "
+        f"updated={updated}, unchanged={unchanged}"
+    )
+    return len(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
-import json
 import os
 from datetime import datetime, timezone
 
 import psycopg2
 import requests
 
+from ingest_common import (
+    archive_raw_payloads,
+    map_station_regions,
+    record_ingest_commit,
+)
+
 
 DBNAME = os.getenv("DBNAME", "hudadak_air")
 DBUSER = os.getenv("DBUSER", "hudadak_admin")
@@ -37,6 +42,16 @@ TARGETS = [
 ]
 
 
+# forecast and debug.sync change on every poll; archiving them would give
+# each re-fetch of an unchanged observation a new raw_id.
+ARCHIVED_KEYS = ("idx", "aqi", "dominentpol", "city", "iaqi", "time")
+
+
+def archived_payload(data):
+    """The stable part of a WAQI feed, which identifies the observation."""
+    return {key: data[key] for key in ARCHIVED_KEYS if key in data}
+
+
 def parse_waqi_ts(value):
     """Parse the actual observation time with its provider timezone."""
     iso = value.get("iso")
@@ -52,24 +67,24 @@ def parse_waqi_ts(value):
     raise ValueError("WAQI observation time is missing")
 
 
-def ingest_target(conn, target):
-    payload = requests.get(
+def ingest_target(conn, target, session=None):
+    payload = (session or requests).get(
         f"https://api.waqi.info/feed/{target}/?token={TOKEN}", timeout=25
     ).json()
     if payload.get("status") != "ok":
         print("WAQI warning:", target, payload)
-        return 0
+        return None
 
     data = payload["data"]
     station = data.get("city") or {}
     geo = station.get("geo") or []
     if len(geo) < 2:
         print("WAQI warning: station coordinates missing:", target)
-        return 0
+        return None
     station_uid = data.get("idx")
     if station_uid is None:
         print("WAQI warning: station id missing:", target)
-        return 0
+        return None
 
     lat, lon = float(geo[0]), float(geo[1])
     observed_at = parse_waqi_ts(data.get("time") or {})
@@ -78,7 +93,7 @@ def ingest_target(conn, target):
     pm25 = (iaqi.get("pm25") or {}).get("v")
     if pm10 is None and pm25 is None:
         print("WAQI warning: PM values missing:", target)
-        return 0
+        return None
 
     external_code = f"WAQI_{station_uid}"
     station_name = station.get("name") or external_code
@@ -91,6 +106,11 @@ def ingest_target(conn, target):
                 name=EXCLUDED.name,
                 base_url=EXCLUDED.base_url,
                 kind=EXCLUDED.kind
+            WHERE (
+                air.sources.name, air.sources.base_url, air.sources.kind
+            ) IS DISTINCT FROM (
+                EXCLUDED.name, EXCLUDED.base_url, EXCLUDED.kind
+            )
             """
         )
         cur.execute(
@@ -113,6 +133,24 @@ def ingest_target(conn, target):
                 geom=EXCLUDED.geom,
                 kind=EXCLUDED.kind,
                 source_id=EXCLUDED.source_id
+            WHERE (
+                air.stations.name,
+                air.stations.city,
+                air.stations.country,
+                air.stations.lat,
+                air.stations.lon,
+                air.stations.kind,
+                air.stations.source_id
+            ) IS DISTINCT FROM (
+                EXCLUDED.name,
+                EXCLUDED.city,
+                EXCLUDED.country,
+                EXCLUDED.lat,
+                EXCLUDED.lon,
+                EXCLUDED.kind,
+                EXCLUDED.source_id
+            )
+            RETURNING id
             """,
             (
                 external_code,
@@ -124,66 +162,109 @@ def ingest_target(conn, target):
                 lat,
             ),
         )
-        cur.execute(
-            """
-            SELECT id FROM air.stations
-            WHERE provider='WAQI' AND external_code=%s
-            """,
-            (external_code,),
+        written = cur.fetchone()
+        if written:
+            # New or moved stations get their region codes right away so
+            # search mode never has to place them spatially.
+            station_id = written[0]
+            map_station_regions(cur, [station_id])
+        else:
+            cur.execute(
+                """
+                SELECT id FROM air.stations
+                WHERE provider='WAQI' AND external_code=%s
+                """,
+                (external_code,),
+            )
+            station_id = cur.fetchone()[0]
+        (raw_id,) = archive_raw_payloads(
+            cur, "WAQI", [archived_payload(data)]
         )
-        station_id = cur.fetchone()[0]
         cur.execute(
             """
             INSERT INTO air.measurements(
-                station_id, ts, pm10, pm25, raw, source_id, source_quality,
-                unit_pm10, unit_pm25, aqi_provider
+                station_id, ts, pm10, pm25, raw_id, source_id,
+                source_quality, unit_pm10, unit_pm25, aqi_provider
             )
             VALUES (
-                %s,%s,%s,%s,%s::jsonb,
+                %s,%s,%s,%s,%s,
                 (SELECT id FROM air.sources WHERE code='waqi'),
                 'observed','ug/m3','ug/m3','WAQI'
             )
             ON CONFLICT (station_id,ts) DO UPDATE SET
                 pm10=EXCLUDED.pm10,
                 pm25=EXCLUDED.pm25,
-                raw=EXCLUDED.raw,
+                raw_id=EXCLUDED.raw_id,
                 source_quality=EXCLUDED.source_quality,
                 unit_pm10=EXCLUDED.unit_pm10,
                 unit_pm25=EXCLUDED.unit_pm25,
                 aqi_provider=EXCLUDED.aqi_provider
+            WHERE (
+                air.measurements.pm10,
+                air.measurements.pm25,
+                air.measurements.raw_id,
+                air.measurements.source_quality,
+                air.measurements.unit_pm10,
+                air.measurements.unit_pm25,
+                air.measurements.aqi_provider
+            ) IS DISTINCT FROM (
+                EXCLUDED.pm10,
+                EXCLUDED.pm25,
+                EXCLUDED.raw_id,
+                EXCLUDED.source_quality,
+                EXCLUDED.unit_pm10,
+                EXCLUDED.unit_pm25,
+                EXCLUDED.aqi_provider
+            )
+            RETURNING (xmax = 0) AS inserted
             """,
             (
                 station_id,
                 observed_at,
                 pm10,
                 pm25,
-                json.dumps(data),
+                raw_id,
             ),
         )
-    return 1
+        returned = cur.fetchone()
+        if returned is not None:
+            record_ingest_commit(cur, "WAQI", [station_id])
+    if returned is None:
+        return "unchanged"
+    return "inserted" if returned[0] else "updated"
 
 
-def main():
+def main(conn=None, session=None):
     if not TOKEN:
         raise RuntimeError("WAQI_TOKEN is not configured")
-    conn = psycopg2.connect(
-        host=DBHOST, dbname=DBNAME, user=DBUSER, password=DBPASS
-    )
-    inserted = 0
+    own_conn = conn is None
+    if own_conn:
+        conn = psycopg2.connect(
+            host=DBHOST, dbname=DBNAME, user=DBUSER, password=DBPASS
+        )
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
     try:
         for target in TARGETS:
             try:
-                inserted += ingest_target(conn, target)
+                outcome = ingest_target(conn, target, session)
                 conn.commit()
+                if outcome:
+                    counts[outcome] += 1
             except Exception as exc:
                 conn.rollback()
                 print(f"WAQI warning: {target} failed: {exc}")
     finally:
-        conn.close()
-    if inserted == 0:
+        if own_conn:
+            conn.close()
+    # An unchanged hour still proves the feed is alive.
+    observed = sum(counts.values())
+    if observed == 0:
         raise RuntimeError("WAQI inserted no PM observations")
-    print(f"WAQI OK: {inserted} observations")
-    return inserted
+    print(
+        f"WAQI OK: {observed} observations, inserted={counts['inserted']}, "
+        f"updated={counts['updated']}, unchanged={counts['unchanged']}"
+    )
+    return observed
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Local stand-in for the shared cache's Redis server.
+
+Usage: python -m loadtest.fake_redis [--port 6379]
+
+Speaks enough RESP for app/cache.py (PING, AUTH, SELECT, GET, SET with
+EX/PX, DEL, FLUSHALL), so several API workers can share cache hits in a
+load test without a real Redis. Everything lives in one dict.
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+
+class _Store:
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.values.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self.values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self.lock:
+            self.values[key] = (value, expires_at)
+
+    def delete(self, keys):
+        with self.lock:
+            return sum(self.values.pop(key, None) is not None for key in keys)
+
+
+def _read_command(stream):
+    line = stream.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        length = int(stream.readline()[1:])
+        args.append(stream.read(length + 2)[:-2])
+    return args
+
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _set(store, args):
+    ttl = None
+    options = [arg.upper() for arg in args[3:]]
+    if b"EX" in options:
+        ttl = float(args[3 + options.index(b"EX") + 1])
+    if b"PX" in options:
+        ttl = float(args[3 + options.index(b"PX") + 1]) / 1000
+    store.set(args[1], args[2], ttl)
+    return b"+OK\r\n"
+
+
+def _reply(store, args):
+    name = args[0].upper()
+    if name == b"PING":
+        return b"+PONG\r\n"
+    if name in (b"AUTH", b"SELECT"):
+        return b"+OK\r\n"
+    if name == b"GET" and len(args) == 2:
+        return _bulk(store.get(args[1]))
+    if name == b"SET" and len(args) >= 3:
+        return _set(store, args)
+    if name == b"DEL" and len(args) >= 2:
+        return b":%d\r\n" % store.delete(args[1:])
+    if name == b"FLUSHALL":
+        with store.lock:
+            store.values.clear()
+        return b"+OK\r\n"
+    return b"-ERR unknown command '%s'\r\n" % name
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            args = _read_command(self.rfile)
+            if not args:
+                return
+            self.wfile.write(_reply(self.server.store, args))
+            self.wfile.flush()
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.store = _Store()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        """Serve from a daemon thread; returns self for use in tests."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args(argv)
+    with FakeRedisServer(args.host, args.port) as server:
+        print(f"FAKE REDIS OK: {server.url}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
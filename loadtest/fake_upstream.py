@@ -0,0 +1,132 @@
+"""Stand-in for Open-Meteo and Kakao Local used by load tests.
+
+Usage: FAKE_LATENCY_MS=80 FAKE_JITTER_MS=40 FAKE_ERROR_RATE=0.02 \\
+           uvicorn loadtest.fake_upstream:app --port 9100
+
+Point the API at it with
+    OPEN_METEO_AQ_URL=http://127.0.0.1:9100/v1/air-quality
+    OPEN_METEO_FORECAST_URL=http://127.0.0.1:9100/v1/forecast
+    KAKAO_BASE_URL=http://127.0.0.1:9100/v2/local KAKAO_REST_KEY=fake
+
+Responses are deterministic for a coordinate and hour, so repeated runs
+exercise the same cache keys. Each request waits FAKE_LATENCY_MS plus up
+to FAKE_JITTER_MS and fails with FAKE_ERROR_RATE probability (503 for
+Open-Meteo, 429 for Kakao).
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from fastapi import FastAPI, HTTPException, Query
+
+SEOUL_TZ = ZoneInfo("Asia/Seoul")
+FORECAST_DAYS = 5
+SERIES_BASE = {
+    "pm10": 35.0,
+    "pm2_5": 18.0,
+    "ozone": 60.0,
+    "nitrogen_dioxide": 25.0,
+    "sulphur_dioxide": 4.0,
+    "carbon_monoxide": 300.0,
+    "wind_speed_10m": 3.0,
+    "wind_direction_10m": 180.0,
+    "precipitation": 0.2,
+}
+# Kakao fixtures: query → (lon, lat, address, legal dong code).
+PLACES = {
+    "서울 강남구": (127.0473, 37.5172, "서울 강남구", "1168000000"),
+    "수원시 팔달구": (127.0197, 37.2825, "경기 수원시 팔달구", "4111500000"),
+    "부산 해운대구": (129.1634, 35.1631, "부산 해운대구", "2635000000"),
+    "대구 중구": (128.6065, 35.8693, "대구 중구", "2711000000"),
+    "제주시": (126.5312, 33.4996, "제주특별자치도 제주시", "5011000000"),
+}
+
+app = FastAPI(title="Hudadak fake upstream")
+
+
+async def _simulate(error_status):
+    latency = float(os.getenv("FAKE_LATENCY_MS", "50"))
+    jitter = float(os.getenv("FAKE_JITTER_MS", "20"))
+    await asyncio.sleep((latency + random.uniform(0, jitter)) / 1000)
+    if random.random() < float(os.getenv("FAKE_ERROR_RATE", "0")):
+        raise HTTPException(status_code=error_status, detail="injected")
+
+
+def _seed(*parts):
+    digest = hashlib.sha256(repr(parts).encode()).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32
+
+
+def hourly_series(lat, lon, keys, now=None):
+    now = now or datetime.now(SEOUL_TZ)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    times = [
+        start + timedelta(hours=hour) for hour in range(FORECAST_DAYS * 24)
+    ]
+    hourly = {"time": [t.strftime("%Y-%m-%dT%H:%M") for t in times]}
+    for key in keys:
+        base = SERIES_BASE.get(key, 10.0)
+        offset = _seed(round(lat, 2), round(lon, 2), key)
+        hourly[key] = [
+            round(base * (0.6 + 0.8 * _seed(offset, t.day, t.hour)), 1)
+            for t in times
+        ]
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "timezone": "Asia/Seoul",
+        "hourly": hourly,
+    }
+
+
+@app.get("/v1/air-quality")
+async def air_quality(latitude: float, longitude: float, hourly: str = ""):
+    await _simulate(503)
+    keys = [key for key in hourly.split(",") if key]
+    return hourly_series(latitude, longitude, keys)
+
+
+@app.get("/v1/forecast")
+async def forecast(latitude: float, longitude: float, hourly: str = ""):
+    await _simulate(503)
+    keys = [key for key in hourly.split(",") if key]
+    return hourly_series(latitude, longitude, keys)
+
+
+def _document(lon, lat, address, code):
+    return {
+        "address_name": address,
+        "x": str(lon),
+        "y": str(lat),
+        "address": {
+            "address_name": address,
+            "b_code": code,
+            "x": str(lon),
+            "y": str(lat),
+        },
+        "road_address": None,
+    }
+
+
+@app.get("/v2/local/search/address.json")
+async def search_address(query: str = Query(...)):
+    await _simulate(429)
+    compact = "".join(query.split())
+    for name, place in PLACES.items():
+        if "".join(name.split()) in compact:
+            return {"documents": [_document(*place)]}
+    return {"documents": []}
+
+
+@app.get("/v2/local/geo/coord2address.json")
+async def coord_to_address(x: float, y: float):
+    await _simulate(429)
+    nearest = min(
+        PLACES.values(),
+        key=lambda place: (place[0] - x) ** 2 + (place[1] - y) ** 2,
+    )
+    return {"documents": [_document(x, y, nearest[2], nearest[3])]}
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Replay a realistic request mix against the API at a fixed rate.
+
+Usage: python -m loadtest.run_load --base-url http://127.0.0.1:8080
+           [--rps 50] [--duration 60] [--max-in-flight 500] [--json PATH]
+       python -m loadtest.run_load --in-process ...
+
+The schedule is open-loop: request i is due at start + i / rps whatever
+earlier requests are doing, and latency is measured from that due time,
+so a stalled server shows up as queueing delay instead of a silently
+lower request rate. --in-process drives app/main.py through
+httpx.ASGITransport with no server; run it with the same environment as
+the real API (a seeded local database from seed_local_db.py and the
+upstream URLs pointed at fake_upstream.py).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+# Points people actually look up: city centres with a little jitter.
+CITY_POINTS = (
+    (37.5665, 126.9780),
+    (37.4979, 127.0276),
+    (37.2636, 127.0286),
+    (37.4563, 126.7052),
+    (35.1796, 129.0756),
+    (35.8714, 128.6014),
+    (36.3504, 127.3845),
+    (35.1595, 126.8526),
+    (33.4996, 126.5312),
+)
+SIDO_CODES = ("11", "26", "27", "28", "29", "30", "41", "50")
+ADDRESS_QUERIES = (
+    "서울 강남구",
+    "수원시 팔달구",
+    "부산 해운대구",
+    "대구 중구",
+    "제주시",
+)
+
+
+@dataclass(frozen=True)
+class RequestSpec:
+    name: str
+    weight: int
+    build: Callable
+
+
+def _point(rng):
+    lat, lon = rng.choice(CITY_POINTS)
+    return (
+        round(lat + rng.uniform(-0.05, 0.05), 4),
+        round(lon + rng.uniform(-0.05, 0.05), 4),
+    )
+
+
+def _nearest(source, lookup_mode="current", region_level=None):
+    def build(rng):
+        lat, lon = _point(rng)
+        params = {"lat": lat, "lon": lon, "source": source}
+        if lookup_mode == "search":
+            sido_code = rng.choice(SIDO_CODES)
+            params.update(
+                lookup_mode="search",
+                region_level=region_level,
+                region_code=(
+                    sido_code
+                    if region_level == "sido"
+                    else f"{sido_code}{110 + rng.randrange(5) * 10}"
+                ),
+            )
+        return "/nearest", params
+
+    return build
+
+
+def _forecast(horizon):
+    def build(rng):
+        lat, lon = _point(rng)
+        return "/forecast", {"lat": lat, "lon": lon, "horizon": horizon}
+
+    return build
+
+
+def _address(rng):
+    return "/geo/address", {"q": rng.choice(ADDRESS_QUERIES)}
+
+
+def _reverse(rng):
+    lat, lon = _point(rng)
+    return "/geo/reverse", {"lat": lat, "lon": lon}
+
+
+# Weights follow the app's traffic: widgets poll source=db, the app
+# screen uses auto, and search/forecast/geo calls follow user actions.
+DEFAULT_MIX = (
+    RequestSpec("nearest current db", 30, _nearest("db")),
+    RequestSpec("nearest current auto", 20, _nearest("auto")),
+    RequestSpec("nearest current model", 5, _nearest("model")),
+    RequestSpec("nearest search sido", 8, _nearest("auto", "search", "sido")),
+    RequestSpec(
+        "nearest search sigungu", 7, _nearest("db", "search", "sigungu")
+    ),
+    RequestSpec("forecast 24h", 12, _forecast(24)),
+    RequestSpec("forecast 72h", 6, _forecast(72)),
+    RequestSpec("geo address", 6, _address),
+    RequestSpec("geo reverse", 6, _reverse),
+)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.dropped = Counter()
+
+    def record(self, name, status, seconds):
+        self.latencies[name].append(seconds)
+        self.statuses[name][status] += 1
+
+    def summary(self, elapsed):
+        rows = []
+        for name in sorted(set(self.latencies) | set(self.dropped)):
+            values = sorted(self.latencies[name])
+            statuses = self.statuses[name]
+            ok = sum(n for code, n in statuses.items() if 200 <= code < 300)
+            errors = sum(
+                n for code, n in statuses.items() if not 200 <= code < 500
+            )
+            rows.append(
+                {
+                    "endpoint": name,
+                    "requests": len(values),
+                    "ok": ok,
+                    "client_4xx": len(values) - ok - errors,
+                    "errors": errors,
+                    "dropped": self.dropped[name],
+                    "throughput_rps": round(len(values) / elapsed, 2),
+                    "p50_ms": _ms(percentile(values, 0.50)),
+                    "p95_ms": _ms(percentile(values, 0.95)),
+                    "p99_ms": _ms(percentile(values, 0.99)),
+                    "max_ms": _ms(values[-1] if values else None),
+                    "statuses": dict(sorted(statuses.items())),
+                }
+            )
+        return rows
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+async def _send(client, spec, path, params, due, results, in_flight):
+    try:
+        response = await client.get(path, params=params)
+        status = response.status_code
+    except httpx.HTTPError:
+        # Transport failures count as errors with a pseudo status of 0.
+        status = 0
+    finally:
+        in_flight.release()
+    results.record(spec.name, status, time.perf_counter() - due)
+
+
+async def run_load(
+    client, rps, duration, mix=DEFAULT_MIX, rng=None, max_in_flight=500
+):
+    """Drive `client` for `duration` seconds; returns (results, elapsed)."""
+    rng = rng or random.Random()
+    weights = [spec.weight for spec in mix]
+    results = Results()
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks = []
+    started = time.perf_counter()
+    for index in range(int(rps * duration)):
+        due = started + index / rps
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        spec = rng.choices(mix, weights=weights)[0]
+        path, params = spec.build(rng)
+        # Past the in-flight cap the client itself is the bottleneck, so
+        # the request is counted as dropped instead of silently delayed.
+        if in_flight.locked():
+            results.dropped[spec.name] += 1
+            continue
+        await in_flight.acquire()
+        tasks.append(
+            asyncio.create_task(
+                _send(client, spec, path, params, due, results, in_flight)
+            )
+        )
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - started
+
+
+def format_table(rows):
+    header = (
+        f"{'endpoint':<24}{'req':>7}{'err':>6}{'drop':>6}{'rps':>8}"
+        f"{'p50':>9}{'p95':>9}{'p99':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['endpoint']:<24}{row['requests']:>7}{row['errors']:>6}"
+            f"{row['dropped']:>6}{row['throughput_rps']:>8}"
+            f"{row['p50_ms'] or '-':>9}{row['p95_ms'] or '-':>9}"
+            f"{row['p99_ms'] or '-':>9}"
+        )
+    return "\n".join(lines)
+
+
+def _in_process_client():
+    sys.path.insert(0, str(ROOT_DIR / "app"))
+    import main
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=main.app),
+        base_url="http://loadtest",
+        timeout=30.0,
+    )
+
+
+async def _main(args):
+    if args.in_process:
+        client = _in_process_client()
+    else:
+        client = httpx.AsyncClient(
+            base_url=args.base_url,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=args.max_in_flight),
+        )
+    async with client:
+        results, elapsed = await run_load(
+            client,
+            args.rps,
+            args.duration,
+            rng=random.Random(args.seed),
+            max_in_flight=args.max_in_flight,
+        )
+    rows = results.summary(elapsed)
+    print(format_table(rows))
+    total = sum(row["requests"] for row in rows)
+    print(f"LOADTEST OK: requests={total}, seconds={elapsed:.1f}")
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps(
+                {"rps": args.rps, "duration": args.duration, "rows": rows},
+                ensure_ascii=False,
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8080")
+    parser.add_argument("--in-process", action="store_true")
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the summary rows here")
+    asyncio.run(_main(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Seed a local PostGIS with synthetic stations and recent measurements.
+
+Usage: python -m loadtest.seed_local_db [--stations N] [--hours N]
+
+Reads DBHOST/DBNAME/DBUSER/DBPASS like the API, for example against
+    docker run -e POSTGRES_PASSWORD=pw -p 5432:5432 postgis/postgis
+Never point it at the production database: it creates the minimal base
+tables the API reads, applies migrations/, then replaces every
+LOADTEST_* station and its measurements. Run rollup_measurements.py
+afterwards to fill the /history rollups.
+"""
+
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "app"))
+
+import db  # noqa: E402
+
+MIGRATIONS_DIR = ROOT_DIR / "migrations"
+PROVIDER = "LOADTEST"
+# sido code → (name, lat, lon) centres the synthetic stations scatter around.
+SIDO_CENTRES = {
+    "11": ("서울특별시", 37.5665, 126.9780),
+    "26": ("부산광역시", 35.1796, 129.0756),
+    "27": ("대구광역시", 35.8714, 128.6014),
+    "28": ("인천광역시", 37.4563, 126.7052),
+    "29": ("광주광역시", 35.1595, 126.8526),
+    "30": ("대전광역시", 36.3504, 127.3845),
+    "41": ("경기도", 37.2750, 127.0095),
+    "50": ("제주특별자치도", 33.4996, 126.5312),
+}
+SIGUNGU_PER_SIDO = 5
+
+BASE_SCHEMA = """
+    CREATE EXTENSION IF NOT EXISTS postgis;
+    CREATE SCHEMA IF NOT EXISTS air;
+    CREATE TABLE IF NOT EXISTS air.sources (
+        id serial PRIMARY KEY,
+        code text UNIQUE NOT NULL,
+        name text,
+        base_url text,
+        kind text
+    );
+    CREATE TABLE IF NOT EXISTS air.stations (
+        id serial PRIMARY KEY,
+        code text UNIQUE,
+        name text NOT NULL,
+        provider text NOT NULL,
+        kind text,
+        lat double precision,
+        lon double precision,
+        geom geography(Point, 4326)
+    );
+    CREATE INDEX IF NOT EXISTS stations_geom_gix
+        ON air.stations USING GIST (geom);
+    CREATE TABLE IF NOT EXISTS air.measurements (
+        station_id integer NOT NULL REFERENCES air.stations(id),
+        ts timestamptz NOT NULL,
+        pm10 double precision,
+        pm25 double precision,
+        o3 double precision,
+        no2 double precision,
+        so2 double precision,
+        co double precision,
+        pm10_grade integer,
+        pm25_grade integer,
+        unit_pm10 text,
+        unit_pm25 text,
+        source_id integer,
+        source_quality text,
+        aqi_provider text,
+        raw jsonb,
+        PRIMARY KEY (station_id, ts)
+    );
+    CREATE TABLE IF NOT EXISTS air.fires (
+        satellite text,
+        detected_at timestamptz,
+        lat double precision,
+        lon double precision
+    );
+"""
+
+
+def apply_schema(conn):
+    with conn.cursor() as cur:
+        cur.execute(BASE_SCHEMA)
+    conn.commit()
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        with conn.cursor() as cur:
+            cur.execute(path.read_text(encoding="utf-8"))
+        conn.commit()
+        print(f"MIGRATION OK: {path.name}")
+
+
+def synthetic_stations(count, rng):
+    codes = sorted(SIDO_CENTRES)
+    stations = []
+    for index in range(count):
+        sido_code = codes[index % len(codes)]
+        name, lat, lon = SIDO_CENTRES[sido_code]
+        sigungu = rng.randrange(SIGUNGU_PER_SIDO)
+        stations.append(
+            (
+                f"{PROVIDER}_{index:05d}",
+                f"{name} 부하시험 {index}",
+                PROVIDER,
+                "station",
+                round(lat + rng.uniform(-0.25, 0.25), 5),
+                round(lon + rng.uniform(-0.25, 0.25), 5),
+                sido_code,
+                f"{sido_code}{110 + sigungu * 10}",
+            )
+        )
+    return stations
+
+
+def seed(conn, station_count, hours, rng):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM air.measurements m
+            USING air.stations s
+            WHERE s.id = m.station_id AND s.provider = %s
+            """,
+            (PROVIDER,),
+        )
+        cur.execute(
+            "DELETE FROM air.stations WHERE provider = %s", (PROVIDER,)
+        )
+        station_ids = execute_values(
+            cur,
+            """
+            INSERT INTO air.stations(
+                code, name, provider, kind, lat, lon, geom,
+                sido_code, sigungu_code
+            )
+            SELECT
+                v.code, v.name, v.provider, v.kind, v.lat, v.lon,
+                ST_SetSRID(ST_MakePoint(v.lon, v.lat), 4326)::geography,
+                v.sido_code, v.sigungu_code
+            FROM (VALUES %s) AS v(
+                code, name, provider, kind, lat, lon, sido_code, sigungu_code
+            )
+            RETURNING id
+            """,
+            synthetic_stations(station_count, rng),
+            page_size=1000,
+            fetch=True,
+        )
+        now = datetime.now(timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        )
+        rows = []
+        for (station_id,) in station_ids:
+            with_gases = rng.random() < 0.5
+            for hour in range(hours):
+                gases = (
+                    (
+                        round(rng.uniform(0.01, 0.09), 3),
+                        round(rng.uniform(0.005, 0.05), 3),
+                        round(rng.uniform(0.001, 0.006), 4),
+                        round(rng.uniform(0.2, 0.9), 2),
+                    )
+                    if with_gases
+                    else (None, None, None, None)
+                )
+                rows.append(
+                    (
+                        station_id,
+                        now - timedelta(hours=hour),
+                        round(rng.uniform(10, 120), 1),
+                        round(rng.uniform(5, 70), 1),
+                        *gases,
+                        "µg/m³",
+                        "µg/m³",
+                        "observed",
+                    )
+                )
+        execute_values(
+            cur,
+            """
+            INSERT INTO air.measurements(
+                station_id, ts, pm10, pm25, o3, no2, so2, co,
+                unit_pm10, unit_pm25, source_quality
+            )
+            VALUES %s
+            """,
+            rows,
+            page_size=5000,
+        )
+    conn.commit()
+    return len(station_ids), len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=600)
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    kwargs = db.connection_kwargs()
+    if kwargs is None:
+        raise SystemExit("SEED FAILED: set DBHOST, DBNAME, DBUSER, DBPASS")
+    conn = psycopg2.connect(**kwargs)
+    try:
+        apply_schema(conn)
+        stations, rows = seed(
+            conn, args.stations, args.hours, random.Random(args.seed)
+        )
+    finally:
+        conn.close()
+    print(f"SEED OK: stations={stations}, measurements={rows}")
+
+
+if __name__ == "__main__":
+    main()
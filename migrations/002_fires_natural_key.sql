@@ -0,0 +1,23 @@
+BEGIN;
+
+-- Earlier runs appended every feed row, so collapse repeated detections
+-- before the natural key can be enforced.
+DELETE FROM air.fires
+WHERE ctid IN (
+    SELECT ctid
+    FROM (
+        SELECT
+            ctid,
+            ROW_NUMBER() OVER (
+                PARTITION BY satellite, detected_at, lat, lon
+                ORDER BY ctid
+            ) AS rank
+        FROM air.fires
+    ) ranked
+    WHERE rank > 1
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS fires_natural_key_uidx
+    ON air.fires(satellite, detected_at, lat, lon);
+
+COMMIT;
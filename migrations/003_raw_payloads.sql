@@ -0,0 +1,25 @@
+BEGIN;
+
+-- Provider payloads live outside the hot measurements rows, stored once
+-- per distinct content and referenced by id.
+CREATE TABLE IF NOT EXISTS air.raw_payloads (
+    id bigserial PRIMARY KEY,
+    content_hash bytea NOT NULL UNIQUE,
+    provider text NOT NULL,
+    payload jsonb NOT NULL,
+    first_seen_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_seen_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- lz4 requires PostgreSQL 14 or later.
+ALTER TABLE air.raw_payloads ALTER COLUMN payload SET COMPRESSION lz4;
+ALTER TABLE air.raw_payloads SET (toast_tuple_target = 128);
+
+CREATE INDEX IF NOT EXISTS raw_payloads_last_seen_idx
+    ON air.raw_payloads(last_seen_at);
+
+-- No foreign key: payload retention is independent of measurement
+-- retention, and readers LEFT JOIN the archive.
+ALTER TABLE air.measurements ADD COLUMN IF NOT EXISTS raw_id bigint;
+
+COMMIT;
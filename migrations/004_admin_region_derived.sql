@@ -0,0 +1,18 @@
+BEGIN;
+
+-- Derived geometry attributes are computed once when a boundary is written
+-- instead of on every lookup that ranks overlapping polygons.
+ALTER TABLE air.admin_regions
+    ADD COLUMN IF NOT EXISTS area double precision
+        GENERATED ALWAYS AS (ST_Area(geom)) STORED,
+    ADD COLUMN IF NOT EXISTS bbox geometry(Polygon, 4326)
+        GENERATED ALWAYS AS (ST_Envelope(geom)) STORED,
+    ADD COLUMN IF NOT EXISTS geom_simplified geometry(MultiPolygon, 4326)
+        GENERATED ALWAYS AS (
+            ST_Multi(ST_SimplifyPreserveTopology(geom, 0.0005))
+        ) STORED;
+
+CREATE INDEX IF NOT EXISTS admin_regions_level_area_idx
+    ON air.admin_regions(level, area);
+
+COMMIT;
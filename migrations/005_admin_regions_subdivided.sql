@@ -0,0 +1,31 @@
+BEGIN;
+
+-- Unioned sigungu and sido polygons carry thousands of vertices. Containment
+-- checks run against these small pieces instead, each with a tight bbox;
+-- benchmark_region_lookup.py compares both forms on a loaded database.
+CREATE TABLE IF NOT EXISTS air.admin_regions_subdivided (
+    code text NOT NULL
+        REFERENCES air.admin_regions(code) ON DELETE CASCADE,
+    level text NOT NULL,
+    geom geometry(Polygon, 4326) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS admin_regions_subdivided_geom_gix
+    ON air.admin_regions_subdivided USING GIST (geom);
+CREATE INDEX IF NOT EXISTS admin_regions_subdivided_code_idx
+    ON air.admin_regions_subdivided(code, level);
+
+-- sync_admin_boundaries.py rebuilds the pieces on every import; this
+-- backfills boundaries imported before the table existed.
+INSERT INTO air.admin_regions_subdivided(code, level, geom)
+SELECT r.code, r.level, piece.geom
+FROM air.admin_regions r
+CROSS JOIN LATERAL ST_Subdivide(r.geom, 256) AS piece(geom)
+WHERE NOT EXISTS (
+    SELECT 1 FROM air.admin_regions_subdivided existing
+    WHERE existing.code=r.code
+);
+
+ANALYZE air.admin_regions_subdivided;
+
+COMMIT;
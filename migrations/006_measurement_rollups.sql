@@ -0,0 +1,72 @@
+BEGIN;
+
+-- Per-station aggregates that outlive raw measurement retention. Means are
+-- sum / count so hourly buckets roll up into days exactly.
+CREATE TABLE IF NOT EXISTS air.measurements_hourly (
+    station_id bigint NOT NULL,
+    bucket timestamptz NOT NULL,
+    pm10_min double precision,
+    pm10_sum double precision,
+    pm10_count integer NOT NULL DEFAULT 0,
+    pm10_max double precision,
+    pm25_min double precision,
+    pm25_sum double precision,
+    pm25_count integer NOT NULL DEFAULT 0,
+    pm25_max double precision,
+    o3_min double precision,
+    o3_sum double precision,
+    o3_count integer NOT NULL DEFAULT 0,
+    o3_max double precision,
+    no2_min double precision,
+    no2_sum double precision,
+    no2_count integer NOT NULL DEFAULT 0,
+    no2_max double precision,
+    so2_min double precision,
+    so2_sum double precision,
+    so2_count integer NOT NULL DEFAULT 0,
+    so2_max double precision,
+    co_min double precision,
+    co_sum double precision,
+    co_count integer NOT NULL DEFAULT 0,
+    co_max double precision,
+    refreshed_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (station_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS air.measurements_daily (
+    station_id bigint NOT NULL,
+    day date NOT NULL,
+    pm10_min double precision,
+    pm10_sum double precision,
+    pm10_count integer NOT NULL DEFAULT 0,
+    pm10_max double precision,
+    pm25_min double precision,
+    pm25_sum double precision,
+    pm25_count integer NOT NULL DEFAULT 0,
+    pm25_max double precision,
+    o3_min double precision,
+    o3_sum double precision,
+    o3_count integer NOT NULL DEFAULT 0,
+    o3_max double precision,
+    no2_min double precision,
+    no2_sum double precision,
+    no2_count integer NOT NULL DEFAULT 0,
+    no2_max double precision,
+    so2_min double precision,
+    so2_sum double precision,
+    so2_count integer NOT NULL DEFAULT 0,
+    so2_max double precision,
+    co_min double precision,
+    co_sum double precision,
+    co_count integer NOT NULL DEFAULT 0,
+    co_max double precision,
+    refreshed_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (station_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS measurements_hourly_bucket_idx
+    ON air.measurements_hourly(bucket);
+CREATE INDEX IF NOT EXISTS measurements_daily_day_idx
+    ON air.measurements_daily(day);
+
+COMMIT;
@@ -0,0 +1,12 @@
+BEGIN;
+
+-- One row per provider whose version increases in the same transaction
+-- as every ingest that changed measurements. API caches derived from
+-- current observations (map tiles and the like) key on these versions.
+CREATE TABLE IF NOT EXISTS air.ingest_commits (
+    provider text PRIMARY KEY,
+    version bigint NOT NULL DEFAULT 1,
+    committed_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMIT;
@@ -0,0 +1,15 @@
+BEGIN;
+
+-- Precomputed current-mode /nearest selections on a grid over Korea,
+-- written by build_selection_raster.py after each ingestion run. The
+-- payload is only trusted by the API while data_version still equals
+-- SUM(air.ingest_commits.version) and valid_until has not passed.
+CREATE TABLE IF NOT EXISTS air.selection_rasters (
+    name text PRIMARY KEY,
+    data_version bigint NOT NULL,
+    built_at timestamptz NOT NULL,
+    valid_until timestamptz NOT NULL,
+    payload bytea NOT NULL
+);
+
+COMMIT;
@@ -0,0 +1,24 @@
+BEGIN;
+
+-- Current PM per sido and sigungu for /regions/summary, kept up to date by
+-- refresh_region_summaries.py after each ingestion run. Values aggregate
+-- each station's latest observation from the last 3 hours.
+CREATE TABLE IF NOT EXISTS air.region_summaries (
+    level text NOT NULL CHECK (level IN ('sido', 'sigungu')),
+    region_code text NOT NULL,
+    region_name text NOT NULL,
+    parent_code text,
+    pm10_avg double precision,
+    pm10_max double precision,
+    pm10_stations integer NOT NULL DEFAULT 0,
+    pm25_avg double precision,
+    pm25_max double precision,
+    pm25_stations integer NOT NULL DEFAULT 0,
+    newest_ts timestamptz,
+    oldest_ts timestamptz,
+    data_version bigint NOT NULL,
+    refreshed_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (level, region_code)
+);
+
+COMMIT;
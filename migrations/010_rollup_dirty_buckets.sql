@@ -0,0 +1,43 @@
+BEGIN;
+
+-- Station hours whose raw rows changed since rollup_measurements.py last
+-- aggregated them, marked by trigger from every ingester's writes. Rows
+-- arriving late with an old ts are found by when they were written, not
+-- by their observation time, and retention keeps raw rows of a marked
+-- hour until the rollup has claimed it.
+CREATE TABLE IF NOT EXISTS air.rollup_dirty_buckets (
+    station_id bigint NOT NULL,
+    bucket timestamptz NOT NULL,
+    marked_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (station_id, bucket)
+);
+
+-- Updating an existing mark locks it until the writer commits, and the
+-- rollup skips locked marks, so it never claims a mark whose rows it
+-- cannot see yet.
+CREATE OR REPLACE FUNCTION air.mark_rollup_dirty() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO air.rollup_dirty_buckets(station_id, bucket)
+    SELECT DISTINCT station_id, date_trunc('hour', ts)
+    FROM changed_rows
+    ON CONFLICT (station_id, bucket) DO UPDATE SET
+        marked_at=CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$;
+
+-- Transition tables allow one event per trigger.
+DROP TRIGGER IF EXISTS measurements_rollup_dirty_insert ON air.measurements;
+CREATE TRIGGER measurements_rollup_dirty_insert
+    AFTER INSERT ON air.measurements
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION air.mark_rollup_dirty();
+
+DROP TRIGGER IF EXISTS measurements_rollup_dirty_update ON air.measurements;
+CREATE TRIGGER measurements_rollup_dirty_update
+    AFTER UPDATE ON air.measurements
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION air.mark_rollup_dirty();
+
+COMMIT;
@@ -0,0 +1,16 @@
+BEGIN;
+
+-- Regions a station has left or joined since refresh_region_summaries.py
+-- last recomputed them, marked by ingest_common.map_station_regions in
+-- the transaction that changes the station's codes. The old region has
+-- no new hourly rows to be found by, so the refresh claims these marks
+-- as well. Marks locked by a remap still in flight are skipped, as in
+-- air.rollup_dirty_buckets.
+CREATE TABLE IF NOT EXISTS air.region_summary_dirty (
+    sido_code text NOT NULL,
+    sigungu_code text NOT NULL,
+    marked_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (sido_code, sigungu_code)
+);
+
+COMMIT;
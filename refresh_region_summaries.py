@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Refresh air.region_summaries, the current PM per sido and sigungu.
+
+Usage: python refresh_region_summaries.py [--full]
+
+A region's values aggregate the latest observed pm10 and pm25 of each of
+its stations from the last 3 hours, the window /nearest uses. Stations
+are placed by their precomputed sido_code and sigungu_code; a composite
+city such as 41110 (수원시) covers the gu codes of its children.
+
+Runs are incremental. Only regions holding a station whose hourly rollup
+changed since the REGION_SUMMARY watermark, or whose observations may
+have left the 3-hour window since then, are recomputed, so this runs
+after rollup_measurements.py. Regions a station moved out of or into,
+marked in air.region_summary_dirty, are recomputed as well. The first run, and --full, recompute every
+region and drop regions no longer in air.admin_regions.
+"""
+
+import argparse
+import time
+
+from airkorea_common import get_db_connection
+from ingest_common import (
+    ensure_watermark_table,
+    load_watermarks,
+    notify_change,
+    save_watermarks,
+)
+
+
+PROVIDER = "REGION_SUMMARY"
+SCOPE = "current"
+
+REFRESH_SQL = """
+    WITH dirty AS (
+        -- Regions stations have moved out of or into; marks locked by a
+        -- remap still in flight stay for the next run.
+        DELETE FROM air.region_summary_dirty d
+        USING (
+            SELECT sido_code, sigungu_code
+            FROM air.region_summary_dirty
+            FOR UPDATE SKIP LOCKED
+        ) ready
+        WHERE d.sido_code = ready.sido_code
+          AND d.sigungu_code = ready.sigungu_code
+        RETURNING d.sido_code, d.sigungu_code
+    ),
+    affected AS (
+        SELECT sido_code, sigungu_code FROM dirty
+        UNION
+        SELECT s.sido_code, s.sigungu_code
+        FROM air.measurements_hourly h
+        JOIN air.stations s ON s.id = h.station_id
+        WHERE NOT %(full)s
+          AND (
+              (h.refreshed_at > %(since)s
+               AND h.bucket >= %(now)s - INTERVAL '4 hours')
+              -- Observations that may have left the window since the last
+              -- run change their station's regions too.
+              OR (h.bucket >= %(since)s - INTERVAL '4 hours'
+                  AND h.bucket < %(now)s - INTERVAL '3 hours')
+          )
+    ),
+    regions AS (
+        SELECT r.level, r.code, r.name, r.parent_code
+        FROM air.admin_regions r
+        WHERE %(full)s
+           OR (r.level = 'sido'
+               AND r.code IN (SELECT sido_code FROM affected))
+           OR (r.level = 'sigungu'
+               AND (r.code IN (SELECT sigungu_code FROM affected)
+                    OR r.code IN (
+                        SELECT left(sigungu_code, 4) || '0' FROM affected
+                    )))
+    ),
+    current AS (
+        SELECT
+            s.sido_code,
+            s.sigungu_code,
+            pm10.value AS pm10,
+            pm10.ts AS pm10_ts,
+            pm25.value AS pm25,
+            pm25.ts AS pm25_ts
+        FROM air.stations s
+        LEFT JOIN LATERAL (
+            SELECT m.pm10 AS value, m.ts
+            FROM air.measurements m
+            WHERE m.station_id = s.id
+              AND m.ts <= %(now)s
+              AND m.ts >= %(now)s - INTERVAL '3 hours'
+              AND m.source_quality = 'observed'
+              AND m.pm10 IS NOT NULL
+            ORDER BY m.ts DESC
+            LIMIT 1
+        ) pm10 ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT m.pm25 AS value, m.ts
+            FROM air.measurements m
+            WHERE m.station_id = s.id
+              AND m.ts <= %(now)s
+              AND m.ts >= %(now)s - INTERVAL '3 hours'
+              AND m.source_quality = 'observed'
+              AND m.pm25 IS NOT NULL
+            ORDER BY m.ts DESC
+            LIMIT 1
+        ) pm25 ON TRUE
+        WHERE (pm10.value IS NOT NULL OR pm25.value IS NOT NULL)
+          AND (%(full)s OR s.sido_code IN (SELECT sido_code FROM affected))
+    )
+    INSERT INTO air.region_summaries(
+        level, region_code, region_name, parent_code,
+        pm10_avg, pm10_max, pm10_stations,
+        pm25_avg, pm25_max, pm25_stations,
+        newest_ts, oldest_ts, data_version, refreshed_at
+    )
+    SELECT
+        r.level,
+        r.code,
+        r.name,
+        r.parent_code,
+        ROUND(AVG(c.pm10)::numeric, 1)::double precision,
+        MAX(c.pm10),
+        COUNT(c.pm10),
+        ROUND(AVG(c.pm25)::numeric, 1)::double precision,
+        MAX(c.pm25),
+        COUNT(c.pm25),
+        MAX(GREATEST(c.pm10_ts, c.pm25_ts)),
+        MIN(LEAST(c.pm10_ts, c.pm25_ts)),
+        %(data_version)s,
+        CURRENT_TIMESTAMP
+    FROM regions r
+    LEFT JOIN current c
+      ON (r.level = 'sido' AND c.sido_code = r.code)
+      OR (r.level = 'sigungu'
+          AND c.sigungu_code BETWEEN r.code AND CASE
+              WHEN r.code LIKE '%%0' THEN left(r.code, 4) || '9'
+              ELSE r.code
+          END)
+    GROUP BY r.level, r.code, r.name, r.parent_code
+    ON CONFLICT (level, region_code) DO UPDATE SET
+        region_name=EXCLUDED.region_name,
+        parent_code=EXCLUDED.parent_code,
+        pm10_avg=EXCLUDED.pm10_avg,
+        pm10_max=EXCLUDED.pm10_max,
+        pm10_stations=EXCLUDED.pm10_stations,
+        pm25_avg=EXCLUDED.pm25_avg,
+        pm25_max=EXCLUDED.pm25_max,
+        pm25_stations=EXCLUDED.pm25_stations,
+        newest_ts=EXCLUDED.newest_ts,
+        oldest_ts=EXCLUDED.oldest_ts,
+        data_version=EXCLUDED.data_version,
+        refreshed_at=EXCLUDED.refreshed_at
+"""
+
+PRUNE_SQL = """
+    DELETE FROM air.region_summaries rs
+    WHERE NOT EXISTS (
+        SELECT 1 FROM air.admin_regions r
+        WHERE r.level = rs.level AND r.code = rs.region_code
+    )
+"""
+
+
+def refresh_summaries(conn, full=False):
+    """Recompute affected regions; returns the number of rows written."""
+    with conn.cursor() as cur:
+        # Read before the observations, as build_selection_raster does.
+        cur.execute(
+            """
+            SELECT COALESCE(SUM(version), 0), CURRENT_TIMESTAMP
+            FROM air.ingest_commits
+            """
+        )
+        data_version, now = cur.fetchone()
+        since = load_watermarks(cur, PROVIDER).get(SCOPE)
+        full = full or since is None
+        cur.execute(
+            REFRESH_SQL,
+            {
+                "full": full,
+                "since": since or now,
+                "now": now,
+                "data_version": int(data_version),
+            },
+        )
+        written = cur.rowcount
+        if full:
+            cur.execute(PRUNE_SQL)
+        save_watermarks(cur, PROVIDER, {SCOPE: now})
+        if written:
+            notify_change(cur, "summaries", PROVIDER)
+    conn.commit()
+    return written, full
+
+
+def main(conn=None, full=False):
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    started = time.monotonic()
+    try:
+        ensure_watermark_table(conn)
+        written, full = refresh_summaries(conn, full)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+    print(
+        f"REGION SUMMARY OK: regions={written}, "
+        f"mode={'full' if full else 'incremental'}, "
+        f"seconds={time.monotonic() - started:.1f}"
+    )
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true")
+    main(full=parser.parse_args().full)
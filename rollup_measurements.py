@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Refresh hourly and daily per-station rollups of air.measurements.
+
+Triggers from migration 010 mark every station hour an ingester writes
+in air.rollup_dirty_buckets, whatever its observation time, so late
+backfills and history loads are found by when they were written. Each
+run claims the marked hours, recomputes them from raw rows and then
+rebuilds the KST days they touch from the hourly table. The first run,
+recorded by the ROLLUP/backfill watermark, marks every hour still in
+air.measurements. Retention keeps raw rows until that has happened and
+never deletes a marked hour. Hours that have not started, such as OWM
+forecasts, stay marked until they have.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+from airkorea_common import get_db_connection
+from ingest_common import (
+    ensure_watermark_table,
+    load_watermarks,
+    save_watermarks,
+)
+
+
+PROVIDER = "ROLLUP"
+SCOPE = "hourly"
+BACKFILL_SCOPE = "backfill"
+POLLUTANTS = ("pm10", "pm25", "o3", "no2", "so2", "co")
+AGGREGATES = ("min", "sum", "count", "max")
+DAY_TIME_ZONE = "Asia/Seoul"
+
+
+def rollup_columns():
+    return [
+        f"{pollutant}_{aggregate}"
+        for pollutant in POLLUTANTS
+        for aggregate in AGGREGATES
+    ]
+
+
+def changed_guard(table):
+    columns = rollup_columns()
+    current = ",\n            ".join(f"{table}.{c}" for c in columns)
+    excluded = ",\n            ".join(f"EXCLUDED.{c}" for c in columns)
+    return f"""(
+            {current}
+        ) IS DISTINCT FROM (
+            {excluded}
+        )"""
+
+
+SEED_SQL = """
+    INSERT INTO air.rollup_dirty_buckets(station_id, bucket)
+    SELECT DISTINCT station_id, date_trunc('hour', ts)
+    FROM air.measurements
+    ON CONFLICT (station_id, bucket) DO NOTHING
+"""
+
+CLAIMED_TABLE_SQL = """
+    CREATE TEMP TABLE rollup_claimed (
+        station_id bigint NOT NULL,
+        bucket timestamptz NOT NULL
+    ) ON COMMIT DROP
+"""
+
+# Marks locked by writers still in flight, and hours that have not
+# started yet (OWM forecasts), stay for a later run.
+CLAIM_SQL = """
+    WITH claimed AS (
+        DELETE FROM air.rollup_dirty_buckets d
+        USING (
+            SELECT station_id, bucket
+            FROM air.rollup_dirty_buckets
+            WHERE bucket <= %(now)s
+            FOR UPDATE SKIP LOCKED
+        ) ready
+        WHERE d.station_id = ready.station_id
+          AND d.bucket = ready.bucket
+        RETURNING d.station_id, d.bucket
+    )
+    INSERT INTO rollup_claimed(station_id, bucket)
+    SELECT station_id, bucket FROM claimed
+"""
+
+
+def hourly_refresh_sql():
+    columns = rollup_columns()
+    aggregates = ",\n            ".join(
+        f"{aggregate.upper()}(m.{pollutant})"
+        for pollutant in POLLUTANTS
+        for aggregate in AGGREGATES
+    )
+    updates = ",\n            ".join(f"{c}=EXCLUDED.{c}" for c in columns)
+    counts = [f"{pollutant}_count" for pollutant in POLLUTANTS]
+    excluded_count = " + ".join(f"EXCLUDED.{c}" for c in counts)
+    current_count = " + ".join(f"air.measurements_hourly.{c}" for c in counts)
+    return f"""
+        INSERT INTO air.measurements_hourly(
+            station_id, bucket, {", ".join(columns)}, refreshed_at
+        )
+        SELECT
+            c.station_id,
+            c.bucket,
+            {aggregates},
+            CURRENT_TIMESTAMP
+        FROM rollup_claimed c
+        JOIN air.measurements m
+          ON m.station_id = c.station_id
+         AND m.ts >= c.bucket
+         AND m.ts < c.bucket + INTERVAL '1 hour'
+         AND m.ts <= %(now)s
+        GROUP BY c.station_id, c.bucket
+        ON CONFLICT (station_id, bucket) DO UPDATE SET
+            {updates},
+            refreshed_at=CURRENT_TIMESTAMP
+        WHERE {changed_guard("air.measurements_hourly")}
+          -- Retention may already have removed part of an old hour; a
+          -- late row there must not shrink the complete rollup.
+          AND (
+              EXCLUDED.bucket >= %(horizon)s
+              OR {excluded_count} >= {current_count}
+          )
+        """
+
+
+def daily_refresh_sql():
+    columns = rollup_columns()
+    combine = {"min": "MIN", "sum": "SUM", "count": "SUM", "max": "MAX"}
+    aggregates = ",\n            ".join(
+        f"{combine[aggregate]}({pollutant}_{aggregate})"
+        for pollutant in POLLUTANTS
+        for aggregate in AGGREGATES
+    )
+    updates = ",\n            ".join(f"{c}=EXCLUDED.{c}" for c in columns)
+    day = f"(bucket AT TIME ZONE '{DAY_TIME_ZONE}')::date"
+    return f"""
+        INSERT INTO air.measurements_daily(
+            station_id, day, {", ".join(columns)}, refreshed_at
+        )
+        SELECT
+            station_id,
+            {day},
+            {aggregates},
+            CURRENT_TIMESTAMP
+        FROM air.measurements_hourly
+        WHERE (station_id, {day}) IN (
+            SELECT DISTINCT station_id, {day} FROM rollup_claimed
+        )
+        GROUP BY station_id, {day}
+        ON CONFLICT (station_id, day) DO UPDATE SET
+            {updates},
+            refreshed_at=CURRENT_TIMESTAMP
+        WHERE {changed_guard("air.measurements_daily")}
+        """
+
+
+def retention_hours():
+    hours = int(os.getenv("MEASUREMENT_RETENTION_HOURS", "72"))
+    if hours <= 0:
+        raise ValueError("MEASUREMENT_RETENTION_HOURS must be positive")
+    return hours
+
+
+def refresh_rollups(conn, now=None):
+    """Recompute the marked hours; returns (hourly_rows, daily_rows)."""
+    now = now or datetime.now(timezone.utc)
+    horizon = now - timedelta(hours=retention_hours())
+    with conn.cursor() as cur:
+        if BACKFILL_SCOPE not in load_watermarks(cur, PROVIDER):
+            cur.execute(SEED_SQL)
+        cur.execute(CLAIMED_TABLE_SQL)
+        cur.execute(CLAIM_SQL, {"now": now})
+        cur.execute(
+            hourly_refresh_sql(), {"horizon": horizon, "now": now}
+        )
+        hourly = cur.rowcount
+        cur.execute(daily_refresh_sql())
+        daily = cur.rowcount
+        save_watermarks(cur, PROVIDER, {SCOPE: now, BACKFILL_SCOPE: now})
+    conn.commit()
+    return hourly, daily
+
+
+def main(conn=None):
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        ensure_watermark_table(conn)
+        hourly, daily = refresh_rollups(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+    print(f"ROLLUP OK: hourly_rows={hourly}, daily_rows={daily}")
+    return hourly + daily
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,17 @@
 """Import official NGII sigungu boundaries and map stations spatially."""
 
 import csv
+import io
 import os
 from pathlib import Path
 
+from psycopg2.extras import execute_values
+
 from airkorea_common import get_db_connection
+from ingest_common import record_ingest_commit
 
 
+COMMIT_PROVIDER = "ADMIN_BOUNDARIES"
 SOURCE_NAME = "국토교통부 국토지리정보원_공간정보공동활용_시군구"
 SOURCE_DATE = "2023-09-15"
 SIDO_NAMES = {
@@ -30,6 +35,10 @@ SIDO_NAMES = {
     "50": "제주특별자치도",
 }
 
+COPY_BATCH_ROWS = 500
+SUBDIVIDE_MAX_VERTICES = 256
+STAGE_COLUMNS = ("code", "name", "full_name", "parent_code", "wkb_hex")
+
 COMPOSITE_CITIES = {
     "41110": ("41", "\uc218\uc6d0\uc2dc", "4111_"),
     "41130": ("41", "\uc131\ub0a8\uc2dc", "4113_"),
@@ -71,7 +80,19 @@ def read_sigungu_rows(path):
             }
 
 
+def copy_stage_rows(cur, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY admin_region_stage({','.join(STAGE_COLUMNS)}) "
+        "FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
 def import_boundaries(conn, rows):
+    """COPY features into staging, then validate and union them set-wise."""
     source_features = 0
     with conn.cursor() as cur:
         cur.execute(
@@ -81,35 +102,36 @@ def import_boundaries(conn, rows):
                 name text NOT NULL,
                 full_name text NOT NULL,
                 parent_code text NOT NULL,
-                geom geometry(MultiPolygon, 4326) NOT NULL
+                wkb_hex text NOT NULL
             ) ON COMMIT DROP
             """
         )
+        batch = []
         for row in rows:
-            cur.execute(
-                """
-                INSERT INTO admin_region_stage(
-                    code, name, full_name, parent_code, geom
-                )
-                VALUES (
-                    %s, %s, %s, %s,
-                    ST_Multi(ST_CollectionExtract(ST_MakeValid(
-                        ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)
-                    ), 3))
-                )
-                """,
-                (
-                    row["code"],
-                    row["name"],
-                    row["full_name"],
-                    row["parent_code"],
-                    row["wkb_hex"],
-                ),
-            )
-            source_features += 1
+            batch.append(tuple(row[column] for column in STAGE_COLUMNS))
+            if len(batch) >= COPY_BATCH_ROWS:
+                copy_stage_rows(cur, batch)
+                source_features += len(batch)
+                batch = []
+        if batch:
+            copy_stage_rows(cur, batch)
+            source_features += len(batch)
 
         cur.execute(
             """
+            WITH validated AS (
+                SELECT
+                    code,
+                    name,
+                    full_name,
+                    parent_code,
+                    ST_Multi(ST_CollectionExtract(ST_MakeValid(
+                        ST_SetSRID(
+                            ST_GeomFromWKB(decode(wkb_hex, 'hex')), 4326
+                        )
+                    ), 3)) AS geom
+                FROM admin_region_stage
+            )
             INSERT INTO air.admin_regions(
                 code, level, name, full_name, parent_code, geom,
                 source_name, source_date, imported_at
@@ -124,7 +146,7 @@ def import_boundaries(conn, rows):
                 %s,
                 %s,
                 CURRENT_TIMESTAMP
-            FROM admin_region_stage
+            FROM validated
             GROUP BY code
             ON CONFLICT (code) DO UPDATE SET
                 level=EXCLUDED.level,
@@ -144,77 +166,117 @@ def import_boundaries(conn, rows):
 
 
 def rebuild_sido_boundaries(conn):
+    """Union every sido from its sigungu polygons in one statement."""
     with conn.cursor() as cur:
-        for code, name in SIDO_NAMES.items():
-            cur.execute(
-                """
-                INSERT INTO air.admin_regions(
-                    code, level, name, full_name, parent_code, geom,
-                    source_name, source_date, imported_at
-                )
-                SELECT
-                    %s, 'sido', %s, %s, NULL,
-                    ST_Multi(ST_UnaryUnion(ST_Collect(geom))),
-                    %s, %s, CURRENT_TIMESTAMP
-                FROM air.admin_regions
-                WHERE level='sigungu' AND parent_code=%s
-                HAVING COUNT(*) > 0
-                ON CONFLICT (code) DO UPDATE SET
-                    level=EXCLUDED.level,
-                    name=EXCLUDED.name,
-                    full_name=EXCLUDED.full_name,
-                    parent_code=NULL,
-                    geom=EXCLUDED.geom,
-                    source_name=EXCLUDED.source_name,
-                    source_date=EXCLUDED.source_date,
-                    imported_at=CURRENT_TIMESTAMP
-                """,
-                (code, name, name, SOURCE_NAME, SOURCE_DATE, code),
+        execute_values(
+            cur,
+            """
+            INSERT INTO air.admin_regions(
+                code, level, name, full_name, parent_code, geom,
+                source_name, source_date, imported_at
             )
+            SELECT
+                sido.code, 'sido', sido.name, sido.name, NULL,
+                ST_Multi(ST_UnaryUnion(ST_Collect(r.geom))),
+                sido.source_name, sido.source_date, CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS sido(code, name, source_name, source_date)
+            JOIN air.admin_regions r
+              ON r.level='sigungu'
+             AND r.parent_code=sido.code
+            GROUP BY sido.code, sido.name, sido.source_name, sido.source_date
+            ON CONFLICT (code) DO UPDATE SET
+                level=EXCLUDED.level,
+                name=EXCLUDED.name,
+                full_name=EXCLUDED.full_name,
+                parent_code=NULL,
+                geom=EXCLUDED.geom,
+                source_name=EXCLUDED.source_name,
+                source_date=EXCLUDED.source_date,
+                imported_at=CURRENT_TIMESTAMP
+            """,
+            [
+                (code, name, SOURCE_NAME, SOURCE_DATE)
+                for code, name in SIDO_NAMES.items()
+            ],
+            template="(%s, %s, %s, %s::date)",
+            page_size=len(SIDO_NAMES),
+        )
     conn.commit()
 
 
 def rebuild_composite_city_boundaries(conn):
     """Union official child-gu polygons into their official parent-city code."""
     with conn.cursor() as cur:
-        for code, (sido_code, name, child_pattern) in COMPOSITE_CITIES.items():
-            cur.execute(
-                """
-                INSERT INTO air.admin_regions(
-                    code, level, name, full_name, parent_code, geom,
-                    source_name, source_date, imported_at
-                )
-                SELECT
-                    %s, 'sigungu', %s, %s, %s,
-                    ST_Multi(ST_UnaryUnion(ST_Collect(geom))),
-                    %s, %s, CURRENT_TIMESTAMP
-                FROM air.admin_regions
-                WHERE level='sigungu'
-                  AND code LIKE %s
-                  AND code <> %s
-                HAVING COUNT(*) > 0
-                ON CONFLICT (code) DO UPDATE SET
-                    level=EXCLUDED.level,
-                    name=EXCLUDED.name,
-                    full_name=EXCLUDED.full_name,
-                    parent_code=EXCLUDED.parent_code,
-                    geom=EXCLUDED.geom,
-                    source_name=EXCLUDED.source_name,
-                    source_date=EXCLUDED.source_date,
-                    imported_at=CURRENT_TIMESTAMP
-                """,
+        execute_values(
+            cur,
+            """
+            INSERT INTO air.admin_regions(
+                code, level, name, full_name, parent_code, geom,
+                source_name, source_date, imported_at
+            )
+            SELECT
+                city.code, 'sigungu', city.name, city.full_name,
+                city.parent_code,
+                ST_Multi(ST_UnaryUnion(ST_Collect(r.geom))),
+                city.source_name, city.source_date, CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS city(
+                code, name, full_name, parent_code, child_pattern,
+                source_name, source_date
+            )
+            JOIN air.admin_regions r
+              ON r.level='sigungu'
+             AND r.code LIKE city.child_pattern
+             AND r.code <> city.code
+            GROUP BY
+                city.code, city.name, city.full_name, city.parent_code,
+                city.source_name, city.source_date
+            ON CONFLICT (code) DO UPDATE SET
+                level=EXCLUDED.level,
+                name=EXCLUDED.name,
+                full_name=EXCLUDED.full_name,
+                parent_code=EXCLUDED.parent_code,
+                geom=EXCLUDED.geom,
+                source_name=EXCLUDED.source_name,
+                source_date=EXCLUDED.source_date,
+                imported_at=CURRENT_TIMESTAMP
+            """,
+            [
                 (
                     code,
                     name,
                     f"{SIDO_NAMES[sido_code]} {name}",
                     sido_code,
+                    child_pattern,
                     SOURCE_NAME,
                     SOURCE_DATE,
-                    child_pattern,
-                    code,
-                ),
-            )
+                )
+                for code, (sido_code, name, child_pattern) in (
+                    COMPOSITE_CITIES.items()
+                )
+            ],
+            template="(%s, %s, %s, %s, %s, %s, %s::date)",
+            page_size=len(COMPOSITE_CITIES),
+        )
+    conn.commit()
+
+
+def rebuild_subdivided_boundaries(conn):
+    """Replace the ST_Subdivide pieces used for point-in-polygon checks."""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM air.admin_regions_subdivided")
+        cur.execute(
+            """
+            INSERT INTO air.admin_regions_subdivided(code, level, geom)
+            SELECT r.code, r.level, piece.geom
+            FROM air.admin_regions r
+            CROSS JOIN LATERAL ST_Subdivide(r.geom, %s) AS piece(geom)
+            """,
+            (SUBDIVIDE_MAX_VERTICES,),
+        )
+        pieces = cur.rowcount
+        cur.execute("ANALYZE air.admin_regions_subdivided")
     conn.commit()
+    return pieces
 
 
 def map_stations(conn):
@@ -228,13 +290,14 @@ def map_stations(conn):
                     r.parent_code AS sido_code,
                     ROW_NUMBER() OVER (
                         PARTITION BY s.id
-                        ORDER BY ST_Area(r.geom) ASC, r.code ASC
+                        ORDER BY r.area ASC, r.code ASC
                     ) AS rank
                 FROM air.stations s
-                JOIN air.admin_regions r
-                  ON r.level='sigungu'
+                JOIN air.admin_regions_subdivided piece
+                  ON piece.level='sigungu'
                  AND s.geom IS NOT NULL
-                 AND ST_Covers(r.geom, s.geom::geometry)
+                 AND ST_Covers(piece.geom, s.geom::geometry)
+                JOIN air.admin_regions r ON r.code=piece.code
             )
             UPDATE air.stations s
             SET sido_code=m.sido_code,
@@ -244,6 +307,9 @@ def map_stations(conn):
             """
         )
         mapped = cur.rowcount
+        if mapped:
+            # Any station may have changed region: drop every answer.
+            record_ingest_commit(cur, COMMIT_PROVIDER)
         cur.execute(
             """
             SELECT COUNT(*)
@@ -269,12 +335,13 @@ def main():
         )
         rebuild_composite_city_boundaries(conn)
         rebuild_sido_boundaries(conn)
+        pieces = rebuild_subdivided_boundaries(conn)
         mapped, unmapped = map_stations(conn)
     finally:
         conn.close()
     print(
         f"ADMIN boundary sync OK: source_features={source_features}, "
-        f"sigungu={imported}, "
+        f"sigungu={imported}, subdivided_pieces={pieces}, "
         f"stations_mapped={mapped}, stations_unmapped={unmapped}"
     )
 
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+from psycopg2.extras import execute_values
+
 from airkorea_common import (
     AIRKOREA_STATION_BASE_URL,
     configured_regions,
@@ -8,9 +10,16 @@ from airkorea_common import (
     station_belongs_to_region,
     station_external_code,
 )
+from ingest_common import (
+    map_station_regions,
+    notify_change,
+    record_ingest_commit,
+)
 
 
 STATION_ENDPOINT = f"{AIRKOREA_STATION_BASE_URL}/getMsrstnList"
+# Station rows feed cached answers and the raster like observations do.
+COMMIT_PROVIDER = "AIRKOREA_STATIONS"
 
 
 def to_coordinate(value):
@@ -34,37 +43,100 @@ def fetch_region_stations(conn, region, decode_key=False):
     )
 
 
+def station_changes(existing, candidate):
+    """Classify a fetched station against its stored row.
+
+    Returns "new", "moved", "renamed" or "unchanged". A stored row without
+    geometry counts as moved so that it gets placed and mapped.
+    """
+    if existing is None:
+        return "new"
+    # Stored coordinates may come back as Decimal; compare them as floats.
+    stored = (
+        to_coordinate(existing["lat"]),
+        to_coordinate(existing["lon"]),
+    )
+    if not existing["has_geom"] or stored != (
+        candidate["lat"],
+        candidate["lon"],
+    ):
+        return "moved"
+    if any(
+        existing[field] != candidate[field]
+        for field in ("name", "city", "address")
+    ):
+        return "renamed"
+    return "unchanged"
+
+
+def load_existing_stations(cur, external_codes):
+    cur.execute(
+        """
+        SELECT external_code, name, city, address, lat, lon,
+               geom IS NOT NULL AS has_geom
+        FROM air.stations
+        WHERE provider='AIRKOREA' AND external_code = ANY(%s)
+        """,
+        (list(external_codes),),
+    )
+    columns = [column[0] for column in cur.description]
+    return {
+        row[0]: dict(zip(columns, row)) for row in cur.fetchall()
+    }
+
+
 def upsert_stations(conn, region, items):
-    upserted = 0
+    """Write only new, moved or renamed stations of one region.
+
+    New and moved stations get their region codes in the same
+    transaction, so a failed run cannot leave them with stale codes.
+    Returns (counts, remapped, skipped_without_coordinates,
+    skipped_outside_region).
+    """
+    candidates = {}
     skipped_without_coordinates = 0
     skipped_outside_region = 0
+    for item in items:
+        if not station_belongs_to_region(region, item):
+            skipped_outside_region += 1
+            continue
+        station_name = (item.get("stationName") or "").strip()
+        lat = to_coordinate(item.get("dmX"))
+        lon = to_coordinate(item.get("dmY"))
+        if not station_name or lat is None or lon is None:
+            skipped_without_coordinates += 1
+            continue
+        if not (30 <= lat <= 40 and 120 <= lon <= 135):
+            skipped_without_coordinates += 1
+            continue
+        external_code = station_external_code(region, station_name)
+        candidates[external_code] = {
+            "name": station_name,
+            "city": region,
+            "address": (item.get("addr") or "").strip() or None,
+            "lat": lat,
+            "lon": lon,
+        }
+
+    counts = {"new": 0, "moved": 0, "renamed": 0, "unchanged": 0}
+    remapped = 0
     with conn.cursor() as cur:
-        for item in items:
-            if not station_belongs_to_region(region, item):
-                skipped_outside_region += 1
-                continue
-            station_name = (item.get("stationName") or "").strip()
-            lat = to_coordinate(item.get("dmX"))
-            lon = to_coordinate(item.get("dmY"))
-            if not station_name or lat is None or lon is None:
-                skipped_without_coordinates += 1
-                continue
-            if not (30 <= lat <= 40 and 120 <= lon <= 135):
-                skipped_without_coordinates += 1
-                continue
-
-            external_code = station_external_code(region, station_name)
-            cur.execute(
+        existing = load_existing_stations(cur, candidates)
+        writes = []
+        for external_code, candidate in candidates.items():
+            change = station_changes(existing.get(external_code), candidate)
+            counts[change] += 1
+            if change != "unchanged":
+                writes.append((external_code, candidate, change))
+        if writes:
+            returned = execute_values(
+                cur,
                 """
                 INSERT INTO air.stations(
                     external_code, name, provider, kind, city, country,
                     address, lat, lon, geom, source_id
                 )
-                VALUES (
-                    %s,%s,'AIRKOREA','airkorea_station',%s,'KR',%s,%s,%s,
-                    ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
-                    (SELECT id FROM air.sources WHERE code='airkorea')
-                )
+                VALUES %s
                 ON CONFLICT (provider, external_code) DO UPDATE SET
                     name=EXCLUDED.name,
                     kind=EXCLUDED.kind,
@@ -75,53 +147,57 @@ def upsert_stations(conn, region, items):
                     lon=EXCLUDED.lon,
                     geom=EXCLUDED.geom,
                     source_id=EXCLUDED.source_id
+                RETURNING external_code, id
                 """,
-                (
-                    external_code,
-                    station_name,
-                    region,
-                    (item.get("addr") or "").strip() or None,
-                    lat,
-                    lon,
-                    lon,
-                    lat,
+                [
+                    (
+                        external_code,
+                        candidate["name"],
+                        candidate["city"],
+                        candidate["address"],
+                        candidate["lat"],
+                        candidate["lon"],
+                        candidate["lon"],
+                        candidate["lat"],
+                    )
+                    for external_code, candidate, _ in writes
+                ],
+                template=(
+                    "(%s,%s,'AIRKOREA','airkorea_station',%s,'KR',%s,%s,%s,"
+                    "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,"
+                    "(SELECT id FROM air.sources WHERE code='airkorea'))"
                 ),
+                page_size=len(writes),
+                fetch=True,
             )
-            upserted += 1
-        cur.execute(
-            """
-            WITH mapped AS (
-                SELECT
-                    s.id,
-                    r.code AS sigungu_code,
-                    r.parent_code AS sido_code,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY s.id
-                        ORDER BY ST_Area(r.geom) ASC, r.code ASC
-                    ) AS rank
-                FROM air.stations s
-                JOIN air.admin_regions r
-                  ON r.level='sigungu'
-                 AND s.provider='AIRKOREA'
-                 AND s.geom IS NOT NULL
-                 AND ST_Covers(r.geom, s.geom::geometry)
-            )
-            UPDATE air.stations s
-            SET sido_code=m.sido_code,
-                sigungu_code=m.sigungu_code
-            FROM mapped m
-            WHERE s.id=m.id AND m.rank=1
-            """
-        )
+            station_ids = dict(returned)
+            moved_station_ids = [
+                station_ids[external_code]
+                for external_code, _, change in writes
+                if change in ("new", "moved")
+            ]
+            # Announced under the old region codes first, then the new.
+            record_ingest_commit(cur, COMMIT_PROVIDER, station_ids.values())
+            remapped = map_station_regions(cur, moved_station_ids)
+            if remapped:
+                notify_change(
+                    cur, "ingest", COMMIT_PROVIDER, moved_station_ids
+                )
     conn.commit()
-    return upserted, skipped_without_coordinates, skipped_outside_region
+    return (
+        counts,
+        remapped,
+        skipped_without_coordinates,
+        skipped_outside_region,
+    )
 
 
 def main():
     conn = get_db_connection()
     ensure_usage_table(conn)
     succeeded_regions = 0
-    total_upserted = 0
+    totals = {"new": 0, "moved": 0, "renamed": 0, "unchanged": 0}
+    remapped = 0
     try:
         with conn.cursor() as cur:
             cur.execute(
@@ -152,15 +228,20 @@ def main():
                         or []
                     )
                     (
-                        upserted,
+                        counts,
+                        region_remapped,
                         missing_coordinates,
                         outside_region,
                     ) = upsert_stations(conn, region, items)
                     succeeded_regions += 1
-                    total_upserted += upserted
+                    for change, count in counts.items():
+                        totals[change] += count
+                    remapped += region_remapped
                     print(
                         f"AIRKOREA station sync OK: region={region}, "
-                        f"stations={upserted}, "
+                        f"new={counts['new']}, moved={counts['moved']}, "
+                        f"renamed={counts['renamed']}, "
+                        f"unchanged={counts['unchanged']}, "
                         f"missing_coordinates={missing_coordinates}, "
                         f"outside_region={outside_region}"
                     )
@@ -179,11 +260,13 @@ def main():
 
     if succeeded_regions == 0:
         raise RuntimeError("AirKorea station sync failed for all regions")
+    synced = sum(totals.values())
     print(
         f"AIRKOREA station sync completed: regions={succeeded_regions}, "
-        f"stations={total_upserted}"
+        f"stations={synced}, new={totals['new']}, moved={totals['moved']}, "
+        f"renamed={totals['renamed']}, remapped={remapped}"
     )
-    return total_upserted
+    return synced
 
 
 if __name__ == "__main__":
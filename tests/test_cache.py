@@ -0,0 +1,181 @@
+import asyncio
+import os
+import socket
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(ROOT_DIR / "app"))
+
+import cache
+from loadtest.fake_redis import FakeRedisServer
+
+
+def _unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class SerializationTests(unittest.TestCase):
+    def test_small_values_stay_plain_json(self):
+        value = {"lat": 37.5, "address": "서울 중구", "hourly": [1, None]}
+
+        blob = cache.encode(value)
+
+        self.assertEqual(blob[:1], b"j")
+        self.assertNotIn(b", ", blob)
+        self.assertEqual(cache.decode(blob), value)
+
+    def test_large_values_are_compressed(self):
+        value = {"hourly": {"pm10": [12.5] * 500, "pm2_5": [7.0] * 500}}
+
+        blob = cache.encode(value)
+
+        self.assertEqual(blob[:1], b"z")
+        self.assertLess(len(blob), len(cache.encode({"x": 1})) + 200)
+        self.assertEqual(cache.decode(blob), value)
+
+    def test_bytes_round_trip(self):
+        tile = bytes(range(256)) * 4
+
+        self.assertEqual(cache.decode(cache.encode(b"\x1a\x02")), b"\x1a\x02")
+        self.assertEqual(cache.decode(cache.encode(tile)), tile)
+
+    def test_keys_are_namespaced(self):
+        self.assertEqual(
+            cache.cache_key("geo", ("rev", 37.5, 127.0)),
+            "hudadak:v1:geo:rev:37.5:127.0",
+        )
+
+
+class MemoryCacheTests(unittest.TestCase):
+    def test_expired_entries_miss(self):
+        memory = cache.MemoryCache()
+        memory.set("a", 1, ttl=60)
+        memory.set("b", 2, ttl=-1)
+
+        self.assertEqual(memory.get("a"), 1)
+        self.assertIsNone(memory.get("b"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        memory = cache.MemoryCache(max_entries=2)
+        memory.set("a", 1, 60)
+        memory.set("b", 2, 60)
+        memory.get("a")
+        memory.set("c", 3, 60)
+
+        self.assertEqual(memory.get("a"), 1)
+        self.assertIsNone(memory.get("b"))
+        self.assertEqual(len(memory), 2)
+
+
+class RedisCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeRedisServer().start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_values_round_trip_through_the_server(self):
+        redis = cache.RedisCache(self.server.url, timeout=1)
+        redis.set("k", {"pm10": [1, 2]}, ttl=60)
+
+        self.assertEqual(redis.get("k"), {"pm10": [1, 2]})
+        redis.delete("k")
+        self.assertIsNone(redis.get("k"))
+        self.assertEqual(redis.execute("PING"), "PONG")
+
+    def test_ttl_is_sent_in_milliseconds(self):
+        redis = cache.RedisCache(self.server.url, timeout=1)
+        redis.set("k", 1, ttl=0.001)
+        time.sleep(0.01)
+
+        self.assertIsNone(redis.get("k"))
+
+    def test_unserializable_values_are_not_shared(self):
+        redis = cache.RedisCache(self.server.url, timeout=1)
+
+        redis.set("k", {"when": object()}, ttl=60)
+
+        self.assertIsNone(redis.get("k"))
+
+    def test_unreachable_server_is_skipped_until_retry(self):
+        url = f"redis://127.0.0.1:{_unused_port()}/0"
+        redis = cache.RedisCache(url, timeout=0.2, retry_after=60)
+
+        self.assertIsNone(redis.get("k"))
+        with patch.object(cache.socket, "create_connection") as connect:
+            self.assertIsNone(redis.get("k"))
+            redis.set("k", 1, ttl=60)
+        connect.assert_not_called()
+
+
+class TieredCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeRedisServer().start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.shared = cache.RedisCache(self.server.url, timeout=1)
+
+    def _instance(self):
+        return cache.TieredCache(
+            "openmeteo", cache.MemoryCache(), self.shared, local_ttl=30
+        )
+
+    def test_hits_are_shared_between_instances(self):
+        first, second = self._instance(), self._instance()
+        first.set(("aq", 37.5, 127.0), {"hourly": {}}, ttl=120)
+
+        self.assertEqual(second.get(("aq", 37.5, 127.0)), {"hourly": {}})
+        # The shared hit now serves from the second instance's own tier.
+        self.server.store.values.clear()
+        self.assertEqual(second.get(("aq", 37.5, 127.0)), {"hourly": {}})
+
+    def test_local_tier_ttl_is_capped(self):
+        tiered = self._instance()
+        with patch.object(tiered.local, "set") as local_set:
+            tiered.set("k", 1, ttl=300)
+
+        self.assertEqual(local_set.call_args.args[2], 30)
+
+    def test_async_access_fills_from_shared(self):
+        first, second = self._instance(), self._instance()
+
+        async def scenario():
+            await first.aset("k", [1, 2, 3], 60)
+            return await second.aget("k"), await second.aget("missing")
+
+        self.assertEqual(asyncio.run(scenario()), ([1, 2, 3], None))
+        self.assertEqual(len(second), 1)
+
+    def test_shared_outage_falls_back_to_local(self):
+        url = f"redis://127.0.0.1:{_unused_port()}/0"
+        tiered = cache.TieredCache(
+            "geo",
+            cache.MemoryCache(),
+            cache.RedisCache(url, timeout=0.2, retry_after=60),
+        )
+
+        tiered.set("k", {"address": "x"}, ttl=60)
+
+        self.assertEqual(tiered.get("k"), {"address": "x"})
+
+    def test_backend_follows_environment(self):
+        with patch.dict(os.environ, {"CACHE_BACKEND": "memory"}):
+            self.assertIsNone(cache.make_cache("geo").shared)
+        env = {"CACHE_BACKEND": "redis", "REDIS_URL": self.server.url}
+        with patch.dict(os.environ, env):
+            first = cache.make_cache("geo")
+            second = cache.make_cache("history")
+
+        self.assertIsInstance(first.shared, cache.RedisCache)
+        self.assertIs(first.shared, second.shared)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+import deadline
+import main
+
+
+class RecordingCursor:
+    description = None
+
+    def __init__(self, row=None):
+        self.row = row
+        self.queries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchone(self):
+        return self.row
+
+
+class RowConnection:
+    def __init__(self, row):
+        self.cursor_instance = RecordingCursor(row)
+
+    def cursor(self):
+        return self.cursor_instance
+
+    def close(self):
+        pass
+
+
+async def _within(seconds, awaitable):
+    token = deadline._budget.set(deadline.Budget(seconds))
+    try:
+        return await awaitable
+    finally:
+        deadline._budget.reset(token)
+
+
+class BudgetTests(unittest.TestCase):
+    def test_budget_is_configured_per_endpoint(self):
+        env = {
+            "REQUEST_DEADLINE_MS": "8000",
+            "REQUEST_DEADLINES_MS": "nearest=2500, forecast=6000",
+        }
+        with patch.dict(os.environ, env):
+            self.assertEqual(deadline.budget_seconds("/nearest"), 2.5)
+            self.assertEqual(deadline.budget_seconds("/forecast/"), 6.0)
+            self.assertEqual(deadline.budget_seconds("/tiles/1/2/3"), 8.0)
+
+    def test_helpers_are_no_ops_without_a_budget(self):
+        cur = RecordingCursor()
+
+        deadline.apply_statement_timeout(cur)
+
+        self.assertEqual(cur.queries, [])
+        self.assertIsNone(deadline.remaining())
+        self.assertEqual(deadline.connect_timeout(5), 5)
+
+    def test_remaining_budget_becomes_statement_timeout(self):
+        cur = RecordingCursor()
+        token = deadline._budget.set(deadline.Budget(1.5))
+        try:
+            deadline.apply_statement_timeout(cur)
+            self.assertEqual(deadline.connect_timeout(5), 2)
+        finally:
+            deadline._budget.reset(token)
+
+        query, params = cur.queries[0]
+        self.assertEqual(query, "SET LOCAL statement_timeout = %s")
+        self.assertTrue(1400 < params[0] <= 1500)
+
+    def test_spent_budget_refuses_new_statements(self):
+        token = deadline._budget.set(deadline.Budget(0))
+        try:
+            with self.assertRaises(deadline.DeadlineExceeded):
+                deadline.apply_statement_timeout(RecordingCursor())
+        finally:
+            deadline._budget.reset(token)
+
+
+class PartialResponseTests(unittest.TestCase):
+    def test_slow_model_fetch_is_cut_at_the_deadline(self):
+        async def slow_fetch(lat, lon, keys):
+            await asyncio.sleep(0.2)
+            return {"hourly": {"time": []}}
+
+        async def scenario():
+            with self.assertRaises(deadline.DeadlineExceeded):
+                await _within(
+                    0.02,
+                    main.cached_fetch_openmeteo(12.345, 67.891, ["ozone"]),
+                )
+            # The fetch still completes and fills the cache for later.
+            await asyncio.gather(*main._model_data._in_flight.values())
+            return await main.cached_fetch_openmeteo(
+                12.345, 67.891, ["ozone"]
+            )
+
+        with patch.object(main, "fetch_openmeteo", new=slow_fetch):
+            cached = asyncio.run(scenario())
+
+        self.assertEqual(cached, {"hourly": {"time": []}})
+
+    def test_nearest_returns_pm_when_gas_supplement_runs_out(self):
+        connection = RowConnection(
+            {
+                "station_id": 17,
+                "name": "Widget station",
+                "provider": "WAQI",
+                "kind": "waqi_station",
+                "pm10": 31.0,
+                "pm25": 14.0,
+                "display_ts": "2026-07-23T12:00:00+09:00",
+            }
+        )
+        with patch.object(
+            main, "get_db_connection", return_value=connection
+        ), patch.object(
+            main,
+            "cached_fetch_openmeteo",
+            new=AsyncMock(side_effect=deadline.DeadlineExceeded("aq")),
+        ), patch.object(main, "_fetch_owm_gas_backup", return_value={}):
+            response = asyncio.run(
+                _within(5, main.nearest(lat=37.5, lon=127.0, source="auto"))
+            )
+
+        self.assertEqual(response["pm10"], 31.0)
+        self.assertIsNone(response["o3"])
+        self.assertTrue(response["degraded"])
+        self.assertEqual(
+            response["degraded_reasons"], ["model_supplement_deadline"]
+        )
+        self.assertEqual(
+            connection.cursor_instance.queries[0][0],
+            "SET LOCAL statement_timeout = %s",
+        )
+
+    def test_forecast_without_weather_is_marked_degraded(self):
+        aq = {
+            "hourly": {
+                "time": ["2026-07-23T12:00", "2026-07-23T13:00"],
+                "pm10": [20.0, 22.0],
+                "pm2_5": [9.0, 10.0],
+            }
+        }
+        with patch.object(
+            main, "cached_fetch_openmeteo", new=AsyncMock(return_value=aq)
+        ), patch.object(
+            main,
+            "cached_fetch_weather",
+            new=AsyncMock(side_effect=deadline.DeadlineExceeded("wx")),
+        ):
+            response = asyncio.run(
+                main.forecast(lat=37.5, lon=127.0, horizon=24)
+            )
+
+        self.assertTrue(response["degraded"])
+        self.assertEqual(response["degraded_reasons"], ["weather_deadline"])
+        self.assertTrue(response["hourly"])
+        self.assertIsNone(response["hourly"][0]["wind_spd"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from fastapi import HTTPException
+
+import measurement_export
+from routers import export as export_module
+
+
+class NamedCursor:
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.cursor_closed = True
+        return False
+
+    def execute(self, query, params):
+        self.connection.query = " ".join(query.split())
+        self.connection.params = params
+
+    def __iter__(self):
+        for row in self.connection.rows:
+            self.connection.fetched += 1
+            yield row
+
+
+class ExportConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursor_names = []
+        self.query = None
+        self.params = None
+        self.fetched = 0
+        self.cursor_closed = False
+        self.closed = False
+
+    def cursor(self, name=None):
+        self.cursor_names.append(name)
+        cursor = NamedCursor(self, name)
+        self.last_cursor = cursor
+        return cursor
+
+    def close(self):
+        self.closed = True
+
+
+def raw_rows(count):
+    start = datetime(2026, 7, 1, tzinfo=timezone.utc)
+    return [
+        (start + timedelta(hours=i // 2), 100 + i % 2,
+         20.0, 10.0, None, None, None, None, "observed")
+        for i in range(count)
+    ]
+
+
+class MeasurementExportTests(unittest.TestCase):
+    start = datetime(2026, 7, 1, tzinfo=timezone.utc)
+    end = datetime(2026, 7, 2, tzinfo=timezone.utc)
+
+    def test_rows_stream_through_a_named_cursor_in_chunks(self):
+        conn = ExportConnection(raw_rows(5))
+
+        with patch.object(measurement_export, "CHUNK_ROWS", 2):
+            chunks = measurement_export.export_chunks(
+                conn, "raw", "ndjson", self.start, self.end, "all", (),
+                fetch_size=500,
+            )
+            first = next(chunks)
+            self.assertEqual(conn.fetched, 2)
+            rest = list(chunks)
+
+        self.assertEqual(conn.cursor_names, ["measurement_export"])
+        self.assertEqual(conn.last_cursor.itersize, 500)
+        self.assertIn("ORDER BY r.ts, r.station_id", conn.query)
+        lines = b"".join([first, *rest]).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[1])["station_id"], 101)
+        self.assertEqual(len(rest), 2)
+        self.assertTrue(conn.cursor_closed)
+
+    def test_cursor_token_resumes_after_the_last_key(self):
+        token = measurement_export.encode_cursor(self.start, 101)
+        conn = ExportConnection([])
+
+        list(
+            measurement_export.export_chunks(
+                conn, "hourly", "csv", self.start, self.end,
+                "sigungu", ("41110", "41119"), cursor=token,
+            )
+        )
+
+        self.assertIn("(r.bucket, r.station_id) > (%s, %s)", conn.query)
+        self.assertIn("s.sigungu_code BETWEEN %s AND %s", conn.query)
+        self.assertEqual(
+            conn.params,
+            (self.start, self.end, "41110", "41119", self.start, 101),
+        )
+
+    def test_csv_has_header_and_one_line_per_row(self):
+        conn = ExportConnection(raw_rows(3))
+
+        body = b"".join(
+            measurement_export.export_chunks(
+                conn, "raw", "csv", self.start, self.end, "station", (100,)
+            )
+        ).decode()
+
+        lines = body.splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["ts", "station_id", "pm10"])
+        self.assertEqual(len(lines), 4)
+        self.assertIn("r.station_id = %s", conn.query)
+
+    def test_resume_token_covers_only_written_chunks(self):
+        conn = ExportConnection(raw_rows(3))
+        tracker = measurement_export.KeyTracker()
+
+        with patch.object(measurement_export, "CHUNK_ROWS", 2):
+            chunks = measurement_export.export_chunks(
+                conn, "raw", "ndjson", self.start, self.end, "all", (),
+                tracker=tracker,
+            )
+            next(chunks)
+            tracker.mark_written()
+
+        resumed = measurement_export.decode_cursor(
+            "raw", tracker.resume_token()
+        )
+        self.assertEqual(resumed, (self.start, 101))
+
+    def test_endpoint_checkpoints_let_a_broken_download_resume(self):
+        def download(conn, cursor=None):
+            with patch.object(
+                export_module.db, "get_db_connection", return_value=conn
+            ):
+                response = export_module.export_measurements(
+                    start="2026-07-01",
+                    end="2026-07-02",
+                    source="raw",
+                    format="ndjson",
+                    station_id=None,
+                    region_level=None,
+                    region_code=None,
+                    cursor=cursor,
+                )
+
+            async def body():
+                return b"".join(
+                    [chunk async for chunk in response.body_iterator]
+                )
+
+            return asyncio.run(body()).decode().splitlines()
+
+        with patch.object(measurement_export, "CHUNK_ROWS", 2):
+            lines = download(ExportConnection(raw_rows(5)))
+
+        tokens = [
+            measurement_export.parse_checkpoint("ndjson", line)
+            for line in lines
+        ]
+        self.assertEqual(sum(token is not None for token in tokens), 3)
+        self.assertIsNotNone(tokens[-1])
+        # The connection broke after the first checkpoint.
+        token = tokens[2]
+        self.assertIsNotNone(token)
+        self.assertEqual(
+            measurement_export.decode_cursor("raw", token), (self.start, 101)
+        )
+        resumed = ExportConnection([])
+        download(resumed, cursor=token)
+
+        self.assertIn("(r.ts, r.station_id) > (%s, %s)", resumed.query)
+        self.assertEqual(resumed.params[-2:], (self.start, 101))
+
+    def test_csv_checkpoints_are_comment_lines(self):
+        conn = ExportConnection(raw_rows(1))
+
+        body = b"".join(
+            measurement_export.export_chunks(
+                conn, "raw", "csv", self.start, self.end, "all", (),
+                checkpoints=True,
+            )
+        ).decode()
+
+        last = body.splitlines()[-1]
+        self.assertTrue(last.startswith("# next_cursor="))
+        self.assertEqual(
+            measurement_export.decode_cursor(
+                "raw", measurement_export.parse_checkpoint("csv", last)
+            ),
+            (self.start, 100),
+        )
+
+    def test_endpoint_rejects_bad_cursor_before_streaming(self):
+        conn = ExportConnection([])
+        with patch.object(
+            export_module.db, "get_db_connection", return_value=conn
+        ):
+            with self.assertRaises(HTTPException) as raised:
+                export_module.export_measurements(
+                    start="2026-07-01",
+                    end="2026-07-02",
+                    source="raw",
+                    format="ndjson",
+                    station_id=None,
+                    region_level=None,
+                    region_code=None,
+                    cursor="not-a-token",
+                )
+
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertTrue(conn.closed)
+        self.assertIsNone(conn.query)
+
+
+if __name__ == "__main__":
+    unittest.main()
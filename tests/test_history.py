@@ -0,0 +1,154 @@
+import sys
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from fastapi import HTTPException
+
+from routers import history as history_module
+
+
+class HistoryCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.query = None
+        self.params = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params):
+        self.query = " ".join(query.split())
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+
+class HistoryConnection:
+    def __init__(self, rows):
+        self.cursor_instance = HistoryCursor(rows)
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_instance
+
+    def close(self):
+        self.closed = True
+
+
+class HistoryTests(unittest.TestCase):
+    def setUp(self):
+        history_module._cache.clear()
+        self.now = datetime(2026, 7, 24, 12, 30, tzinfo=timezone.utc)
+
+    def hourly_rows(self, hours):
+        start = datetime(2026, 7, 24, 13, tzinfo=timezone.utc) - timedelta(
+            days=1
+        )
+        return [
+            (start + timedelta(hours=hour), 20.0 * (hour % 2 + 1), 2, 8, 30)
+            for hour in range(hours)
+        ]
+
+    def test_station_history_is_one_range_scan_in_columnar_layout(self):
+        conn = HistoryConnection(self.hourly_rows(3))
+
+        result = history_module.load_history(
+            conn, "station", (17,), "hourly", 1, ("pm10",), now=self.now
+        )
+
+        cursor = conn.cursor_instance
+        self.assertIn("FROM air.measurements_hourly r", cursor.query)
+        self.assertIn("WHERE r.station_id = %s", cursor.query)
+        self.assertEqual(cursor.params[0], 17)
+        self.assertEqual(result["step_seconds"], 3600)
+        self.assertEqual(len(result["t"]), 3)
+        self.assertEqual(result["series"]["pm10"]["mean"], [10.0, 20.0, 10.0])
+        self.assertEqual(result["series"]["pm10"]["count"], [2, 2, 2])
+
+    def test_downsampling_merges_exact_aggregates(self):
+        conn = HistoryConnection(self.hourly_rows(24))
+
+        result = history_module.load_history(
+            conn,
+            "station",
+            (17,),
+            "hourly",
+            1,
+            ("pm10",),
+            points=12,
+            now=self.now,
+        )
+
+        pm10 = result["series"]["pm10"]
+        self.assertEqual(result["step_seconds"], 7200)
+        self.assertEqual(len(result["t"]), 12)
+        self.assertEqual(pm10["mean"][0], 15.0)
+        self.assertEqual(pm10["count"][0], 4)
+        self.assertEqual((pm10["min"][0], pm10["max"][0]), (8, 30))
+
+    def test_region_history_filters_by_stored_region_codes(self):
+        conn = HistoryConnection(
+            [(date(2026, 7, 20), 100.0, 4, 10, 40, 60.0, 4, 5, 20)]
+        )
+
+        result = history_module.load_history(
+            conn,
+            "sigungu",
+            ("41110", "41119"),
+            "daily",
+            30,
+            ("pm10", "pm25"),
+            now=self.now,
+        )
+
+        cursor = conn.cursor_instance
+        self.assertIn("s.sigungu_code BETWEEN %s AND %s", cursor.query)
+        self.assertIn("GROUP BY r.day", cursor.query)
+        self.assertEqual(cursor.params[2:], ("41110", "41119"))
+        self.assertEqual(result["series"]["pm25"]["mean"], [15.0])
+
+    def test_history_requires_exactly_one_scope(self):
+        with self.assertRaises(HTTPException) as raised:
+            history_module.history(
+                station_id=1,
+                region_level="sido",
+                region_code="11",
+                days=7,
+                resolution="auto",
+                points=None,
+                pollutants="pm10",
+            )
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_long_windows_default_to_daily_rollups(self):
+        conn = HistoryConnection([])
+        with patch.object(
+            history_module.db, "get_db_connection", return_value=conn
+        ):
+            body = history_module.history(
+                station_id=5,
+                region_level=None,
+                region_code=None,
+                days=90,
+                resolution="auto",
+                points=None,
+                pollutants="pm25",
+            )
+
+        self.assertEqual(body["resolution"], "daily")
+        self.assertIn("air.measurements_daily", conn.cursor_instance.query)
+        self.assertTrue(conn.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
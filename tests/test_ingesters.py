@@ -1,19 +1,46 @@
+import os
 import sys
 import unittest
 from unittest.mock import patch
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from pathlib import Path
 
+import psycopg2.pool
+
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT_DIR))
 
+import ingest_all
 import ingest_waqi
+import rollup_measurements
 import airkorea_common
 import ingest_airkorea
+import ingest_common
+import ingest_firms
+import ingest_kma_csv
+import ingest_openaq
+import ingest_owm
+import sync_admin_boundaries
 import sync_airkorea_stations
 
 
+class FakePoolConnection:
+    closed = False
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def getconn(self):
+        return FakePoolConnection()
+
+    def putconn(self, conn, close=False):
+        pass
+
+
 class IngesterTests(unittest.TestCase):
     def test_waqi_time_prefers_timezone_aware_iso_over_epoch(self):
         parsed = ingest_waqi.parse_waqi_ts(
@@ -29,20 +56,112 @@ class IngesterTests(unittest.TestCase):
         self.assertEqual(parsed.utcoffset(), timedelta(hours=9))
 
     def test_job_keeps_firms_optional_and_runs_cleanup_last(self):
-        script = (ROOT_DIR / "ingest-all.sh").read_text(encoding="utf-8")
+        calls = []
+
+        def provider(name, fail=False):
+            def run(conn, session):
+                calls.append(name)
+                if fail:
+                    raise RuntimeError(f"{name} offline")
+                return 3
+            return run
+
+        def cleanup(conn):
+            calls.append("CLEANUP")
+            return 0
+
+        providers = (
+            ("WAQI", provider("WAQI"), True),
+            ("FIRMS", provider("FIRMS", fail=True), False),
+        )
+        core_success, core_failure = ingest_all.run_all(
+            FakePool(),
+            None,
+            providers=providers,
+            cleanup=cleanup,
+            regions=lambda conn: calls.append("REGIONS"),
+            rollup=lambda conn: calls.append("ROLLUP"),
+            raster=lambda conn: calls.append("RASTER"),
+            summaries=lambda conn: calls.append("SUMMARIES"),
+        )
+
+        self.assertEqual(
+            calls[-5:],
+            ["REGIONS", "ROLLUP", "RASTER", "SUMMARIES", "CLEANUP"],
+        )
+        self.assertEqual((core_success, core_failure), (1, 0))
+        self.assertEqual(
+            dict((name, core) for name, _, core in ingest_all.PROVIDERS)[
+                "FIRMS"
+            ],
+            False,
+        )
+
+    def test_core_failure_fails_the_combined_job(self):
+        def failing(conn, session):
+            raise RuntimeError("WAQI inserted no PM observations")
+
+        core_success, core_failure = ingest_all.run_all(
+            FakePool(),
+            None,
+            providers=(("WAQI", failing, True),),
+            cleanup=lambda conn: 0,
+            regions=lambda conn: 0,
+            rollup=lambda conn: 0,
+            raster=lambda conn: 0,
+            summaries=lambda conn: 0,
+        )
+
+        self.assertEqual((core_success, core_failure), (0, 1))
+
+    def test_failed_checkout_fails_only_that_step(self):
+        class ExhaustedPool(FakePool):
+            def getconn(self):
+                raise psycopg2.pool.PoolError("connection pool exhausted")
+
+            def putconn(self, conn, close=False):
+                raise AssertionError("nothing was checked out")
+
+        result = ingest_all.run_step(
+            ExhaustedPool(), "ROLLUP", lambda conn: 1
+        )
+
+        self.assertFalse(result["ok"])
+        self.assertIsInstance(result["error"], psycopg2.pool.PoolError)
 
-        firms = script.index('run_optional "FIRMS"')
-        cleanup = script.index("python /app/cleanup_measurements.py")
-        success_check = script.index("if (( core_success == 0 ))")
-        self.assertLess(firms, cleanup)
-        self.assertLess(cleanup, success_check)
-        self.assertNotIn('run_core "FIRMS"', script)
+    def test_waqi_archive_ignores_fields_that_change_every_poll(self):
+        data = {
+            "idx": 5508,
+            "iaqi": {"pm10": {"v": 31}, "pm25": {"v": 14}},
+            "time": {"iso": "2026-07-24T12:00:00+09:00"},
+            "forecast": {"daily": {"pm10": [{"avg": 30}]}},
+            "debug": {"sync": "2026-07-24T12:05:01+09:00"},
+        }
+        repolled = dict(
+            data,
+            forecast={"daily": {"pm10": [{"avg": 33}]}},
+            debug={"sync": "2026-07-24T12:35:44+09:00"},
+        )
+
+        archived = ingest_waqi.archived_payload(data)
+
+        self.assertNotIn("forecast", archived)
+        self.assertEqual(
+            ingest_common.payload_digest("WAQI", archived),
+            ingest_common.payload_digest(
+                "WAQI", ingest_waqi.archived_payload(repolled)
+            ),
+        )
 
     def test_combined_job_keeps_waqi_on_its_own_schedule(self):
-        script = (ROOT_DIR / "ingest-all.sh").read_text(encoding="utf-8")
+        providers = {name: core for name, _, core in ingest_all.PROVIDERS}
 
-        self.assertIn('run_core "WAQI" "ingest_waqi.py"', script)
-        self.assertNotIn('run_core "AIRKOREA"', script)
+        self.assertTrue(providers["WAQI"])
+        self.assertNotIn("AIRKOREA", providers)
+        self.assertIn(
+            "ingest_all.py",
+            (ROOT_DIR / "ingest-all.sh").read_text(encoding="utf-8"),
+        )
 
     def test_airkorea_targets_all_regions_in_configured_tiers(self):
         self.assertEqual(
@@ -89,6 +208,111 @@ class IngesterTests(unittest.TestCase):
             )
         )
 
+    def test_station_sync_classifies_stored_rows_before_writing(self):
+        stored = {
+            "name": "송도",
+            "city": "인천",
+            "address": "인천 연수구",
+            "lat": Decimal("37.38"),
+            "lon": Decimal("126.65"),
+            "has_geom": True,
+        }
+        fetched = {
+            "name": "송도",
+            "city": "인천",
+            "address": "인천 연수구",
+            "lat": 37.38,
+            "lon": 126.65,
+        }
+        changes = sync_airkorea_stations.station_changes
+
+        self.assertEqual(changes(stored, fetched), "unchanged")
+        self.assertEqual(changes(None, fetched), "new")
+        self.assertEqual(changes(stored, dict(fetched, lat=37.39)), "moved")
+        self.assertEqual(
+            changes(dict(stored, has_geom=False), fetched), "moved"
+        )
+        self.assertEqual(
+            changes(stored, dict(fetched, address="인천 연수구 송도동")),
+            "renamed",
+        )
+
+    def test_rollup_recomputes_the_hours_ingesters_marked(self):
+        class RollupCursor:
+            rowcount = 3
+
+            def __init__(self):
+                self.executed = []
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def execute(self, sql, params=None):
+                self.executed.append((" ".join(sql.split()), params))
+
+        class RollupConnection:
+            def __init__(self):
+                self.cursor_instance = RollupCursor()
+
+            def cursor(self):
+                return self.cursor_instance
+
+            def commit(self):
+                pass
+
+        def refresh(watermarks):
+            conn = RollupConnection()
+            with patch.object(
+                rollup_measurements,
+                "load_watermarks",
+                return_value=watermarks,
+            ), patch.object(
+                rollup_measurements, "save_watermarks"
+            ) as save, patch.dict(
+                os.environ, {"MEASUREMENT_RETENTION_HOURS": "72"}
+            ):
+                counts = rollup_measurements.refresh_rollups(conn, now=now)
+            return conn.cursor_instance.executed, counts, save
+
+        now = datetime(2026, 7, 24, 12, 40, tzinfo=timezone.utc)
+        executed, counts, save = refresh(
+            {"hourly": now - timedelta(hours=1), "backfill": now}
+        )
+
+        claim, (_, claim_params), (hourly_sql, hourly_params), daily = (
+            executed
+        )
+        self.assertEqual(counts, (3, 3))
+        self.assertIn("CREATE TEMP TABLE rollup_claimed", claim[0])
+        self.assertEqual(claim_params, {"now": now})
+        self.assertIn(
+            "FROM rollup_claimed c JOIN air.measurements m", hourly_sql
+        )
+        self.assertIn("IS DISTINCT FROM", hourly_sql)
+        self.assertEqual(
+            hourly_params,
+            {"horizon": now - timedelta(hours=72), "now": now},
+        )
+        self.assertIn("FOR UPDATE SKIP LOCKED", executed[1][0])
+        self.assertIn("SUM(pm25_count)", daily[0])
+        self.assertIn("FROM rollup_claimed", daily[0])
+        self.assertEqual(
+            save.call_args.args[2], {"hourly": now, "backfill": now}
+        )
+
+        # The first run marks every hour still held as raw rows.
+        executed, _, _ = refresh({"hourly": now - timedelta(hours=1)})
+
+        self.assertEqual(len(executed), 5)
+        self.assertIn(
+            "SELECT DISTINCT station_id, date_trunc('hour', ts) "
+            "FROM air.measurements",
+            executed[0][0],
+        )
+
     def test_station_external_code_normalizes_whitespace(self):
         self.assertEqual(
             airkorea_common.station_external_code("인천", " 송도  "),
@@ -162,3 +386,415 @@ class IngesterTests(unittest.TestCase):
             script.index("python /app/cleanup_measurements.py"),
         )
         self.assertIn("RUN_RETENTION_CLEANUP", script)
+
+    def test_airkorea_hourly_rebuilds_the_raster_its_commit_retires(self):
+        script = (ROOT_DIR / "airkorea-hourly.sh").read_text(
+            encoding="utf-8"
+        )
+        self.assertLess(
+            script.index("python /app/rollup_measurements.py"),
+            script.index("python /app/build_selection_raster.py"),
+        )
+
+    def test_owm_forecast_entry_replaces_repeated_current_hour(self):
+        current = {
+            "list": [
+                {"dt": 1784923200, "components": {"pm10": 10, "pm2_5": 5}}
+            ]
+        }
+        forecast = {
+            "list": [
+                {"dt": 1784923200, "components": {"pm10": 12, "pm2_5": 6}},
+                {"dt": 1784926800, "components": {"pm10": 14, "pm2_5": 7}},
+            ]
+        }
+
+        rows = ingest_owm.measurement_rows(3, current, forecast)
+
+        self.assertEqual([row[2] for row in rows], [12, 14])
+        self.assertEqual(rows[0][1].utcoffset(), timedelta(0))
+
+    def test_raw_payload_archive_stores_each_distinct_payload_once(self):
+        payload = {"aqi": 41, "iaqi": {"pm25": {"v": 12}}}
+        reordered = {"iaqi": {"pm25": {"v": 12}}, "aqi": 41}
+        digest = ingest_common.payload_digest("WAQI", payload)
+        with patch.object(
+            ingest_common, "execute_values", return_value=[(digest, 7)]
+        ) as execute_values:
+            ids = ingest_common.archive_raw_payloads(
+                object(), "WAQI", [payload, None, reordered]
+            )
+
+        self.assertEqual(ids, [7, None, 7])
+        self.assertEqual(len(execute_values.call_args.args[2]), 1)
+        self.assertNotEqual(
+            digest, ingest_common.payload_digest("OWM", payload)
+        )
+
+    def test_owm_upsert_counts_unchanged_forecast_rows(self):
+        rows = [(3, None, 1, 1, "{}")] * 4
+        with patch.object(
+            ingest_owm,
+            "execute_values",
+            return_value=[(True,), (False,)],
+        ) as execute_values:
+            counts = ingest_owm.upsert_measurements(object(), 9, rows)
+
+        self.assertEqual(counts, (1, 1, 2))
+        self.assertEqual(execute_values.call_count, 1)
+        query = " ".join(execute_values.call_args.args[1].split())
+        self.assertIn("IS DISTINCT FROM", query)
+        self.assertNotIn("SELECT id FROM air.sources", query)
+
+    def test_airkorea_upsert_skips_unchanged_hours(self):
+        rows = [(5, None, 30, 12, 1, 1, 8)] * 3
+        with patch.object(
+            ingest_airkorea, "execute_values", return_value=[(False,)]
+        ) as execute_values:
+            counts = ingest_airkorea.upsert_measurements(object(), rows)
+
+        self.assertEqual(counts, (0, 1, 2))
+        query = " ".join(execute_values.call_args.args[1].split())
+        self.assertIn("IS DISTINCT FROM", query)
+        self.assertIn("RETURNING (xmax = 0)", query)
+
+    def test_openaq_reads_past_pages_without_new_results(self):
+        watermark = datetime(2026, 7, 24, 10, tzinfo=timezone.utc)
+
+        def result(location, hour):
+            return {
+                "location": location,
+                "parameter": "pm25",
+                "value": 12,
+                "date": {"utc": f"2026-07-24T{hour:02d}:00:00Z"},
+            }
+
+        pages = {
+            1: [result("Jung-gu", 9), result("Jung-gu", 10)],
+            2: [result("Mapo-gu", 10), result("Jung-gu", 11)],
+            3: [result("Jung-gu", 12)],
+        }
+        requested = []
+
+        def fetch_page(session, page, date_from):
+            requested.append(page)
+            return pages[page]
+
+        walk = {}
+        with (
+            patch.object(ingest_openaq, "PAGE_SIZE", 2),
+            patch.object(ingest_openaq, "fetch_page", new=fetch_page),
+        ):
+            fresh = list(
+                ingest_openaq.iter_fresh_pages(
+                    None, {"Jung-gu": watermark}, watermark, walk
+                )
+            )
+
+        self.assertEqual(requested, [1, 2, 3])
+        self.assertEqual([len(page) for page in fresh], [2, 1])
+        self.assertFalse(walk["truncated"])
+
+    def test_openaq_backlog_beyond_max_pages_is_ingested_over_runs(self):
+        start = datetime.now(timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        ) - timedelta(hours=10)
+        backlog = sorted(
+            (
+                {
+                    "location": location,
+                    "parameter": "pm25",
+                    "value": 12,
+                    "date": {
+                        "utc": (start + timedelta(hours=hour)).isoformat()
+                    },
+                }
+                for hour in range(10)
+                for location in ("Jung-gu", "Mapo-gu")
+            ),
+            key=lambda result: result["date"]["utc"],
+        )
+
+        def fetch_page(session, page, date_from):
+            matching = [
+                result for result in backlog
+                if datetime.fromisoformat(result["date"]["utc"]) >= date_from
+            ]
+            return matching[(page - 1) * 2:page * 2]
+
+        stored = {}
+
+        def save_watermarks(cur, provider, watermarks):
+            for scope, value in watermarks.items():
+                stored[scope] = max(value, stored.get(scope, value))
+
+        written = set()
+
+        def write_page(cur, source_id, results):
+            written.update((r["location"], r["ts"]) for r in results)
+            return len(results), 0, 0
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def execute(self, sql, params=None):
+                pass
+
+            def fetchone(self):
+                return (1,)
+
+        class Connection:
+            def cursor(self):
+                return Cursor()
+
+            def commit(self):
+                pass
+
+        with (
+            patch.object(ingest_openaq, "PAGE_SIZE", 2),
+            patch.object(ingest_openaq, "MAX_PAGES", 6),
+            patch.object(ingest_openaq, "fetch_page", new=fetch_page),
+            patch.object(ingest_openaq, "ensure_watermark_table"),
+            patch.object(
+                ingest_openaq,
+                "load_watermarks",
+                new=lambda cur, provider: dict(stored),
+            ),
+            patch.object(
+                ingest_openaq, "save_watermarks", new=save_watermarks
+            ),
+            patch.object(ingest_openaq, "write_page", new=write_page),
+            patch.object(ingest_openaq, "record_ingest_commit"),
+        ):
+            ingest_openaq.main(Connection(), session=object())
+            first_run = len(written)
+            ingest_openaq.main(Connection(), session=object())
+
+        self.assertEqual(first_run, 12)
+        self.assertEqual(len(written), len(backlog))
+
+    def test_openaq_merges_parameters_into_one_row_per_hour(self):
+        ts = datetime(2026, 7, 24, 10, tzinfo=timezone.utc)
+        results = [
+            {"location": "A", "ts": ts, "pollutant": "pm10",
+             "value": 30, "raw": {"p": "pm10"}},
+            {"location": "A", "ts": ts, "pollutant": "pm25",
+             "value": 15, "raw": {"p": "pm25"}},
+        ]
+
+        merged = ingest_openaq.merge_measurements(results)
+
+        self.assertEqual(list(merged), [("A", ts)])
+        self.assertEqual(merged[("A", ts)]["pm10"], 30)
+        self.assertEqual(merged[("A", ts)]["pm25"], 15)
+        self.assertEqual(len(merged[("A", ts)]["raw"]), 2)
+
+    def test_firms_rows_outside_bbox_are_dropped_while_reading(self):
+        inside = {
+            "latitude": "37.5",
+            "longitude": "127.0",
+            "acq_date": "2026-07-24",
+            "acq_time": "0412",
+            "satellite": "N",
+            "frp": "3.5",
+        }
+        outside = {**inside, "latitude": "-12.0", "longitude": "131.0"}
+
+        rows = list(ingest_firms.iter_feed_rows(iter([inside, outside])))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][:4], ("2026-07-24 04:12:00", 37.5, 127.0, "N"))
+        self.assertEqual(rows[0][5], 3.5)
+
+    def test_firms_copies_staged_rows_in_bounded_batches(self):
+        class CopyCursor:
+            def __init__(self):
+                self.batches = []
+
+            def copy_expert(self, sql, buffer):
+                self.sql = sql
+                self.batches.append(len(buffer.read().splitlines()))
+
+        cursor = CopyCursor()
+        rows = [("2026-07-24 04:12:00", 37.5, 127.0, "N", None, None, "{}")]
+        with patch.object(ingest_firms, "COPY_BATCH_ROWS", 2):
+            staged = ingest_firms.stage_rows(cursor, iter(rows * 5))
+
+        self.assertEqual(staged, 5)
+        self.assertEqual(cursor.batches, [2, 2, 1])
+        self.assertIn("COPY fire_stage(", cursor.sql)
+
+    def test_boundary_import_copies_features_and_merges_once(self):
+        class BoundaryCursor:
+            rowcount = 2
+
+            def __init__(self):
+                self.batches = []
+                self.queries = []
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def execute(self, sql, params=None):
+                self.queries.append(" ".join(sql.split()))
+
+            def copy_expert(self, sql, buffer):
+                self.batches.append(len(buffer.read().splitlines()))
+
+        class BoundaryConnection:
+            def __init__(self):
+                self.cursor_instance = BoundaryCursor()
+
+            def cursor(self):
+                return self.cursor_instance
+
+            def commit(self):
+                pass
+
+        feature = {
+            "code": "28185",
+            "name": "연수구",
+            "full_name": "인천광역시 연수구",
+            "parent_code": "28",
+            "wkb_hex": "0106000020E6100000",
+        }
+        conn = BoundaryConnection()
+        with patch.object(sync_admin_boundaries, "COPY_BATCH_ROWS", 2):
+            counts = sync_admin_boundaries.import_boundaries(
+                conn, iter([feature] * 3)
+            )
+
+        cursor = conn.cursor_instance
+        self.assertEqual(counts, (3, 2))
+        self.assertEqual(cursor.batches, [2, 1])
+        self.assertEqual(
+            sum("ST_MakeValid" in query for query in cursor.queries), 1
+        )
+
+    def test_station_region_changes_are_announced_to_the_api(self):
+        class MappingCursor:
+            def __init__(self, rowcount):
+                self.rowcount = rowcount
+                self.queries = []
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def execute(self, sql, params=None):
+                self.queries.append((" ".join(sql.split()), params))
+
+            def fetchone(self):
+                return (0,)
+
+        class MappingConnection:
+            def __init__(self, rowcount):
+                self.cursor_instance = MappingCursor(rowcount)
+                self.commits = 0
+
+            def cursor(self):
+                return self.cursor_instance
+
+            def commit(self):
+                self.commits += 1
+
+        def notified(conn):
+            return [
+                params for sql, params in conn.cursor_instance.queries
+                if "pg_notify" in sql
+            ]
+
+        def written_ids(cur, sql, rows, **kwargs):
+            return [(row[0], 40 + index) for index, row in enumerate(rows)]
+
+        items = [
+            {"stationName": "송도", "dmX": "37.38", "dmY": "126.65"},
+            {"stationName": "연희", "dmX": "37.55", "dmY": "126.67"},
+        ]
+        stations = MappingConnection(rowcount=2)
+        with (
+            patch.object(
+                sync_airkorea_stations,
+                "station_belongs_to_region",
+                return_value=True,
+            ),
+            patch.object(
+                sync_airkorea_stations,
+                "load_existing_stations",
+                return_value={},
+            ),
+            patch.object(
+                sync_airkorea_stations, "execute_values", new=written_ids
+            ),
+        ):
+            counts, remapped, _, _ = sync_airkorea_stations.upsert_stations(
+                stations, "인천", items
+            )
+        boundaries = MappingConnection(rowcount=5)
+        sync_admin_boundaries.map_stations(boundaries)
+
+        self.assertEqual((counts["new"], remapped), (2, 2))
+        # Station rows and their region codes commit together.
+        self.assertEqual(stations.commits, 1)
+        queries = [sql for sql, _ in stations.cursor_instance.queries]
+        remap_at = next(
+            i for i, sql in enumerate(queries)
+            if sql.startswith("WITH mapped")
+        )
+        notify_at = [i for i, sql in enumerate(queries) if "pg_notify" in sql]
+        self.assertLess(notify_at[0], remap_at)
+        self.assertLess(remap_at, notify_at[1])
+        for event in notified(stations):
+            self.assertEqual(event["source"], "AIRKOREA_STATIONS")
+            self.assertEqual(event["stations"], [40, 41])
+        (event,) = notified(boundaries)
+        self.assertEqual(event["kind"], "ingest")
+        self.assertIsNone(event["stations"])
+
+    def test_kma_columns_are_resolved_once_from_the_header(self):
+        header = ["측정일시", "측정소명", "PM10", "PM2.5", "기타"]
+
+        mapping = ingest_kma_csv.resolve_columns(header)
+        staged, skipped = ingest_kma_csv.parse_chunk(
+            header,
+            mapping,
+            40,
+            [
+                ["2024-01-01 01:00", "종로구", "20㎍/m3", "-", "x"],
+                ["bad", "종로구", "1", "1", "x"],
+            ],
+        )
+
+        self.assertEqual(mapping["station"], 1)
+        self.assertEqual(mapping["pm25"], 3)
+        self.assertIsNone(mapping["g10"])
+        self.assertEqual(skipped, 1)
+        self.assertEqual(
+            staged[0][:5], (40, "종로구", "2024-01-01 01:00:00", 20, None)
+        )
+
+    def test_kma_chunks_keep_file_order_and_line_numbers(self):
+        rows = [["2024-01-01 01:00", f"s{index}"] for index in range(5)]
+        mapping = ingest_kma_csv.resolve_columns(["일시", "지점명"])
+
+        with patch.object(ingest_kma_csv, "CHUNK_ROWS", 2):
+            chunks = list(
+                ingest_kma_csv.iter_parsed_chunks(
+                    iter(rows), ["일시", "지점명"], mapping, workers=1
+                )
+            )
+
+        self.assertEqual([count for count, _, _ in chunks], [2, 2, 1])
+        self.assertEqual(
+            [row[0] for _, staged, _ in chunks for row in staged],
+            [0, 1, 2, 3, 4],
+        )
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import socket
+import sys
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+APP_DIR = ROOT_DIR / "app"
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(APP_DIR))
+
+import ingest_common
+import invalidation
+import main
+import selection_raster
+from routers import tiles as tiles_module
+
+
+def _event(**fields):
+    return {**invalidation.CATCH_ALL, **fields}
+
+
+def tearDownModule():
+    # Dispatched events reach every registered handler.
+    selection_raster._state.update(raster=None, checked_at=0.0)
+    tiles_module._data_version.update(value=None, expires=0.0)
+
+
+class Notify:
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class ListenConnection:
+    """A connection whose notifications arrive through a socket pair."""
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.autocommit = False
+        self.notifies = []
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return RecordingCursor(self.queries)
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def send(self, payload):
+        self.writer.send(json.dumps(payload).encode() + b"\n")
+
+    def poll(self):
+        for line in self.reader.recv(65536).splitlines():
+            self.notifies.append(Notify(line.decode()))
+
+    def close(self):
+        self.closed = True
+        self.reader.close()
+        self.writer.close()
+
+
+class RecordingCursor:
+    description = None
+
+    def __init__(self, queries, row=None):
+        self.queries = queries
+        self.row = row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchone(self):
+        return self.row
+
+
+class RowConnection:
+    def __init__(self, row):
+        self.row = row
+        self.queries = []
+
+    def cursor(self):
+        return RecordingCursor(self.queries, self.row)
+
+    def close(self):
+        pass
+
+
+class ListenerTests(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+
+    def test_listener_dispatches_a_catch_all_then_notifications(self):
+        conn = ListenConnection()
+        received = threading.Event()
+
+        def record(event):
+            self.events.append(event)
+            if len(self.events) == 2:
+                received.set()
+
+        listener = invalidation.Listener(
+            connect=lambda: conn, retry_seconds=0.01
+        )
+        with patch.object(invalidation, "POLL_SECONDS", 0.01), patch.object(
+            invalidation, "_handlers", [record]
+        ):
+            listener.start()
+            conn.send({"kind": "ingest", "source": "WAQI", "stations": [7]})
+            self.assertTrue(received.wait(2))
+            self.assertTrue(invalidation.listening())
+            listener.stop()
+            listener.join(2)
+
+        self.assertTrue(conn.autocommit)
+        self.assertEqual(conn.queries[0][0], "LISTEN hudadak_ingest")
+        self.assertEqual(self.events[0], invalidation.CATCH_ALL)
+        self.assertEqual(self.events[1]["source"], "WAQI")
+        self.assertIsNone(self.events[1]["bbox"])
+        self.assertFalse(invalidation.listening())
+        self.assertTrue(conn.closed)
+
+    def test_failing_handler_does_not_stop_the_others(self):
+        def broken(event):
+            raise RuntimeError("boom")
+
+        with patch.object(
+            invalidation, "_handlers", [broken, self.events.append]
+        ):
+            invalidation.dispatch(invalidation.parse("not json"))
+
+        self.assertEqual(self.events, [invalidation.CATCH_ALL])
+
+    def test_rechecks_stretch_only_while_listening(self):
+        with patch.dict(invalidation._state, listening=False):
+            self.assertEqual(invalidation.check_interval(10), 10)
+        with patch.dict(invalidation._state, listening=True):
+            self.assertEqual(invalidation.check_interval(10), 300)
+
+
+class HandlerTests(unittest.TestCase):
+    def test_ingest_event_rereads_the_tile_version(self):
+        tiles_module._data_version.update(value=7, expires=1e12)
+
+        invalidation.dispatch(_event(kind="summaries"))
+        self.assertEqual(tiles_module._data_version["value"], 7)
+        invalidation.dispatch(_event(kind="ingest", stations=None))
+
+        self.assertIsNone(tiles_module._data_version["value"])
+
+    def test_ingest_event_retires_the_selection_raster(self):
+        self.addCleanup(
+            selection_raster._state.update, raster=None, checked_at=0.0
+        )
+        selection_raster._state.update(raster=object(), checked_at=0.0)
+
+        invalidation.dispatch(_event(kind="ingest"))
+
+        self.assertIsNone(selection_raster._state["raster"])
+        self.assertGreater(selection_raster._state["checked_at"], 0)
+
+
+class AnswerCacheTests(unittest.TestCase):
+    def setUp(self):
+        main._answers.clear()
+        self.addCleanup(main._answers.clear)
+        listening = patch.dict(invalidation._state, listening=True)
+        listening.start()
+        self.addCleanup(listening.stop)
+        observed = datetime.now(timezone.utc) - timedelta(minutes=30)
+        self.conn = RowConnection(
+            {
+                "pm10": 31.0,
+                "pm10_station_id": 11,
+                "pm10_provider": "AIRKOREA",
+                "pm10_display_ts": observed,
+                "pm25": 14.0,
+                "pm25_station_id": 11,
+                "pm25_provider": "AIRKOREA",
+                "pm25_display_ts": observed,
+            }
+        )
+
+    def nearest(self):
+        with patch.object(main, "get_db_connection", return_value=self.conn):
+            return asyncio.run(main.nearest(lat=37.57, lon=126.98))
+
+    def queries(self):
+        return [
+            query for query, _ in self.conn.queries
+            if "statement_timeout" not in query
+        ]
+
+    def test_repeated_lookup_is_answered_from_the_cache(self):
+        first = self.nearest()
+        second = self.nearest()
+
+        self.assertEqual(len(self.queries()), 1)
+        self.assertEqual(second["pm10"], first["pm10"])
+        self.assertEqual(second["pm10_meta"]["station_id"], 11)
+
+    def test_only_commits_near_the_point_drop_the_answer(self):
+        self.nearest()
+
+        invalidation.dispatch(
+            _event(kind="ingest", stations=[5],
+                   bbox=[35.1, 129.0, 35.2, 129.1])
+        )
+        self.nearest()
+        self.assertEqual(len(self.queries()), 1)
+
+        invalidation.dispatch(
+            _event(kind="ingest", stations=[6],
+                   bbox=[37.6, 127.2, 37.7, 127.3])
+        )
+        self.nearest()
+        self.assertEqual(len(self.queries()), 2)
+
+    def test_answers_are_not_cached_without_the_listener(self):
+        with patch.dict(invalidation._state, listening=False):
+            self.nearest()
+            self.nearest()
+
+        self.assertEqual(len(self.queries()), 2)
+        self.assertEqual(len(main._answers), 0)
+
+    def test_search_answers_follow_their_region(self):
+        key = ("search", "sigungu", "41110", False, 37.3, 127.0)
+        main._store_answer(key, {})
+
+        invalidation.dispatch(
+            _event(kind="ingest", stations=[1], sido=["41"],
+                   sigungu=["41135"], bbox=[37.4, 127.1, 37.4, 127.1])
+        )
+        self.assertEqual(main._answers.get(key), {})
+        invalidation.dispatch(
+            _event(kind="ingest", stations=[2], sido=["41"],
+                   sigungu=["41113"], bbox=[37.3, 127.0, 37.3, 127.0])
+        )
+
+        self.assertIsNone(main._answers.get(key))
+
+
+class NotifyTests(unittest.TestCase):
+    def test_commit_notifies_its_stations(self):
+        queries = []
+
+        ingest_common.record_ingest_commit(
+            RecordingCursor(queries), "WAQI", [9, 3, 9]
+        )
+
+        query, params = queries[-1]
+        self.assertIn("pg_notify", query)
+        self.assertEqual(params["channel"], invalidation.CHANNEL)
+        self.assertEqual(params["kind"], "ingest")
+        self.assertEqual(params["stations"], [3, 9])
+
+    def test_large_station_sets_notify_everything(self):
+        queries = []
+
+        ingest_common.notify_change(
+            RecordingCursor(queries),
+            "ingest",
+            "AIRKOREA",
+            range(ingest_common.NOTIFY_MAX_STATIONS + 1),
+        )
+
+        self.assertIsNone(queries[0][1]["stations"])
+
+
+if __name__ == "__main__":
+    unittest.main()
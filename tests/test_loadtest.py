@@ -0,0 +1,112 @@
+import asyncio
+import os
+import random
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import httpx
+from fastapi.testclient import TestClient
+
+from loadtest import fake_upstream, run_load
+
+
+class PercentileTests(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(run_load.percentile(values, 0.50), 50)
+        self.assertEqual(run_load.percentile(values, 0.99), 99)
+        self.assertEqual(run_load.percentile([7], 0.95), 7)
+        self.assertIsNone(run_load.percentile([], 0.5))
+
+
+class FakeUpstreamTests(unittest.TestCase):
+    def setUp(self):
+        env = {"FAKE_LATENCY_MS": "0", "FAKE_JITTER_MS": "0"}
+        patcher = patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(fake_upstream.app)
+
+    def test_air_quality_is_deterministic_hourly_series(self):
+        params = {
+            "latitude": 37.5,
+            "longitude": 127.0,
+            "hourly": "pm10,pm2_5",
+        }
+        first = self.client.get("/v1/air-quality", params=params).json()
+        second = self.client.get("/v1/air-quality", params=params).json()
+
+        hourly = first["hourly"]
+        self.assertEqual(len(hourly["time"]), 120)
+        self.assertEqual(len(hourly["pm2_5"]), 120)
+        self.assertEqual(first, second)
+
+    def test_error_rate_injects_failures(self):
+        with patch.dict(os.environ, {"FAKE_ERROR_RATE": "1"}):
+            response = self.client.get(
+                "/v2/local/search/address.json", params={"query": "제주시"}
+            )
+
+        self.assertEqual(response.status_code, 429)
+
+    def test_address_returns_legal_code(self):
+        body = self.client.get(
+            "/v2/local/search/address.json",
+            params={"query": "서울 강남구 역삼동"},
+        ).json()
+
+        self.assertEqual(body["documents"][0]["address"]["b_code"][:5], "11680")
+
+
+class RunLoadTests(unittest.TestCase):
+    def test_schedule_reports_each_endpoint(self):
+        mix = (
+            run_load.RequestSpec(
+                "air quality",
+                3,
+                lambda rng: (
+                    "/v1/air-quality",
+                    {"latitude": 37.5, "longitude": 127.0, "hourly": "pm10"},
+                ),
+            ),
+            run_load.RequestSpec(
+                "missing", 1, lambda rng: ("/does-not-exist", {})
+            ),
+        )
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=fake_upstream.app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://fake"
+            ) as client:
+                return await run_load.run_load(
+                    client, rps=400, duration=0.1, mix=mix,
+                    rng=random.Random(1),
+                )
+
+        with patch.dict(os.environ, {"FAKE_LATENCY_MS": "0"}):
+            results, elapsed = asyncio.run(scenario())
+
+        rows = {row["endpoint"]: row for row in results.summary(elapsed)}
+        self.assertEqual(
+            rows["air quality"]["requests"] + rows["missing"]["requests"], 40
+        )
+        self.assertEqual(
+            rows["air quality"]["ok"], rows["air quality"]["requests"]
+        )
+        self.assertEqual(
+            rows["missing"]["client_4xx"], rows["missing"]["requests"]
+        )
+        self.assertIsNotNone(rows["air quality"]["p99_ms"])
+        self.assertIn("p95", run_load.format_table(list(rows.values())))
+
+
+if __name__ == "__main__":
+    unittest.main()
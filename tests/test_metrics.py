@@ -0,0 +1,88 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+
+
+class HistogramTests(unittest.TestCase):
+    def test_buckets_are_cumulative_per_label_set(self):
+        histogram = metrics.Histogram(
+            "test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0)
+        )
+        histogram.observe(0.05, stage="db")
+        histogram.observe(0.5, stage="db")
+        histogram.observe(3.0, stage="db")
+
+        lines = histogram.render()
+
+        self.assertIn('test_seconds_bucket{stage="db",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="db",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="db",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{stage="db"} 3', lines)
+
+    def test_stage_outside_a_request_is_a_no_op(self):
+        with metrics.stage("orphan"):
+            pass
+        metrics.set_labels(source="db")
+
+
+class MiddlewareTests(unittest.TestCase):
+    def test_stages_become_server_timing_and_histograms(self):
+        app = FastAPI(default_response_class=metrics.TimedJSONResponse)
+        app.add_middleware(metrics.MetricsMiddleware)
+
+        @app.get("/probe/{item}")
+        def probe(item: str):
+            metrics.set_labels(source="db", lookup_mode="search")
+            with metrics.stage("db_query"):
+                pass
+            return {"item": item}
+
+        response = TestClient(app).get("/probe/abc")
+
+        timing = response.headers["server-timing"]
+        self.assertIn("db_query;dur=", timing)
+        self.assertIn("serialize;dur=", timing)
+        self.assertIn("total;dur=", timing)
+        exposition = metrics.render_metrics()
+        self.assertIn(
+            'hudadak_stage_duration_seconds_count{route="/probe/{item}",'
+            'stage="db_query",source="db",lookup_mode="search",'
+            'fallback_reason="none"}',
+            exposition,
+        )
+
+    def test_nearest_fallback_reason_is_recorded(self):
+        client = TestClient(main.app)
+        with patch.object(main, "get_db_connection", return_value=None):
+            response = client.get(
+                "/nearest", params={"lat": 37.5, "lon": 127.0}
+            )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("db_connect;dur=", response.headers["server-timing"])
+        scrape = client.get("/metrics")
+        self.assertTrue(
+            scrape.headers["content-type"].startswith("text/plain")
+        )
+        self.assertIn(
+            'route="/nearest",method="GET",status="404",source="db",'
+            'lookup_mode="current",'
+            'fallback_reason="NO_OBSERVATION_WITHIN_RADIUS"',
+            scrape.text,
+        )
+        self.assertIn("hudadak_upstream_cache_entries", scrape.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,6 +13,7 @@ sys.path.insert(0, str(APP_DIR))
 
 import cleanup_measurements
 import main
+import psycopg2.errors
 from fastapi import HTTPException
 
 
@@ -256,6 +257,11 @@ class NearestTests(unittest.TestCase):
             connection.cursor_instance.query,
         )
         self.assertEqual(connection.cursor_instance.params, (72,))
+        self.assertIn(
+            "FROM air.rollup_dirty_buckets d",
+            connection.cursor_instance.query,
+        )
+        self.assertIn("scope='backfill'", connection.cursor_instance.query)
 
     def test_source_db_returns_stored_pm_without_calling_openmeteo(self):
         connection = FakeConnection(self.stored_row)
@@ -1340,6 +1346,36 @@ class NearestTests(unittest.TestCase):
                     )
                 )
 
+    def test_cancelled_selection_query_is_still_captured(self):
+        class CanceledCursor(FakeCursor):
+            def execute(self, query, params=None):
+                if "statement_timeout" not in query:
+                    raise psycopg2.errors.QueryCanceled("statement timeout")
+
+        class CanceledConnection(FakeConnection):
+            def cursor(self):
+                return CanceledCursor(None)
+
+        with (
+            patch.object(
+                main, "get_db_connection",
+                return_value=CanceledConnection(None),
+            ),
+            patch.object(
+                main,
+                "cached_fetch_openmeteo",
+                new=AsyncMock(side_effect=RuntimeError("offline")),
+            ),
+            patch.object(main, "maybe_capture") as capture,
+        ):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(main.nearest(lat=37.5, lon=127.0, source="auto"))
+
+        capture.assert_called_once()
+        variant, query, params, elapsed = capture.call_args.args
+        self.assertIn(("lookup_mode", "current"), variant)
+        self.assertGreaterEqual(elapsed, 0)
+
 
 if __name__ == "__main__":
     unittest.main()
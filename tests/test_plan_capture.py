@@ -0,0 +1,140 @@
+import os
+import queue
+import sys
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from fastapi import HTTPException
+
+import plan_capture
+from routers import plans as plans_module
+
+
+PLAN = [
+    {
+        "Plan": {
+            "Node Type": "Limit",
+            "Shared Hit Blocks": 120,
+            "Shared Read Blocks": 4,
+        },
+        "Planning Time": 1.5,
+        "Execution Time": 812.3,
+    }
+]
+
+
+class ExplainCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.executed.append((" ".join(query.split()), params))
+
+    def fetchone(self):
+        return (PLAN,)
+
+
+class ExplainConnection:
+    def __init__(self):
+        self.executed = []
+        self.rolled_back = False
+
+    def cursor(self):
+        return ExplainCursor(self)
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+VARIANT = (
+    ("lookup_mode", "current"),
+    ("region_level", None),
+    ("include_gases", False),
+)
+
+
+class PlanCaptureTests(unittest.TestCase):
+    def setUp(self):
+        plan_capture._last_capture.clear()
+        plan_capture._plans.clear()
+        while True:
+            try:
+                plan_capture._queue.get_nowait()
+            except queue.Empty:
+                break
+        patcher = patch.object(plan_capture, "_ensure_worker")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fast_queries_are_not_captured(self):
+        queued = plan_capture.maybe_capture(VARIANT, "SELECT 1", (), 0.01)
+
+        self.assertFalse(queued)
+        self.assertTrue(plan_capture._queue.empty())
+
+    def test_each_variant_is_captured_once_per_interval(self):
+        with patch.dict(os.environ, {"PLAN_CAPTURE_INTERVAL_SECONDS": "60"}):
+            first = plan_capture.maybe_capture(
+                VARIANT, "SELECT 1", (), 2.0, now=100.0
+            )
+            repeat = plan_capture.maybe_capture(
+                VARIANT, "SELECT 1", (), 2.0, now=130.0
+            )
+            later = plan_capture.maybe_capture(
+                VARIANT, "SELECT 1", (), 2.0, now=161.0
+            )
+
+        self.assertEqual((first, repeat, later), (True, False, True))
+        self.assertEqual(plan_capture._queue.qsize(), 2)
+
+    def test_capture_keeps_plan_with_rounded_coordinates(self):
+        conn = ExplainConnection()
+        job = {
+            "variant": VARIANT,
+            "query": "SELECT * FROM air.stations WHERE id = %s",
+            "params": (127.02764, 37.49794, "11"),
+            "elapsed": 0.9,
+            "captured_at": datetime(2026, 7, 1, tzinfo=timezone.utc),
+        }
+
+        entry = plan_capture.capture_plan(conn, job)
+
+        explain_query, explain_params = conn.executed[-1]
+        self.assertTrue(
+            explain_query.startswith("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)")
+        )
+        self.assertEqual(explain_params, job["params"])
+        self.assertTrue(conn.rolled_back)
+        self.assertEqual(entry["params"], [127.03, 37.5, "11"])
+        self.assertEqual(entry["summary"]["execution_ms"], 812.3)
+        self.assertEqual(entry["summary"]["shared_read_blocks"], 4)
+        self.assertEqual(plan_capture.recent_plans(), [entry])
+
+    def test_plans_endpoint_requires_configured_token(self):
+        with patch.dict(os.environ, {}, clear=True):
+            with self.assertRaises(HTTPException) as hidden:
+                plans_module.query_plans(x_debug_token="anything")
+        with patch.dict(os.environ, {"DEBUG_TOKEN": "secret"}):
+            with self.assertRaises(HTTPException) as denied:
+                plans_module.query_plans(x_debug_token="wrong")
+            body = plans_module.query_plans(x_debug_token="secret")
+
+        self.assertEqual(hidden.exception.status_code, 404)
+        self.assertEqual(denied.exception.status_code, 403)
+        self.assertEqual(body, {"plans": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
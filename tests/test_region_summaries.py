@@ -0,0 +1,255 @@
+import sys
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+APP_DIR = ROOT_DIR / "app"
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(APP_DIR))
+
+from fastapi import Response
+
+import ingest_common
+import refresh_region_summaries
+from routers import regions as regions_module
+
+SEOUL_ROW = (
+    "11", "서울특별시", None, 42.0, 61.0, 25, 18.5, 30.0, 25,
+    datetime(2026, 7, 23, 3, 0, tzinfo=timezone.utc),
+    datetime(2026, 7, 23, 2, 0, tzinfo=timezone.utc),
+)
+EMPTY_ROW = ("50", "제주특별자치도", None, None, None, 0, None, None, 0,
+             None, None)
+
+
+class SummaryCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.queries.append(query)
+        if "MAX(data_version)" in query:
+            self.result = [self.connection.version]
+        elif "FROM air.region_summaries" in query:
+            self.result = list(self.connection.rows)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+class SummaryConnection:
+    def __init__(self, version=(7, 1000), rows=(SEOUL_ROW, EMPTY_ROW)):
+        self.version = version
+        self.rows = rows
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return SummaryCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+class RegionSummaryEndpointTests(unittest.TestCase):
+    def setUp(self):
+        regions_module._cache.clear()
+        regions_module._versions.clear()
+
+    def fetch(self, conn, level="sido", headers=None, now=100.0):
+        response = Response()
+        with patch.object(
+            regions_module.db, "get_db_connection", return_value=conn
+        ), patch.object(regions_module.time, "monotonic", return_value=now):
+            body = regions_module.region_summary(
+                FakeRequest(headers), response, level=level
+            )
+        return body, response
+
+    def test_regions_carry_values_grade_and_freshness(self):
+        body, response = self.fetch(SummaryConnection())
+
+        self.assertEqual(body["level"], "sido")
+        self.assertEqual(body["data_version"], 7)
+        seoul, jeju = body["regions"]
+        self.assertEqual(seoul["pm10"], 42.0)
+        self.assertEqual(seoul["cai_grade"], 2)
+        self.assertEqual(seoul["display_ts"], "2026-07-23T12:00:00+09:00")
+        self.assertIsNone(jeju["cai_grade"])
+        self.assertIsNone(jeju["display_ts"])
+        self.assertEqual(response.headers["etag"], '"regions-sido-7-1000"')
+
+    def test_cached_payload_is_served_without_the_database(self):
+        self.fetch(SummaryConnection())
+        unused = Mock(side_effect=AssertionError("connected"))
+
+        with patch.object(
+            regions_module.db, "get_db_connection", unused
+        ), patch.object(regions_module.time, "monotonic", return_value=105):
+            body = regions_module.region_summary(
+                FakeRequest(), Response(), level="sido"
+            )
+
+        self.assertEqual(len(body["regions"]), 2)
+        unused.assert_not_called()
+
+    def test_new_summary_version_reloads_the_payload(self):
+        self.fetch(SummaryConnection())
+        later = SummaryConnection(version=(8, 1600), rows=(EMPTY_ROW,))
+
+        body, _ = self.fetch(later, now=200.0)
+
+        self.assertEqual(body["data_version"], 8)
+        self.assertEqual(len(body["regions"]), 1)
+        self.assertTrue(later.closed)
+
+    def test_matching_etag_is_not_modified(self):
+        self.fetch(SummaryConnection())
+
+        etag = '"regions-sido-7-1000"'
+        response, _ = self.fetch(
+            SummaryConnection(), headers={"if-none-match": etag}
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+
+class RefreshCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.queries.append((query, params))
+        if "SUM(version)" in query:
+            self.result = [(7, self.connection.now)]
+        elif "air.ingest_watermarks" in query:
+            self.result = self.connection.watermarks
+        elif "INSERT INTO air.region_summaries" in query:
+            self.rowcount = 3
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+class RefreshConnection:
+    def __init__(self, watermarks):
+        self.now = datetime(2026, 7, 23, 3, 0, tzinfo=timezone.utc)
+        self.watermarks = watermarks
+        self.queries = []
+        self.committed = False
+
+    def cursor(self):
+        return RefreshCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+
+class RefreshTests(unittest.TestCase):
+    def refresh(self, watermarks, full=False):
+        conn = RefreshConnection(watermarks)
+        saved = []
+        with patch.object(
+            refresh_region_summaries,
+            "save_watermarks",
+            side_effect=lambda cur, provider, marks: saved.append(marks),
+        ):
+            written, mode = refresh_region_summaries.refresh_summaries(
+                conn, full
+            )
+        refresh = next(
+            params for query, params in conn.queries
+            if "INSERT INTO air.region_summaries" in query
+        )
+        return conn, refresh, saved, written, mode
+
+    def test_first_run_recomputes_every_region(self):
+        conn, params, saved, written, full = self.refresh([])
+
+        self.assertTrue(full)
+        self.assertTrue(params["full"])
+        self.assertEqual(params["data_version"], 7)
+        self.assertIn(
+            refresh_region_summaries.PRUNE_SQL,
+            [query for query, _ in conn.queries],
+        )
+        self.assertEqual(saved, [{"current": conn.now}])
+        self.assertEqual(written, 3)
+        self.assertTrue(conn.committed)
+
+    def test_later_runs_start_from_the_watermark(self):
+        since = datetime(2026, 7, 23, 2, 0, tzinfo=timezone.utc)
+
+        conn, params, _, _, full = self.refresh([("current", since)])
+
+        self.assertFalse(full)
+        self.assertEqual(params["since"], since)
+        self.assertEqual(params["now"], conn.now)
+        self.assertNotIn(
+            refresh_region_summaries.PRUNE_SQL,
+            [query for query, _ in conn.queries],
+        )
+
+    def test_regions_stations_moved_between_are_claimed(self):
+        since = datetime(2026, 7, 23, 2, 0, tzinfo=timezone.utc)
+
+        conn, _, _, _, _ = self.refresh([("current", since)])
+
+        query = next(
+            " ".join(query.split()) for query, _ in conn.queries
+            if "INSERT INTO air.region_summaries" in query
+        )
+        self.assertIn("DELETE FROM air.region_summary_dirty", query)
+        self.assertIn("FOR UPDATE SKIP LOCKED", query)
+        self.assertIn("SELECT sido_code, sigungu_code FROM dirty", query)
+
+
+class RemapMarkTests(unittest.TestCase):
+    def test_remap_marks_old_and_new_regions_before_moving(self):
+        cur = Mock(rowcount=1)
+
+        moved = ingest_common.map_station_regions(cur, [40])
+
+        (mark, mark_params), (update, update_params) = [
+            (" ".join(call.args[0].split()), call.args[1])
+            for call in cur.execute.call_args_list
+        ]
+        self.assertEqual(moved, 1)
+        self.assertIn("INSERT INTO air.region_summary_dirty", mark)
+        self.assertIn("(m.old_sido_code, m.old_sigungu_code)", mark)
+        self.assertIn("UPDATE air.stations", update)
+        self.assertEqual(mark_params, ([40],))
+        self.assertEqual(update_params, ([40],))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+import httpx
+from fastapi import HTTPException
+
+import cache
+import main
+import resilience
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _fail():
+    raise RuntimeError("upstream timeout")
+
+
+async def _ok():
+    return "ok"
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = resilience.CircuitBreaker(
+            "open-meteo", failures=2, reset_after=30, clock=self.clock
+        )
+
+    def _call(self, fetch):
+        return asyncio.run(self.breaker.call(fetch))
+
+    def test_opens_after_consecutive_failures_and_fails_fast(self):
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                self._call(_fail)
+        fetch = AsyncMock()
+
+        with self.assertRaises(resilience.CircuitOpenError):
+            self._call(fetch)
+
+        fetch.assert_not_awaited()
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_success_resets_the_failure_count(self):
+        with self.assertRaises(RuntimeError):
+            self._call(_fail)
+        self._call(_ok)
+        with self.assertRaises(RuntimeError):
+            self._call(_fail)
+
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_allows_one_trial(self):
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                self._call(_fail)
+        self.clock.now += 30
+
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+
+        self.clock.now += 30
+        self.assertEqual(self._call(_ok), "ok")
+        self.assertEqual(self.breaker.state, "closed")
+
+
+class StaleWhileRevalidateTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = cache.TieredCache("test", cache.MemoryCache())
+        self.swr = resilience.StaleWhileRevalidate(
+            self.cache, fresh_for=120, max_stale=1800
+        )
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        self.cache.set("k", {"fetched_at": 0, "data": "old"}, 1800)
+        fetch = AsyncMock(return_value="new")
+
+        async def scenario():
+            first = await self.swr.get("openmeteo_aq", "k", fetch)
+            await asyncio.gather(*self.swr._background)
+            return first, await self.swr.get("openmeteo_aq", "k", fetch)
+
+        self.assertEqual(asyncio.run(scenario()), ("old", "new"))
+        fetch.assert_awaited_once()
+
+    def test_concurrent_misses_share_one_fetch(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"hourly": {}}
+
+        async def scenario():
+            return await asyncio.gather(
+                *(self.swr.get("openmeteo_aq", "k", fetch) for _ in range(5))
+            )
+
+        self.assertEqual(asyncio.run(scenario()), [{"hourly": {}}] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_refresh_keeps_serving_stale(self):
+        self.cache.set("k", {"fetched_at": 0, "data": "old"}, 1800)
+
+        async def scenario():
+            first = await self.swr.get("openmeteo_aq", "k", _fail)
+            await asyncio.gather(*self.swr._background, return_exceptions=True)
+            return first, await self.swr.get("openmeteo_aq", "k", _fail)
+
+        self.assertEqual(asyncio.run(scenario()), ("old", "old"))
+
+
+class ModelFallbackTests(unittest.TestCase):
+    def test_open_circuit_fails_fast_with_503(self):
+        open_breaker = resilience.CircuitBreaker("open-meteo", failures=1)
+        open_breaker.record_failure()
+        with patch.dict(
+            resilience._breakers, {"open-meteo": open_breaker}
+        ), patch.object(main, "fetch_openmeteo", new=AsyncMock()) as fetch:
+            with self.assertRaises(HTTPException) as raised:
+                asyncio.run(
+                    main.cached_fetch_openmeteo(1.0, 2.0, keys=["ozone"])
+                )
+
+        fetch.assert_not_awaited()
+        self.assertEqual(raised.exception.status_code, 503)
+
+    def test_only_upstream_server_errors_open_the_circuit(self):
+        shared = resilience.CircuitBreaker("open-meteo", failures=2)
+
+        def fetch_with(status):
+            response = httpx.Response(status, json={"reason": "bad"})
+            with patch.dict(
+                resilience._breakers, {"open-meteo": shared}
+            ), patch.object(
+                main, "_upstream_get", new=AsyncMock(return_value=response)
+            ):
+                with self.assertRaises(HTTPException) as raised:
+                    asyncio.run(
+                        main._guarded(
+                            "open-meteo",
+                            lambda: main.fetch_openmeteo(999.0, 2.0, ["o3"]),
+                        )
+                    )
+            return raised.exception.status_code
+
+        for _ in range(3):
+            self.assertEqual(fetch_with(400), 502)
+        self.assertEqual(shared.state, "closed")
+        self.assertEqual(shared.failures, 0)
+
+        for _ in range(2):
+            fetch_with(503)
+        self.assertEqual(shared.state, "open")
+
+    def test_owm_backup_fills_gases_when_model_fails(self):
+        gas = {"o3": 0.02, "no2": None, "so2": None, "co": None}
+        gas_meta = {"o3": {"provider": "AIRKOREA"}, "no2": None,
+                    "so2": None, "co": None}
+        backup = {"display_ts": "2026-07-23T12:00:00+09:00",
+                  "name": "OWM Seoul", "o3": 60.0, "no2": 12.0,
+                  "so2": None, "co": 230.0}
+        with patch.object(main, "_fetch_owm_gas_backup", return_value=backup):
+            main._fill_owm_gas_backup(object(), 37.5, 127.0, gas, gas_meta)
+
+        self.assertEqual(gas, {"o3": 0.02, "no2": 12.0, "so2": None,
+                               "co": 230.0})
+        self.assertEqual(gas_meta["o3"]["provider"], "AIRKOREA")
+        self.assertEqual(gas_meta["no2"]["provider"], "OWM")
+        self.assertEqual(gas_meta["co"]["station"], "OWM Seoul")
+        self.assertIsNone(gas_meta["so2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -35,12 +35,10 @@ class SelectionPolicyTests(unittest.TestCase):
         query = " ".join(build_pm_query("search", "sigungu").split())
 
         self.assertEqual(
-            query.count("requested_region.code = %s"), 2
+            query.count("s.sigungu_code BETWEEN %s AND %s"), 2
         )
-        self.assertEqual(
-            query.count("requested_region.level = 'sigungu'"), 2
-        )
-        self.assertEqual(query.count("ST_Covers("), 2)
+        self.assertNotIn("ST_Covers(", query)
+        self.assertNotIn("admin_regions", query)
         self.assertNotIn("ST_DWithin(s.geom, target.g, 50000)", query)
         self.assertIn(
             "ORDER BY pm10_display_ts DESC, pm10_distance_m ASC",
@@ -49,10 +47,8 @@ class SelectionPolicyTests(unittest.TestCase):
 
     def test_search_filters_by_sido_code(self):
         query = build_pm_query("search", "sido")
-        self.assertEqual(query.count("requested_region.code = %s"), 2)
-        self.assertEqual(
-            query.count("requested_region.level = 'sido'"), 2
-        )
+        self.assertEqual(query.count("s.sido_code = %s"), 2)
+        self.assertNotIn("ST_Covers(", query)
 
     def test_pm_candidates_require_observed_rows(self):
         query = build_pm_query("current", None)
@@ -113,18 +109,24 @@ class SelectionPolicyTests(unittest.TestCase):
 
     def test_search_params_repeat_region_code_for_each_pollutant(self):
         self.assertEqual(
-            query_params("search", 127.0, 37.5, "41110"),
-            (127.0, 37.5, "41110", "41110"),
+            query_params("search", 127.0, 37.5, "28185"),
+            (127.0, 37.5, "28185", "28185", "28185", "28185"),
         )
         self.assertEqual(
             query_params(
                 "search",
                 127.0,
                 37.5,
-                "41110",
+                "11",
                 include_gases=True,
             ),
-            (127.0, 37.5, *(["41110"] * 6)),
+            (127.0, 37.5, *(["11"] * 6)),
+        )
+
+    def test_composite_city_search_covers_its_child_gu_codes(self):
+        self.assertEqual(
+            query_params("search", 127.0, 37.5, "41110"),
+            (127.0, 37.5, "41110", "41119", "41110", "41119"),
         )
 
     def test_no_data_reasons_are_mode_specific(self):
@@ -0,0 +1,305 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from array import array
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+APP_DIR = ROOT_DIR / "app"
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(APP_DIR))
+
+import build_selection_raster
+import main
+import selection_raster
+
+SEOUL = {
+    "station_id": 11,
+    "name": "종로구",
+    "provider": "AIRKOREA",
+    "kind": "airkorea_station",
+    "lat": 37.572,
+    "lon": 127.005,
+    "sido_code": "11",
+    "sigungu_code": "11110",
+    "value": 31.0,
+    "unit": "µg/m³",
+    "display_ts": "2026-07-23T12:00:00+09:00",
+}
+# A 2x2 grid of 0.1 degree cells from (37.5, 126.9).
+CELLS = {
+    "lat0": 37.5, "lon0": 126.9, "dlat": 0.1, "dlon": 0.1,
+    "rows": 2, "cols": 2,
+}
+
+
+def _payload(valid_until=4102444800.0, data_version=7):
+    pm10 = array("H", [1, 0, 0, 0])
+    pm25 = array("H", [0, 0, 0, 1])
+    return build_selection_raster.encode_raster(
+        CELLS,
+        [pm10, pm25],
+        {"pm10": [SEOUL], "pm25": [dict(SEOUL, value=14.0)]},
+        data_version,
+        1000.0,
+        valid_until,
+    )
+
+
+class StatusCursor:
+    def __init__(self, responses, log):
+        self.responses = responses
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        self.log.append(query)
+
+    def fetchone(self):
+        return self.responses.pop(0)
+
+
+class StatusConnection:
+    def __init__(self, responses):
+        self.responses = responses
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return StatusCursor(self.responses, self.queries)
+
+    def close(self):
+        self.closed = True
+
+
+class SelectionRasterTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(
+            selection_raster._state.update, raster=None, checked_at=0.0
+        )
+
+    def _raster(self, **kwargs):
+        path = selection_raster.unpack(
+            _payload(**kwargs), "7-1000", self.directory.name
+        )
+        return selection_raster.SelectionRaster(path)
+
+    def test_lookup_reads_one_cell_per_pollutant(self):
+        raster = self._raster()
+
+        self.assertEqual(
+            raster.lookup(37.55, 126.95), {"pm10": SEOUL, "pm25": None}
+        )
+        self.assertEqual(raster.lookup(37.65, 127.05)["pm25"]["value"], 14.0)
+        self.assertIsNone(raster.lookup(36.0, 126.95))
+
+    def test_row_matches_the_selection_sql_shape(self):
+        raster = self._raster()
+
+        row = selection_raster.selection_row(raster, 37.57, 126.98)
+
+        self.assertEqual(row["pm10"], 31.0)
+        self.assertEqual(row["pm10_station_id"], 11)
+        self.assertEqual(row["pm10_distance_band"], 1)
+        self.assertAlmostEqual(row["pm10_distance_m"], 2206, delta=20)
+        self.assertNotIn("pm25", row)
+        self.assertEqual(main._pm_meta(row, "pm10")["provider"], "AIRKOREA")
+
+    def test_grid_covers_korea_at_the_cell_size(self):
+        cells = build_selection_raster.grid(1000)
+
+        self.assertAlmostEqual(cells["dlat"] * 111320, 1000)
+        self.assertGreaterEqual(cells["lat0"] + cells["rows"] * cells["dlat"],
+                                38.7)
+        self.assertGreaterEqual(cells["lon0"] + cells["cols"] * cells["dlon"],
+                                132.0)
+
+    def test_current_raster_follows_the_ingest_version(self):
+        payload = _payload()
+        conn = StatusConnection([(7, 7, 1000), (payload,)])
+        env = {
+            "SELECTION_RASTER_DIR": self.directory.name,
+            "RASTER_CHECK_SECONDS": "10",
+        }
+        with patch.dict(os.environ, env):
+            raster = selection_raster.current_raster(lambda: conn, now=2000)
+            again = selection_raster.current_raster(
+                Mock(side_effect=AssertionError), now=2005
+            )
+            stale = StatusConnection([(7, 8, 1000)])
+            newer = selection_raster.current_raster(lambda: stale, now=2011)
+
+        self.assertEqual(raster.data_version, 7)
+        self.assertIs(again, raster)
+        self.assertTrue(conn.closed)
+        self.assertIsNone(newer)
+
+    def test_expired_raster_is_not_used(self):
+        selection_raster._state.update(
+            raster=self._raster(valid_until=1500.0), checked_at=2000
+        )
+
+        self.assertIsNone(selection_raster.current_raster(Mock(), now=2001))
+
+    def test_request_path_rechecks_in_a_worker_thread(self):
+        raster = self._raster(valid_until=5000.0)
+        selection_raster._state.update(raster=raster, checked_at=1000)
+        calls = []
+
+        def current_raster(connect, now=None):
+            calls.append(connect)
+            selection_raster._state["checked_at"] = 2000
+
+        async def lookups():
+            answers = [
+                selection_raster.cached_raster("connect", now=2000),
+                selection_raster.cached_raster("connect", now=2000),
+            ]
+            await asyncio.gather(*selection_raster._background)
+            return answers
+
+        with patch.dict(
+            os.environ, {"RASTER_CHECK_SECONDS": "10"}
+        ), patch.object(
+            selection_raster, "current_raster", side_effect=current_raster
+        ):
+            answers = asyncio.run(lookups())
+
+        self.assertEqual(answers, [raster, raster])
+        self.assertEqual(calls, ["connect"])
+        self.assertFalse(selection_raster._background)
+
+
+class NearestRasterTests(unittest.TestCase):
+    def test_source_db_answers_from_the_raster(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        raster = selection_raster.SelectionRaster(
+            selection_raster.unpack(_payload(), "7-1000", directory.name)
+        )
+        connect = Mock()
+        with patch.dict(os.environ, {"SELECTION_RASTER": "1"}), patch.object(
+            selection_raster, "cached_raster", return_value=raster
+        ), patch.object(main, "get_db_connection", connect):
+            response = asyncio.run(
+                main.nearest(lat=37.57, lon=126.98, source="db")
+            )
+
+        connect.assert_not_called()
+        self.assertEqual(response["pm10"], 31.0)
+        self.assertIsNone(response["pm25"])
+        self.assertEqual(response["pm10_meta"]["station_id"], 11)
+        self.assertEqual(response["source"], "db")
+
+
+class BuildCursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.queries.append((query, params))
+        self.last = query
+
+    def fetchone(self):
+        if "SUM(version)" in self.last:
+            return (7,)
+        return (1000.0,)
+
+    def fetchall(self):
+        observed = self.conn.now - timedelta(hours=1)
+        rows = [(11, "종로구", "AIRKOREA", "airkorea_station", 37.572,
+                 127.005, "11", "11110", 31, "µg/m³", observed)]
+        if self.conn.stale_station:
+            rows.append((12, "중구", "AIRKOREA", "airkorea_station", 37.564,
+                         126.975, "11", "11140", 40, "µg/m³",
+                         observed - timedelta(hours=1, minutes=55)))
+        return rows
+
+    def __iter__(self):
+        return iter([(0, 0, 1), (1, 1, 1)])
+
+
+class BuildConnection:
+    def __init__(self):
+        self.queries = []
+        self.now = datetime(2026, 7, 23, 3, 0, tzinfo=timezone.utc)
+        self.committed = False
+        self.stale_station = False
+
+    def cursor(self, name=None):
+        return BuildCursor(self, name)
+
+    def commit(self):
+        self.committed = True
+
+
+class BuildTests(unittest.TestCase):
+    def test_build_stores_version_read_before_candidates(self):
+        conn = BuildConnection()
+
+        covered = build_selection_raster.build(conn, cell_meters=50000)
+
+        queries = [query for query, _ in conn.queries]
+        version_at = next(
+            i for i, q in enumerate(queries) if "SUM(version)" in q
+        )
+        candidates_at = next(
+            i for i, q in enumerate(queries) if "CREATE TEMP TABLE" in q
+        )
+        self.assertLess(version_at, candidates_at)
+        self.assertEqual(covered, 2)
+        self.assertTrue(conn.committed)
+        params = next(
+            params for query, params in conn.queries
+            if "INSERT INTO air.selection_rasters" in query
+        )
+        self.assertEqual(params[1], 7)
+        self.assertEqual(
+            params[3], (conn.now + timedelta(hours=2)).timestamp()
+        )
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        raster = selection_raster.SelectionRaster(
+            selection_raster.unpack(params[4], "7-1000", directory.name)
+        )
+        self.assertEqual(raster.entries["pm25"][0]["value"], 31.0)
+        self.assertEqual(raster.lookup(33.1, 124.6)["pm10"]["station_id"], 11)
+
+    def test_stations_no_cell_picked_do_not_shorten_validity(self):
+        conn = BuildConnection()
+        conn.stale_station = True
+
+        build_selection_raster.build(conn, cell_meters=50000)
+
+        params = next(
+            params for query, params in conn.queries
+            if "INSERT INTO air.selection_rasters" in query
+        )
+        self.assertEqual(
+            params[3], (conn.now + timedelta(hours=2)).timestamp()
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from fastapi import HTTPException
+
+from routers import tiles as tiles_module
+
+
+class TileCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        self.connection.queries.append((query, params))
+        if "air.ingest_commits" in query:
+            self.result = (self.connection.version,)
+        else:
+            self.result = (memoryview(self.connection.tile),)
+
+    def fetchone(self):
+        return self.result
+
+
+class TileConnection:
+    def __init__(self, version=1, tile=b"\x1a\x02mvt"):
+        self.version = version
+        self.tile = tile
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return TileCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+class StationTileTests(unittest.TestCase):
+    def setUp(self):
+        tiles_module._tiles.clear()
+        tiles_module._data_version.update(value=None, expires=0.0)
+        step = patch.object(tiles_module, "_window_step", return_value=5)
+        self.window_step = step.start()
+        self.addCleanup(step.stop)
+
+    def fetch(self, conn, z=12, x=3490, y=1584, headers=None):
+        with patch.object(
+            tiles_module.db, "get_db_connection", return_value=conn
+        ):
+            return tiles_module.station_tile(z, x, y, FakeRequest(headers))
+
+    def tile_queries(self, conn):
+        return [q for q, _ in conn.queries if "ST_AsMVT(" in q]
+
+    def test_tile_is_rendered_once_per_data_version(self):
+        conn = TileConnection(version=7)
+
+        first = self.fetch(conn)
+        second = self.fetch(conn)
+
+        self.assertEqual(first.body, b"\x1a\x02mvt")
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(first.media_type, tiles_module.MVT_MEDIA_TYPE)
+        self.assertEqual(first.headers["etag"], '"stations-7-5-12-3490-1584"')
+        self.assertEqual(len(self.tile_queries(conn)), 1)
+        self.assertTrue(conn.closed)
+
+    def test_new_ingest_commit_renders_a_new_tile(self):
+        conn = TileConnection(version=7)
+        self.fetch(conn)
+        conn.version = 8
+        conn.tile = b"\x1a\x03new"
+        tiles_module._data_version.update(expires=0.0)
+
+        response = self.fetch(conn)
+
+        self.assertEqual(response.body, b"\x1a\x03new")
+        self.assertEqual(len(self.tile_queries(conn)), 2)
+
+    def test_next_window_step_renders_a_new_tile(self):
+        conn = TileConnection(version=7)
+        self.fetch(conn)
+        self.window_step.return_value = 6
+
+        response = self.fetch(conn)
+
+        self.assertEqual(
+            response.headers["etag"], '"stations-7-6-12-3490-1584"'
+        )
+        (_, first), (_, second) = [
+            (q, params) for q, params in conn.queries if "ST_AsMVT(" in q
+        ]
+        self.assertEqual(
+            second["window_end"] - first["window_end"],
+            tiles_module.WINDOW_STEP_SECONDS,
+        )
+
+    def test_matching_etag_returns_not_modified(self):
+        conn = TileConnection(version=3)
+
+        response = self.fetch(
+            conn, headers={"if-none-match": '"stations-3-5-12-3490-1584"'}
+        )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.tile_queries(conn), [])
+
+    def test_low_zoom_tiles_cluster_stations(self):
+        conn = TileConnection()
+
+        self.fetch(conn, z=6, x=54, y=24)
+        self.fetch(conn, z=tiles_module.CLUSTER_MAX_ZOOM, x=436, y=198)
+
+        clustered, single = self.tile_queries(conn)
+        self.assertIn("ST_SnapToGrid", clustered)
+        self.assertIn("station_count", clustered)
+        self.assertNotIn("ST_SnapToGrid", single)
+        self.assertIn("station_id", single)
+
+    def test_out_of_range_tiles_are_rejected(self):
+        for z, x, y in ((21, 0, 0), (3, 8, 0), (3, 0, -1)):
+            with self.assertRaises(HTTPException) as raised:
+                tiles_module.station_tile(z, x, y, FakeRequest())
+            self.assertEqual(raised.exception.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from fastapi.testclient import TestClient
+
+import db
+import main
+import warmup
+from selection import build_pm_query
+
+
+class ExplainCursor:
+    def __init__(self, queries):
+        self.queries = queries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params):
+        self.queries.append((query, params))
+
+    def fetchall(self):
+        return [("Limit",)]
+
+
+class ExplainConnection:
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self):
+        return ExplainCursor(self.queries)
+
+
+class FakeRawConnection:
+    def __init__(self, closed=0, rollback_error=None):
+        self.closed = closed
+        self.rollback_error = rollback_error
+        self.rolled_back = False
+
+    def rollback(self):
+        if self.rollback_error:
+            raise self.rollback_error
+        self.rolled_back = True
+
+
+class FakePool:
+    def __init__(self):
+        self.returned = []
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+
+class WarmupTests(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(
+            warmup.STATUS.update, ready=False, seconds=None, steps={}
+        )
+
+    def test_every_selection_variant_is_planned(self):
+        conn = ExplainConnection()
+
+        planned = warmup.plan_selection_statements(conn, 37.5, 127.0)
+
+        self.assertEqual(planned, len(warmup.SELECTION_VARIANTS))
+        self.assertTrue(
+            all(query.startswith("EXPLAIN ") for query, _ in conn.queries)
+        )
+        search_params = conn.queries[-1][1]
+        self.assertEqual(search_params[:2], (127.0, 37.5))
+        self.assertIn("11110", search_params)
+
+    def test_selection_sql_is_built_once_per_variant(self):
+        first = build_pm_query("search", "sido", include_gases=True)
+        second = build_pm_query("search", "sido", include_gases=True)
+
+        self.assertIs(first, second)
+
+    def test_failed_and_slow_steps_do_not_block_readiness(self):
+        async def ok():
+            return "done"
+
+        async def broken():
+            raise RuntimeError("no database")
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        status = asyncio.run(
+            warmup.run_warmup(
+                [("ok", ok), ("broken", broken), ("slow", slow)],
+                timeout=0.05,
+            )
+        )
+
+        self.assertTrue(status["ready"])
+        self.assertEqual(status["steps"]["ok"]["detail"], "done")
+        self.assertEqual(status["steps"]["broken"]["detail"], "no database")
+        self.assertFalse(status["steps"]["slow"]["ok"])
+        self.assertIsNotNone(status["seconds"])
+
+    def test_readyz_waits_for_warmup(self):
+        client = TestClient(main.app)
+
+        self.assertEqual(client.get("/readyz").status_code, 503)
+        warmup.STATUS.update(ready=True, seconds=0.2)
+        self.assertEqual(client.get("/readyz").status_code, 200)
+        self.assertIn("hudadak_ready 1", client.get("/metrics").text)
+
+    def test_lifespan_runs_warmup_before_serving(self):
+        env = {"WARMUP_HOT_CELLS": "37.5,127.0"}
+        with patch.dict(os.environ, env), patch.object(
+            main, "cached_fetch_openmeteo", return_value={}
+        ), patch.object(main, "cached_fetch_weather", return_value={}):
+            with patch.object(db, "connection_kwargs", return_value=None):
+                with TestClient(main.app) as client:
+                    body = client.get("/readyz").json()
+
+        self.assertTrue(body["ready"])
+        self.assertEqual(
+            body["steps"]["db_pool"]["detail"], "database not configured"
+        )
+        self.assertEqual(
+            body["steps"]["model_prefetch"]["detail"],
+            "2/2 upstream responses cached",
+        )
+        self.assertIsNone(main._http_client)
+
+
+class PooledConnectionTests(unittest.TestCase):
+    def test_close_rolls_back_and_returns_to_pool(self):
+        pool, raw = FakePool(), FakeRawConnection()
+        db._in_use["count"] += 1
+
+        db.PooledConnection(pool, raw).close()
+
+        self.assertTrue(raw.rolled_back)
+        self.assertEqual(pool.returned, [(raw, False)])
+
+    def test_broken_connections_are_discarded(self):
+        pool = FakePool()
+        raw = FakeRawConnection(rollback_error=db.psycopg2.InterfaceError())
+        db._in_use["count"] += 1
+
+        conn = db.PooledConnection(pool, raw)
+        conn.close()
+        conn.close()
+
+        self.assertEqual(pool.returned, [(raw, True)])
+
+
+if __name__ == "__main__":
+    unittest.main()